@@ -0,0 +1,38 @@
+from datetime import date, datetime, timedelta, timezone
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from app.core.db import get_db
+from app.core.errors import BadRequestError
+from app.core.security import require_role
+from app.schemas.analytics import DailyTrafficDto, PathTrafficDto, ReferrerTrafficDto, TrafficResponse
+from app.services.visit_rollups import traffic_summary
+
+router = APIRouter(prefix="/admin/analytics", tags=["admin-analytics"], dependencies=[Depends(require_role("ADMIN"))])
+
+MAX_RANGE_DAYS = 366
+
+
+@router.get("", response_model=TrafficResponse)
+def traffic(
+    from_: date | None = Query(default=None, alias="from"),
+    to: date | None = Query(default=None),
+    limit: int = Query(default=20, ge=1, le=100),
+    db: Session = Depends(get_db),
+):
+    """Traffic for whole UTC days, read from the daily rollups only."""
+    end = to or datetime.now(timezone.utc).date()
+    start = from_ or end - timedelta(days=29)
+    if start > end or (end - start).days >= MAX_RANGE_DAYS:
+        raise BadRequestError("Interval invalid.")
+    summary = traffic_summary(db, start, end, limit)
+    return TrafficResponse(
+        start=start.isoformat(),
+        end=end.isoformat(),
+        views=summary["views"],
+        unique_visitors=summary["unique_visitors"],
+        days=[DailyTrafficDto(**{**item, "day": item["day"].isoformat()}) for item in summary["days"]],
+        top_paths=[PathTrafficDto(**item) for item in summary["top_paths"]],
+        top_referrers=[ReferrerTrafficDto(**item) for item in summary["top_referrers"]],
+    )
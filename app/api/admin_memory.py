@@ -0,0 +1,115 @@
+import re
+from datetime import datetime, timedelta, timezone
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from app.core.db import get_db
+from app.core.errors import BadRequestError
+from app.core.security import require_role
+from app.schemas.metrics import (
+    AllocationDiffDto,
+    AllocationDiffResponse,
+    MemoryGrowthDto,
+    MemoryGrowthResponse,
+    TracemallocSnapshotDto,
+    TracemallocStatusDto,
+)
+from app.services.memory_diagnostics import (
+    MAX_TRACEBACK_FRAMES,
+    GroupBy,
+    compare_snapshots,
+    delete_snapshot,
+    growth_between,
+    start_tracing,
+    stop_tracing,
+    take_snapshot,
+    tracing_status,
+)
+
+router = APIRouter(prefix="/admin/memory", tags=["admin-memory"], dependencies=[Depends(require_role("ADMIN"))])
+
+SNAPSHOT_NAME = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+
+def _status() -> TracemallocStatusDto:
+    status = tracing_status()
+    snapshots = [TracemallocSnapshotDto(name=name, taken_at=taken_at.isoformat()) for name, taken_at in status.pop("snapshots")]
+    return TracemallocStatusDto(**status, snapshots=snapshots)
+
+
+@router.get("/tracemalloc", response_model=TracemallocStatusDto)
+def status():
+    """tracemalloc state of the worker that answers; every worker traces on its own."""
+    return _status()
+
+
+@router.post("/tracemalloc/start", response_model=TracemallocStatusDto)
+def start(frames: int = Query(default=1, ge=1, le=MAX_TRACEBACK_FRAMES)):
+    start_tracing(frames)
+    return _status()
+
+
+@router.post("/tracemalloc/stop", response_model=TracemallocStatusDto)
+def stop():
+    stop_tracing()
+    return _status()
+
+
+@router.post("/snapshots/{name}", response_model=TracemallocSnapshotDto)
+def create_snapshot(name: str):
+    if not SNAPSHOT_NAME.match(name):
+        raise BadRequestError("Invalid snapshot name")
+    taken_at = take_snapshot(name)
+    return TracemallocSnapshotDto(name=name, taken_at=taken_at.isoformat())
+
+
+@router.delete("/snapshots/{name}", status_code=204)
+def remove_snapshot(name: str):
+    delete_snapshot(name)
+    return None
+
+
+@router.get("/diff", response_model=AllocationDiffResponse)
+def diff(
+    base: str,
+    target: str | None = None,
+    group_by: GroupBy = Query(default="lineno"),
+    limit: int = Query(default=20, ge=1, le=200),
+):
+    items = compare_snapshots(base, target, group_by, limit)
+    return AllocationDiffResponse(items=[AllocationDiffDto(**item) for item in items])
+
+
+@router.get("/growth", response_model=MemoryGrowthResponse)
+def growth(
+    from_: datetime | None = Query(default=None, alias="from"),
+    to: datetime | None = Query(default=None),
+    limit: int = Query(default=200, ge=1, le=1000),
+    db: Session = Depends(get_db),
+):
+    """Top growers recorded by the scheduled mode (TRACEMALLOC_INTERVAL)."""
+    end = to or datetime.now(timezone.utc)
+    start = from_ or end - timedelta(days=1)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    if start >= end:
+        raise BadRequestError("Interval invalid.")
+    rows = growth_between(db, start, end, limit)
+    return MemoryGrowthResponse(
+        items=[
+            MemoryGrowthDto(
+                captured_at=row.captured_at.isoformat(),
+                pid=row.pid,
+                filename=row.filename,
+                lineno=row.lineno,
+                size_bytes=row.size_bytes,
+                size_diff_bytes=row.size_diff_bytes,
+                count=row.count,
+                count_diff=row.count_diff,
+            )
+            for row in rows
+        ]
+    )
@@ -1,29 +1,127 @@
+from datetime import datetime, timedelta, timezone
+from typing import Literal
+
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 
 from app.core.db import get_db
+from app.core.errors import BadRequestError
 from app.core.security import require_role
-from app.schemas.metrics import MetricsHistoryResponse, MetricSampleDto
-from app.services.metrics import latest_samples
+from app.schemas.metrics import MetricRollupDto, MetricsHistoryResponse, MetricSampleDto, RouteLatencyDto, RouteLatencyResponse
+from app.services.metrics import FLOAT_METRICS, METRIC_COLUMNS, latest_samples, samples_between
+from app.services.metrics_rollups import MAX_SPAN, pick_resolution, rollups_between
+from app.services.route_metrics import route_stats
 
 router = APIRouter(prefix="/admin/metrics", tags=["admin-metrics"], dependencies=[Depends(require_role("ADMIN"))])
 
 
+def _sample_dto(s) -> MetricSampleDto:
+    return MetricSampleDto(
+        captured_at=s.captured_at.isoformat(),
+        heap_used_bytes=s.heap_used_bytes,
+        heap_max_bytes=s.heap_max_bytes,
+        system_memory_total_bytes=s.system_memory_total_bytes,
+        system_memory_used_bytes=s.system_memory_used_bytes,
+        disk_total_bytes=s.disk_total_bytes,
+        disk_used_bytes=s.disk_used_bytes,
+        process_cpu_load=s.process_cpu_load,
+        system_cpu_load=s.system_cpu_load,
+        db_pool_checked_out=s.db_pool_checked_out or 0,
+        db_pool_overflow=s.db_pool_overflow or 0,
+        db_checkout_wait_ms=s.db_checkout_wait_ms,
+        db_query_count=s.db_query_count or 0,
+        db_query_time_ms=s.db_query_time_ms,
+        event_loop_lag_ms=s.event_loop_lag_ms,
+        threadpool_in_use=s.threadpool_in_use or 0,
+        threadpool_waiting=s.threadpool_waiting or 0,
+    )
+
+
+def _bucket_items(rollups) -> list[MetricSampleDto]:
+    """One item per bucket built from the bucket averages, so charts keep working."""
+    buckets: dict[datetime, dict] = {}
+    for row in rollups:
+        buckets.setdefault(row.bucket_start, {})[row.metric] = row.avg_value
+    items = []
+    for bucket_start, values in buckets.items():
+        fields = {}
+        for column in METRIC_COLUMNS:
+            value = values.get(column)
+            if column in FLOAT_METRICS:
+                fields[column] = value
+            else:
+                fields[column] = int(round(value)) if value is not None else 0
+        items.append(MetricSampleDto(captured_at=bucket_start.isoformat(), **fields))
+    return items
+
+
 @router.get("/history", response_model=MetricsHistoryResponse)
-def history(limit: int = Query(default=120, ge=1, le=500), db: Session = Depends(get_db)):
-    samples = latest_samples(db, limit)
+def history(
+    limit: int = Query(default=120, ge=1, le=500),
+    from_: datetime | None = Query(default=None, alias="from"),
+    to: datetime | None = Query(default=None),
+    resolution: Literal["auto", "raw", "1m", "1h", "1d"] = Query(default="auto"),
+    db: Session = Depends(get_db),
+):
+    if from_ is None and to is None and resolution in ("auto", "raw"):
+        return MetricsHistoryResponse(items=[_sample_dto(s) for s in latest_samples(db, limit)])
+
+    now = datetime.now(timezone.utc)
+    end = to or now
+    start = from_ or end - timedelta(days=1)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    if start >= end:
+        raise BadRequestError("Interval invalid.")
+    # Raw rows are only served for short windows; a wider one falls back to a rollup tier.
+    if resolution == "auto" or (resolution == "raw" and end - start > MAX_SPAN["raw"]):
+        resolution = pick_resolution(start, end, now)
+
+    if resolution == "raw":
+        samples = samples_between(db, start, end, limit)
+        return MetricsHistoryResponse(items=[_sample_dto(s) for s in samples], resolution="raw")
+
+    rollups = rollups_between(db, resolution, start, end)
+    return MetricsHistoryResponse(
+        items=_bucket_items(rollups),
+        resolution=resolution,
+        rollups=[
+            MetricRollupDto(
+                bucket_start=row.bucket_start.isoformat(),
+                metric=row.metric,
+                sample_count=row.sample_count,
+                min=row.min_value,
+                avg=row.avg_value,
+                max=row.max_value,
+                p95=row.p95_value,
+            )
+            for row in rollups
+        ],
+    )
+
+
+@router.get("/routes", response_model=RouteLatencyResponse)
+def routes():
+    """Latency per route template, method and status as seen by this worker since it started."""
     items = [
-        MetricSampleDto(
-            captured_at=s.captured_at.isoformat(),
-            heap_used_bytes=s.heap_used_bytes,
-            heap_max_bytes=s.heap_max_bytes,
-            system_memory_total_bytes=s.system_memory_total_bytes,
-            system_memory_used_bytes=s.system_memory_used_bytes,
-            disk_total_bytes=s.disk_total_bytes,
-            disk_used_bytes=s.disk_used_bytes,
-            process_cpu_load=s.process_cpu_load,
-            system_cpu_load=s.system_cpu_load,
+        RouteLatencyDto(
+            method=method,
+            route=route,
+            status=status,
+            count=stats.count,
+            avg_ms=stats.total_ms / stats.count,
+            p50_ms=stats.quantile(0.5),
+            p95_ms=stats.quantile(0.95),
+            p99_ms=stats.quantile(0.99),
+            request_bytes=stats.request_bytes,
+            response_bytes=stats.response_bytes,
+            span_avg_ms={name: total / stats.count for name, total in stats.span_ms.items()},
         )
-        for s in samples
+        for (method, route, status), stats in route_stats()
+        if stats.count
     ]
-    return MetricsHistoryResponse(items=items)
+    # Slowest first by total time spent, which is what makes an endpoint worth looking at.
+    items.sort(key=lambda item: item.avg_ms * item.count, reverse=True)
+    return RouteLatencyResponse(items=items)
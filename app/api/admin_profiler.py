@@ -0,0 +1,60 @@
+import re
+from pathlib import Path
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import FileResponse, PlainTextResponse
+
+from app.core.config import settings
+from app.core.errors import BadRequestError, NotFoundError
+from app.core.security import require_role
+from app.services.profiler import (
+    MAX_SAMPLE_HZ,
+    MAX_SAMPLE_SECONDS,
+    collapsed_text,
+    continuous_profiler,
+    sample_stacks,
+    speedscope_profile,
+)
+
+router = APIRouter(prefix="/admin/profiler", tags=["admin-profiler"], dependencies=[Depends(require_role("ADMIN"))])
+
+PROFILE_NAME = re.compile(r"^[A-Za-z0-9-]+\.prof$")
+
+
+def _render(stacks, output: str, name: str, hz: float):
+    if output == "speedscope":
+        return speedscope_profile(stacks, name, hz)
+    return PlainTextResponse(collapsed_text(stacks))
+
+
+@router.post("/sample")
+def sample(
+    seconds: float = Query(default=10, gt=0, le=MAX_SAMPLE_SECONDS),
+    hz: int = Query(default=100, gt=0, le=MAX_SAMPLE_HZ),
+    output: Literal["collapsed", "speedscope"] = Query(default="collapsed", alias="format"),
+):
+    """Sample all threads of the worker that answers for the given window."""
+    stacks = sample_stacks(seconds, hz)
+    return _render(stacks, output, f"{seconds:g}s at {hz}Hz", hz)
+
+
+@router.get("/continuous")
+def continuous(
+    output: Literal["collapsed", "speedscope"] = Query(default="collapsed", alias="format"),
+    reset: bool = False,
+):
+    sampler = continuous_profiler()
+    if sampler is None:
+        raise BadRequestError("Continuous profiling is disabled (PROFILER_CONTINUOUS_HZ)")
+    stacks, _ = sampler.snapshot(reset)
+    return _render(stacks, output, "continuous", sampler.hz)
+
+
+@router.get("/profiles/{name}")
+def download_profile(name: str):
+    """pstats file written by a request sent with the X-Profile header."""
+    path = Path(settings.profiles_dir) / name
+    if not PROFILE_NAME.match(name) or not path.is_file():
+        raise NotFoundError("Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=name)
@@ -3,8 +3,8 @@ from sqlalchemy.orm import Session
 
 from app.core.db import get_db
 from app.core.security import require_role, get_current_user
-from app.schemas.groups import GroupResponse
-from app.services.groups import my_groups, get_group_view
+from app.schemas.groups import GroupResponse, GroupListResponse, GroupListView
+from app.services.groups import my_groups, my_group_summaries, get_group_view
 
 router = APIRouter(
     prefix="/student/groups",
@@ -13,8 +13,10 @@ router = APIRouter(
 )
 
 
-@router.get("", response_model=list[GroupResponse])
-def list_groups(user=Depends(get_current_user), db: Session = Depends(get_db)):
+@router.get("", response_model=GroupListResponse)
+def list_groups(view: GroupListView = "full", user=Depends(get_current_user), db: Session = Depends(get_db)):
+    if view == "summary":
+        return my_group_summaries(db, str(user.id))
     return my_groups(db, str(user.id))
 
 
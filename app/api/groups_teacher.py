@@ -3,9 +3,10 @@ from sqlalchemy.orm import Session
 
 from app.core.db import get_db
 from app.core.security import require_role, get_current_user
-from app.schemas.groups import UpdateGroupRequest, AddMemberRequest, GroupResponse
+from app.schemas.groups import UpdateGroupRequest, AddMemberRequest, GroupResponse, GroupListResponse, GroupListView
 from app.services.groups import (
     my_groups,
+    my_group_summaries,
     get_group_view,
     update_group,
     add_member,
@@ -19,8 +20,10 @@ router = APIRouter(
 )
 
 
-@router.get("", response_model=list[GroupResponse])
-def list_groups(user=Depends(get_current_user), db: Session = Depends(get_db)):
+@router.get("", response_model=GroupListResponse)
+def list_groups(view: GroupListView = "full", user=Depends(get_current_user), db: Session = Depends(get_db)):
+    if view == "summary":
+        return my_group_summaries(db, str(user.id))
     return my_groups(db, str(user.id))
 
 
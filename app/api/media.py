@@ -1,16 +1,32 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.orm import Session
 
 from app.core.db import get_db
+from app.core.config import settings
+from app.core.request_context import span
 from app.core.security import get_current_user, require_any_role
+from app.schemas.media import CreateUploadSessionRequest, FinalizeUploadRequest, UploadSessionResponse
 from app.services.media import (
     save_avatar_upload,
     save_resource_upload,
-    load_asset_path,
     build_asset_url,
+    offload_headers,
     get_asset,
 )
+from app.services.media_uploads import (
+    create_upload_session,
+    get_upload_session,
+    write_chunk,
+    finalize_upload,
+    abort_upload,
+    received_bytes,
+    part_size,
+    create_presigned_upload,
+    complete_presigned_upload,
+)
+from app.services.storage import COPY_BUFFER_BYTES, content_disposition, get_storage
 
 router = APIRouter(prefix="/media", tags=["media"])
 
@@ -35,13 +51,145 @@ def upload_resource(
     return {"assetId": str(asset.id), "url": build_asset_url(asset.id)}
 
 
+def to_upload_session_response(session) -> UploadSessionResponse:
+    return UploadSessionResponse(
+        upload_id=str(session.id),
+        filename=session.filename,
+        content_type=session.content_type,
+        size_bytes=session.size_bytes,
+        received_bytes=received_bytes(session),
+        received_ranges=session.received_ranges or [],
+        max_chunk_bytes=settings.media_upload_chunk_max_bytes,
+        part_size=part_size(session),
+        expires_at=session.expires_at.isoformat(),
+    )
+
+
+@router.post(
+    "/uploads/resource/sessions",
+    response_model=UploadSessionResponse,
+    dependencies=[Depends(require_any_role("TEACHER", "ADMIN"))],
+)
+def create_resource_upload_session(
+    payload: CreateUploadSessionRequest,
+    user=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    session = create_upload_session(db, str(user.id), payload.filename, payload.content_type, payload.size_bytes)
+    return to_upload_session_response(session)
+
+
+@router.get(
+    "/uploads/sessions/{upload_id}",
+    response_model=UploadSessionResponse,
+    dependencies=[Depends(require_any_role("TEACHER", "ADMIN"))],
+)
+def upload_session_status(upload_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+    return to_upload_session_response(get_upload_session(db, upload_id, str(user.id)))
+
+
+@router.put(
+    "/uploads/sessions/{upload_id}/chunks",
+    response_model=UploadSessionResponse,
+    dependencies=[Depends(require_any_role("TEACHER", "ADMIN"))],
+)
+def upload_chunk(
+    upload_id: str,
+    offset: int = Query(ge=0),
+    file: UploadFile = File(...),
+    user=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    session = write_chunk(db, upload_id, str(user.id), offset, file)
+    return to_upload_session_response(session)
+
+
+@router.post("/uploads/sessions/{upload_id}/finalize", dependencies=[Depends(require_any_role("TEACHER", "ADMIN"))])
+def finalize_upload_session(
+    upload_id: str,
+    payload: FinalizeUploadRequest | None = None,
+    user=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    asset = finalize_upload(db, upload_id, str(user.id), payload.sha256 if payload else None)
+    return {"assetId": str(asset.id), "url": build_asset_url(asset.id)}
+
+
+@router.delete(
+    "/uploads/sessions/{upload_id}",
+    status_code=204,
+    dependencies=[Depends(require_any_role("TEACHER", "ADMIN"))],
+)
+def abort_upload_session(upload_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+    abort_upload(db, upload_id, str(user.id))
+    return None
+
+
+@router.post(
+    "/uploads/resource/presigned",
+    dependencies=[Depends(require_any_role("TEACHER", "ADMIN"))],
+)
+def create_presigned_resource_upload(
+    payload: CreateUploadSessionRequest,
+    user=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    asset, upload_url = create_presigned_upload(db, str(user.id), payload.filename, payload.content_type, payload.size_bytes)
+    return {
+        "assetId": str(asset.id),
+        "uploadUrl": upload_url,
+        "method": "PUT",
+        "headers": {"Content-Type": asset.content_type},
+        "expiresIn": settings.s3_presign_ttl_seconds,
+    }
+
+
+@router.post(
+    "/uploads/presigned/{asset_id}/complete",
+    dependencies=[Depends(require_any_role("TEACHER", "ADMIN"))],
+)
+def complete_presigned_resource_upload(asset_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+    asset = complete_presigned_upload(db, asset_id, str(user.id))
+    return {"assetId": str(asset.id), "url": build_asset_url(asset.id)}
+
+
+def _stream_body(body):
+    # Runs to the end or is closed when the client goes away; either way release the connection.
+    try:
+        yield from iter(lambda: body.read(COPY_BUFFER_BYTES), b"")
+    finally:
+        body.close()
+
+
 @router.get("/assets/{asset_id}/content")
 def load_asset(asset_id: str, db: Session = Depends(get_db)):
     asset = get_asset(db, asset_id)
-    path = load_asset_path(asset)
-    if not path.exists():
+    if asset.status != "READY":
         raise HTTPException(status_code=404, detail="Fișierul nu mai există")
     headers = {}
     if asset.filename:
-        headers["Content-Disposition"] = f'inline; filename="{asset.filename}"'
+        headers["Content-Disposition"] = content_disposition(asset.filename)
+    # The body itself streams after the headers are sent; this covers locating and opening it.
+    with span("storage"):
+        storage = get_storage()
+        redirect = storage.presigned_get_url(asset.bucket, asset.storage_key, asset.content_type, asset.filename)
+        if redirect:
+            return RedirectResponse(redirect, status_code=307)
+        path = storage.local_path(asset.bucket, asset.storage_key)
+        if path is None:
+            if storage.size(asset.bucket, asset.storage_key) is None:
+                raise HTTPException(status_code=404, detail="Fișierul nu mai există")
+            body = storage.open(asset.bucket, asset.storage_key)
+            # The background task covers a generator that is abandoned without being closed.
+            return StreamingResponse(
+                _stream_body(body),
+                media_type=asset.content_type,
+                headers=headers,
+                background=BackgroundTask(body.close),
+            )
+        if not path.exists():
+            raise HTTPException(status_code=404, detail="Fișierul nu mai există")
+    offload = offload_headers(path)
+    if offload:
+        return Response(media_type=asset.content_type, headers={**headers, **offload})
     return FileResponse(path, media_type=asset.content_type, headers=headers)
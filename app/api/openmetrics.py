@@ -0,0 +1,20 @@
+import hmac
+
+from fastapi import APIRouter, Request, Response
+
+from app.core.config import settings
+from app.core.errors import ForbiddenError, NotFoundError
+from app.services.openmetrics import CONTENT_TYPE, render_openmetrics
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics(request: Request):
+    # Per-route traffic and process internals are not public: without a token the endpoint does not exist.
+    if not settings.metrics_scrape_token:
+        raise NotFoundError("Not found")
+    expected = f"Bearer {settings.metrics_scrape_token}"
+    if not hmac.compare_digest(request.headers.get("authorization", ""), expected):
+        raise ForbiddenError("Not allowed")
+    return Response(render_openmetrics(), media_type=CONTENT_TYPE)
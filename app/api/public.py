@@ -1,15 +1,21 @@
-import uuid
 from datetime import datetime, timezone
-from fastapi import APIRouter, Depends, Request
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import TypeAdapter, ValidationError
 from sqlalchemy.orm import Session
 
 from app.core.db import get_db
-from app.schemas.public import SearchResponse, SearchResultItem, VisitRequest, VisitCountResponse
+from app.core.config import settings
+from app.core.errors import BadRequestError
+from app.schemas.public import SearchResponse, SearchResultItem, VisitBatchItem, VisitBatchResponse, VisitRequest, VisitCountResponse
 from app.services.resources import search_published
-from app.models.site_visit import SiteVisit
+from app.services.visits import enqueue_visits, visit_row, visit_time, visit_total
 
 router = APIRouter(prefix="/public", tags=["public"])
 
+_visit_batch = TypeAdapter(List[VisitBatchItem])
+
 
 @router.get("/search", response_model=SearchResponse)
 def search(q: str | None = None, db: Session = Depends(get_db)):
@@ -29,28 +35,57 @@ def search(q: str | None = None, db: Session = Depends(get_db)):
 
 
 @router.post("/visits")
-def track_visit(payload: VisitRequest | None, request: Request, db: Session = Depends(get_db)):
+async def track_visit(payload: VisitRequest | None, request: Request):
+    # Queued for the flush loop; the request never waits on the database.
     ip = resolve_client_ip(request)
     ua = trim(request.headers.get("User-Agent"), 512)
     path = trim(payload.path if payload else None, 255)
     referrer = trim(payload.referrer if payload else None, 512)
-    visit = SiteVisit(
-        id=uuid.uuid4(),
-        ip_address=ip,
-        user_agent=ua,
-        path=path,
-        referrer=referrer,
-        created_at=datetime.now(timezone.utc),
-    )
-    db.add(visit)
-    db.commit()
+    enqueue_visits([visit_row(ip, ua, path, referrer)])
     return None
 
 
+@router.post("/visits/batch", response_model=VisitBatchResponse)
+async def track_visit_batch(request: Request):
+    """Several route changes in one request, as sent by navigator.sendBeacon.
+
+    The body is a JSON array of {path, referrer, ts}. sendBeacon posts it as text/plain,
+    so the raw body is parsed here instead of relying on the JSON content type.
+    """
+    body = await _read_capped(request, settings.visit_batch_max_bytes)
+    try:
+        items = _visit_batch.validate_json(body)
+    except ValidationError:
+        raise BadRequestError("Invalid visit batch")
+    if len(items) > settings.visit_batch_max_items:
+        raise BadRequestError("Too many visits in batch")
+
+    ip = resolve_client_ip(request)
+    ua = trim(request.headers.get("User-Agent"), 512)
+    now = datetime.now(timezone.utc)
+    rows = [
+        visit_row(ip, ua, trim(item.path, 255), trim(item.referrer, 512), visit_time(item.ts, now))
+        for item in items
+    ]
+    return VisitBatchResponse(accepted=enqueue_visits(rows))
+
+
+async def _read_capped(request: Request, max_bytes: int) -> bytes:
+    # Without a Content-Length (chunked transfer) the size is only known while reading.
+    declared = request.headers.get("Content-Length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise HTTPException(status_code=413, detail="Batch too large")
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_bytes:
+            raise HTTPException(status_code=413, detail="Batch too large")
+    return bytes(body)
+
+
 @router.get("/visits/count", response_model=VisitCountResponse)
 def visit_count(db: Session = Depends(get_db)):
-    total = db.query(SiteVisit).count()
-    return VisitCountResponse(total=total)
+    return VisitCountResponse(total=visit_total(db))
 
 
 def resolve_client_ip(request: Request) -> str | None:
@@ -1,3 +1,4 @@
+from typing import Literal
 from pydantic_settings import BaseSettings
 from pydantic import Field
 
@@ -9,8 +10,51 @@ class Settings(BaseSettings):
     access_ttl_seconds: int = Field(alias="ACCESS_TTL_SECONDS", default=14400)
     refresh_ttl_seconds: int = Field(alias="REFRESH_TTL_SECONDS", default=1209600)
     media_storage_path: str = Field(alias="MEDIA_STORAGE_PATH", default="storage/media")
+    storage_backend: Literal["local", "s3"] = Field(alias="STORAGE_BACKEND", default="local")
+    s3_bucket: str = Field(alias="S3_BUCKET", default="")
+    s3_endpoint_url: str = Field(alias="S3_ENDPOINT_URL", default="")
+    s3_region: str = Field(alias="S3_REGION", default="")
+    s3_access_key_id: str = Field(alias="S3_ACCESS_KEY_ID", default="")
+    s3_secret_access_key: str = Field(alias="S3_SECRET_ACCESS_KEY", default="")
+    s3_presign_ttl_seconds: int = Field(alias="S3_PRESIGN_TTL_SECONDS", default=900)
+    s3_presign_downloads: bool = Field(alias="S3_PRESIGN_DOWNLOADS", default=True)
+    media_upload_max_bytes: int = Field(alias="MEDIA_UPLOAD_MAX_BYTES", default=2147483648)
+    media_upload_chunk_max_bytes: int = Field(alias="MEDIA_UPLOAD_CHUNK_MAX_BYTES", default=8388608)
+    media_upload_session_ttl_seconds: int = Field(alias="MEDIA_UPLOAD_SESSION_TTL_SECONDS", default=86400)
+    media_serve_mode: Literal["direct", "x-accel-redirect", "x-sendfile"] = Field(alias="MEDIA_SERVE_MODE", default="direct")
+    media_accel_prefix: str = Field(alias="MEDIA_ACCEL_PREFIX", default="/internal-media")
+    media_gc_interval_seconds: int = Field(alias="MEDIA_GC_INTERVAL_SECONDS", default=3600)
+    media_gc_grace_seconds: int = Field(alias="MEDIA_GC_GRACE_SECONDS", default=86400)
+    media_gc_batch_size: int = Field(alias="MEDIA_GC_BATCH_SIZE", default=200)
     metrics_disk_path: str = Field(alias="METRICS_DISK_PATH", default="storage/media")
     metrics_sample_interval: int = Field(alias="METRICS_SAMPLE_INTERVAL", default=5)
+    metrics_flush_interval: int = Field(alias="METRICS_FLUSH_INTERVAL", default=30)
+    metrics_buffer_size: int = Field(alias="METRICS_BUFFER_SIZE", default=1000)
+    metrics_history_size: int = Field(alias="METRICS_HISTORY_SIZE", default=720)
+    metrics_multiproc_dir: str = Field(alias="METRICS_MULTIPROC_DIR", default="")
+    metrics_scrape_token: str = Field(alias="METRICS_SCRAPE_TOKEN", default="")
+    loop_lag_threshold_ms: int = Field(alias="LOOP_LAG_THRESHOLD_MS", default=200)
+    slow_query_ms: int = Field(alias="SLOW_QUERY_MS", default=200)
+    n_plus_one_threshold: int = Field(alias="N_PLUS_ONE_THRESHOLD", default=5)
+    server_timing_sample_rate: float = Field(alias="SERVER_TIMING_SAMPLE_RATE", default=0.0)
+    profiler_continuous_hz: float = Field(alias="PROFILER_CONTINUOUS_HZ", default=0.0)
+    profiles_dir: str = Field(alias="PROFILES_DIR", default="storage/logs/profiles")
+    tracemalloc_interval: int = Field(alias="TRACEMALLOC_INTERVAL", default=0)
+    tracemalloc_frames: int = Field(alias="TRACEMALLOC_FRAMES", default=1)
+    tracemalloc_top_n: int = Field(alias="TRACEMALLOC_TOP_N", default=10)
+    visit_buffer_size: int = Field(alias="VISIT_BUFFER_SIZE", default=10000)
+    visit_flush_batch: int = Field(alias="VISIT_FLUSH_BATCH", default=500)
+    visit_flush_interval_ms: int = Field(alias="VISIT_FLUSH_INTERVAL_MS", default=1000)
+    visit_batch_max_items: int = Field(alias="VISIT_BATCH_MAX_ITEMS", default=50)
+    visit_batch_max_bytes: int = Field(alias="VISIT_BATCH_MAX_BYTES", default=32768)
+    visit_count_cache_seconds: float = Field(alias="VISIT_COUNT_CACHE_SECONDS", default=5.0)
+    visit_rollup_interval: int = Field(alias="VISIT_ROLLUP_INTERVAL", default=300)
+    visit_raw_retention_days: int = Field(alias="VISIT_RAW_RETENTION_DAYS", default=400)
+    metrics_rollup_interval: int = Field(alias="METRICS_ROLLUP_INTERVAL", default=60)
+    metrics_raw_retention_days: int = Field(alias="METRICS_RAW_RETENTION_DAYS", default=7)
+    metrics_rollup_1m_retention_days: int = Field(alias="METRICS_ROLLUP_1M_RETENTION_DAYS", default=30)
+    metrics_rollup_1h_retention_days: int = Field(alias="METRICS_ROLLUP_1H_RETENTION_DAYS", default=365)
+    metrics_rollup_1d_retention_days: int = Field(alias="METRICS_ROLLUP_1D_RETENTION_DAYS", default=0)
     cors_origins: str = Field(alias="CORS_ORIGINS", default="")
 
     class Config:
@@ -0,0 +1,87 @@
+import threading
+import time
+from typing import Callable
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+
+class _IntervalStats:
+    """Counters accumulated since the last metrics sample; touched from many threads."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_wait_ms = 0.0
+        self.queries = 0
+        self.query_time_ms = 0.0
+
+
+_stats = _IntervalStats()
+# Callbacks receiving (statement, elapsed_ms) after every query.
+_query_observers: list[Callable[[str, float], None]] = []
+
+
+def add_query_observer(observer: Callable[[str, float], None]):
+    _query_observers.append(observer)
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that measures how long callers wait for a connection.
+
+    Pool events only fire once a connection has been handed out, so the wait is timed
+    around the pool's own getter.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited_ms = (time.perf_counter() - start) * 1000
+            with _stats.lock:
+                _stats.checkouts += 1
+                _stats.checkout_wait_ms += waited_ms
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+    with _stats.lock:
+        _stats.queries += 1
+        _stats.query_time_ms += elapsed_ms
+    for observer in _query_observers:
+        observer(statement, elapsed_ms)
+
+
+def _handle_error(exception_context):
+    starts = exception_context.connection.info.get("query_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engine(engine: Engine):
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def take_pool_stats(engine: Engine) -> dict:
+    """Pool state right now plus the query and checkout counters since the previous call."""
+    with _stats.lock:
+        checkouts, wait_ms = _stats.checkouts, _stats.checkout_wait_ms
+        queries, query_time_ms = _stats.queries, _stats.query_time_ms
+        _stats.checkouts = _stats.queries = 0
+        _stats.checkout_wait_ms = _stats.query_time_ms = 0.0
+    pool = engine.pool
+    return {
+        "db_pool_checked_out": pool.checkedout() if hasattr(pool, "checkedout") else 0,
+        "db_pool_overflow": max(pool.overflow(), 0) if hasattr(pool, "overflow") else 0,
+        "db_checkout_wait_ms": wait_ms / checkouts if checkouts else None,
+        "db_query_count": queries,
+        "db_query_time_ms": query_time_ms,
+    }
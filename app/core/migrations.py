@@ -25,6 +25,21 @@ def applied_versions(conn) -> set[str]:
     return {row[0] for row in rows}
 
 
+def split_statements(sql: str) -> list[str]:
+    """Split on semicolons that end a line, except inside $$-quoted function bodies."""
+    statements = []
+    current = ""
+    for part in re.split(r";\s*$", sql, flags=re.MULTILINE):
+        current = f"{current};{part}" if current else part
+        if current.count("$$") % 2 == 0:
+            if current.strip():
+                statements.append(current)
+            current = ""
+    if current.strip():
+        statements.append(current)
+    return statements
+
+
 def run_migrations():
     if not MIGRATIONS_DIR.exists():
         return
@@ -46,6 +61,6 @@ def run_migrations():
             if not sql.strip():
                 conn.execute(text("INSERT INTO schema_migrations (version) VALUES (:v)"), {"v": version})
                 continue
-            for statement in [s for s in re.split(r";\s*$", sql, flags=re.MULTILINE) if s.strip()]:
+            for statement in split_statements(sql):
                 conn.execute(text(statement))
             conn.execute(text("INSERT INTO schema_migrations (version) VALUES (:v)"), {"v": version})
@@ -0,0 +1,62 @@
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+class RequestStats:
+    """Timings and queries of one request; shared by reference with the handler thread."""
+
+    def __init__(self, scope: dict) -> None:
+        self.scope = scope
+        self.query_count = 0
+        self.query_time_ms = 0.0
+        self.shapes: Counter[str] = Counter()
+        self.spans: dict[str, float] = {}
+        self.is_admin = False
+        # perf_counter() marks set around the endpoint call by the route instrumentation.
+        self.endpoint_started: float | None = None
+        self.endpoint_finished: float | None = None
+        # Set by the middleware for admin requests carrying X-Profile.
+        self.profile_requested = False
+        self.profile_file: str | None = None
+        self.profile_skipped = False
+
+    def add_span(self, name: str, duration_ms: float):
+        self.spans[name] = self.spans.get(name, 0.0) + duration_ms
+
+
+_current: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def begin_request(scope: dict):
+    """Start collecting for the request; returns the stats and a token for end_request."""
+    stats = RequestStats(scope)
+    return stats, _current.set(stats)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def current_request_stats() -> RequestStats | None:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str):
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add_span(name, (time.perf_counter() - start) * 1000)
+
+
+def mark_admin_request():
+    stats = _current.get()
+    if stats is not None:
+        stats.is_admin = True
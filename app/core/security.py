@@ -7,6 +7,7 @@ from sqlalchemy.orm import Session
 
 from app.core.config import settings
 from app.core.db import get_db
+from app.core.request_context import mark_admin_request, span
 from app.models.user import User
 from app.models.role import Role
 from app.models.user_role import UserRole
@@ -61,29 +62,38 @@ def get_current_user(
     creds: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db),
 ) -> User:
-    token = creds.credentials
-    try:
-        claims = decode_token(token)
-        if claims.get("typ") != "access":
+    with span("auth"):
+        token = creds.credentials
+        try:
+            claims = decode_token(token)
+            if claims.get("typ") != "access":
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+            user_id = claims.get("sub")
+        except JWTError:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+        user = db.get(User, user_id)
+        if not user:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-        user_id = claims.get("sub")
-    except JWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-    user = db.get(User, user_id)
-    if not user:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-    return user
+        return user
 
 
-def require_role(role: str):
-    def checker(user: User = Depends(get_current_user), db: Session = Depends(get_db)) -> User:
+def _role_codes(db: Session, user: User) -> set[str]:
+    with span("auth"):
         roles = (
             db.query(Role.code)
             .join(UserRole, UserRole.role_id == Role.id)
             .filter(UserRole.user_id == user.id)
             .all()
         )
-        role_codes = {r[0] for r in roles}
+    role_codes = {r[0] for r in roles}
+    if "ADMIN" in role_codes:
+        mark_admin_request()
+    return role_codes
+
+
+def require_role(role: str):
+    def checker(user: User = Depends(get_current_user), db: Session = Depends(get_db)) -> User:
+        role_codes = _role_codes(db, user)
         if role not in role_codes:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
         return user
@@ -93,13 +103,7 @@ def require_role(role: str):
 
 def require_any_role(*roles_required: str):
     def checker(user: User = Depends(get_current_user), db: Session = Depends(get_db)) -> User:
-        roles = (
-            db.query(Role.code)
-            .join(UserRole, UserRole.role_id == Role.id)
-            .filter(UserRole.user_id == user.id)
-            .all()
-        )
-        role_codes = {r[0] for r in roles}
+        role_codes = _role_codes(db, user)
         if not any(role in role_codes for role in roles_required):
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
         return user
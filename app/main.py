@@ -7,10 +7,12 @@ from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Requ
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
 from app.core.db import get_db, SessionLocal
+from app.core.db_instrumentation import add_query_observer
 from app.core.migrations import run_migrations
 from app.core.security import decode_token
 from app.core.errors import BadRequestError, ForbiddenError, NotFoundError
@@ -26,8 +28,28 @@ from app.api.public import router as public_router
 from app.api.groups_admin import router as admin_groups_router
 from app.api.groups_teacher import router as teacher_groups_router
 from app.api.groups_student import router as student_groups_router
-from app.services.metrics import capture_metrics
+from app.api.openmetrics import router as openmetrics_router
+from app.api.admin_profiler import router as admin_profiler_router
+from app.api.admin_memory import router as admin_memory_router
+from app.api.admin_analytics import router as admin_analytics_router
+from app.services.media import reclaim_pending
+from app.services.loop_monitor import loop_monitor
+from app.services.media_gc import media_gc_loop, media_reclaim_loop
+from app.services.metrics import flush_samples, recent_samples, metrics_flush_loop, sample_payload
+from app.services.metrics_leader import metrics_sampler_loop
+from app.services.metrics_rollups import metrics_rollup_loop
+from app.services.openmetrics import remove_snapshot
+from app.core.request_context import begin_request, end_request
+from app.services.memory_diagnostics import memory_growth_loop
+from app.services.profiler import start_continuous_profiler
+from app.services.partitions import partition_maintenance_loop
+from app.services.visit_rollups import visit_rollup_loop
+from app.services.visits import flush_visits, visit_flush_loop
+from app.services.request_stats import instrument_routes, observe_query, report_repeated_queries, server_timing, timing_breakdown, wants_profile, wants_server_timing
+from app.services.route_metrics import observe_request, route_template
+from app.services.task_health import start_background_task
 from app.ws.metrics import metrics_socket_manager
+from app.ws.metrics_protocol import SUBPROTOCOL, MetricsSubscription
 from app.services.role_groups import ensure_all_role_groups_exist
 
 log_level = os.getenv("LOG_LEVEL", "INFO").upper()
@@ -48,6 +70,9 @@ logging.basicConfig(level=log_level, handlers=[stream_handler, file_handler])
 
 app = FastAPI(title="FizicaMD API")
 logger = logging.getLogger("fizicamd")
+add_query_observer(observe_query)
+
+METRICS_WS_BACKLOG = 120
 
 origins = [o.strip() for o in settings.cors_origins.split(",") if o.strip()]
 if origins:
@@ -71,19 +96,60 @@ app.include_router(public_router, prefix="/api")
 app.include_router(admin_groups_router, prefix="/api")
 app.include_router(teacher_groups_router, prefix="/api")
 app.include_router(student_groups_router, prefix="/api")
+app.include_router(admin_profiler_router, prefix="/api")
+app.include_router(admin_memory_router, prefix="/api")
+app.include_router(admin_analytics_router, prefix="/api")
+app.include_router(openmetrics_router)
+instrument_routes(app)
 
 
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     start = time.perf_counter()
-    response = await call_next(request)
+    stats, token = begin_request(request.scope)
+    stats.profile_requested = wants_profile(request)
+    try:
+        response = await call_next(request)
+    except Exception:
+        # The 500 response is built by ServerErrorMiddleware outside of this middleware,
+        # so count the request here or it never shows up in the route histograms.
+        observe_request(
+            request.method,
+            route_template(request.scope),
+            500,
+            (time.perf_counter() - start) * 1000,
+            int(request.headers.get("content-length") or 0),
+            0,
+            timing_breakdown(stats),
+        )
+        raise
+    finally:
+        end_request(token)
     duration_ms = (time.perf_counter() - start) * 1000
+    report_repeated_queries(stats)
+    if wants_server_timing(stats):
+        response.headers["Server-Timing"] = server_timing(stats, duration_ms)
+    if stats.profile_file:
+        response.headers["X-Profile-File"] = stats.profile_file
+    elif stats.profile_skipped:
+        response.headers["X-Profile-Skipped"] = "busy"
+    observe_request(
+        request.method,
+        route_template(request.scope),
+        response.status_code,
+        duration_ms,
+        int(request.headers.get("content-length") or 0),
+        int(response.headers.get("content-length") or 0),
+        timing_breakdown(stats),
+    )
     logger.info(
-        "%s %s %d %.2fms",
+        "%s %s %d %.2fms db=%d/%.2fms",
         request.method,
         request.url.path,
         response.status_code,
         duration_ms,
+        stats.query_count,
+        stats.query_time_ms,
     )
     return response
 
@@ -135,32 +201,34 @@ async def startup_event():
         logger.info("role groups ensured")
     finally:
         db.close()
-    asyncio.create_task(metrics_loop())
+    start_background_task("loop_monitor", loop_monitor())
+    start_continuous_profiler()
+    start_background_task("memory_growth", memory_growth_loop())
+    start_background_task("metrics_sample", metrics_sampler_loop(metrics_socket_manager.broadcast))
+    start_background_task("metrics_flush", metrics_flush_loop())
+    start_background_task("visit_flush", visit_flush_loop())
+    start_background_task("visit_rollup", visit_rollup_loop())
+    start_background_task("partition_maintenance", partition_maintenance_loop())
+    start_background_task("metrics_rollup", metrics_rollup_loop())
+    start_background_task("media_reclaim", media_reclaim_loop())
+    start_background_task("media_gc", media_gc_loop())
 
 
-async def metrics_loop():
-    while True:
-        try:
-            db = SessionLocal()
-            try:
-                sample = capture_metrics(db)
-                payload = {
-                    "capturedAt": sample.captured_at.isoformat(),
-                    "heapUsedBytes": sample.heap_used_bytes,
-                    "heapMaxBytes": sample.heap_max_bytes,
-                    "systemMemoryTotalBytes": sample.system_memory_total_bytes,
-                    "systemMemoryUsedBytes": sample.system_memory_used_bytes,
-                    "diskTotalBytes": sample.disk_total_bytes,
-                    "diskUsedBytes": sample.disk_used_bytes,
-                    "processCpuLoad": sample.process_cpu_load,
-                    "systemCpuLoad": sample.system_cpu_load,
-                }
-                await metrics_socket_manager.broadcast(payload)
-            finally:
-                db.close()
-        except Exception:
-            logger.exception("metrics loop error")
-        await asyncio.sleep(settings.metrics_sample_interval)
+@app.on_event("shutdown")
+async def shutdown_event():
+    reclaimed = await asyncio.to_thread(reclaim_pending)
+    logger.info("shutting down, reclaimed %d media files", reclaimed)
+    try:
+        flushed = await asyncio.to_thread(flush_samples)
+        logger.info("flushed %d metric samples", flushed)
+    except Exception:
+        logger.exception("metrics flush on shutdown failed")
+    try:
+        flushed = await asyncio.to_thread(flush_visits)
+        logger.info("flushed %d visits", flushed)
+    except Exception:
+        logger.exception("visit flush on shutdown failed")
+    remove_snapshot()
 
 
 @app.websocket("/ws/metrics")
@@ -178,9 +246,26 @@ async def ws_metrics(ws: WebSocket):
         await ws.close(code=1008)
         return
 
-    await metrics_socket_manager.connect(ws)
+    compact = SUBPROTOCOL in ws.scope.get("subprotocols", [])
+    if compact:
+        await metrics_socket_manager.connect(ws, subprotocol=SUBPROTOCOL)
+    else:
+        # New dashboards get the recent history right away instead of an empty chart.
+        backlog = [sample_payload(sample) for sample in recent_samples(METRICS_WS_BACKLOG)]
+        await metrics_socket_manager.connect(ws, backlog)
     try:
         while True:
-            await ws.receive_text()
+            message = await ws.receive_text()
+            if not compact:
+                continue
+            try:
+                subscription = MetricsSubscription.model_validate_json(message)
+            except ValidationError:
+                await metrics_socket_manager.send_error(ws, "Invalid subscription")
+                continue
+            backfill = [sample_payload(sample) for sample in recent_samples(subscription.backfill)]
+            await metrics_socket_manager.subscribe(ws, subscription, backfill)
     except WebSocketDisconnect:
+        pass
+    finally:
         await metrics_socket_manager.disconnect(ws)
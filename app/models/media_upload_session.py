@@ -0,0 +1,20 @@
+from sqlalchemy import Column, String, DateTime, BigInteger
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+from app.core.db import Base
+
+
+class MediaUploadSession(Base):
+    __tablename__ = "media_upload_sessions"
+
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    owner_user_id = Column(UUID(as_uuid=True), nullable=False)
+    bucket = Column(String, nullable=False)
+    filename = Column(String)
+    content_type = Column(String, nullable=False)
+    size_bytes = Column(BigInteger, nullable=False)
+    received_ranges = Column(JSONB, nullable=False)
+    multipart_upload_id = Column(String)
+    parts = Column(JSONB, nullable=False, default=dict)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, DateTime, BigInteger, Integer, String
+from sqlalchemy.dialects.postgresql import UUID
+from app.core.db import Base
+
+
+class MemoryGrowthSample(Base):
+    __tablename__ = "memory_growth_samples"
+
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    captured_at = Column(DateTime(timezone=True), nullable=False)
+    pid = Column(Integer, nullable=False)
+    filename = Column(String, nullable=False)
+    lineno = Column(Integer, nullable=False)
+    size_bytes = Column(BigInteger, nullable=False)
+    size_diff_bytes = Column(BigInteger, nullable=False)
+    count = Column(Integer, nullable=False)
+    count_diff = Column(Integer, nullable=False)
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, String, Integer, DateTime, Float
+from app.core.db import Base
+
+
+class _RollupColumns:
+    metric = Column(String, primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    sample_count = Column(Integer, nullable=False)
+    min_value = Column(Float)
+    avg_value = Column(Float)
+    max_value = Column(Float)
+    p95_value = Column(Float)
+
+
+class ServerMetricRollup1m(_RollupColumns, Base):
+    __tablename__ = "server_metric_rollups_1m"
+
+
+class ServerMetricRollup1h(_RollupColumns, Base):
+    __tablename__ = "server_metric_rollups_1h"
+
+
+class ServerMetricRollup1d(_RollupColumns, Base):
+    __tablename__ = "server_metric_rollups_1d"
@@ -16,3 +16,11 @@ class ServerMetricSample(Base):
     disk_used_bytes = Column(BigInteger, nullable=False)
     process_cpu_load = Column(Float)
     system_cpu_load = Column(Float)
+    db_pool_checked_out = Column(BigInteger, nullable=False, default=0)
+    db_pool_overflow = Column(BigInteger, nullable=False, default=0)
+    db_checkout_wait_ms = Column(Float)
+    db_query_count = Column(BigInteger, nullable=False, default=0)
+    db_query_time_ms = Column(Float)
+    event_loop_lag_ms = Column(Float)
+    threadpool_in_use = Column(BigInteger, nullable=False, default=0)
+    threadpool_waiting = Column(BigInteger, nullable=False, default=0)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime
+from sqlalchemy import Column, String, DateTime, func
 from sqlalchemy.dialects.postgresql import UUID
 from app.core.db import Base
 
@@ -12,3 +12,5 @@ class SiteVisit(Base):
     path = Column(String)
     referrer = Column(String)
     created_at = Column(DateTime(timezone=True), nullable=False)
+    # Set by the database on insert; created_at can be an older client timestamp.
+    ingested_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
@@ -0,0 +1,9 @@
+from sqlalchemy import Column, String, BigInteger
+from app.core.db import Base
+
+
+class SiteVisitCounter(Base):
+    __tablename__ = "site_visit_counters"
+
+    name = Column(String, primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,37 @@
+from sqlalchemy import Column, String, Date, DateTime, BigInteger, Boolean, LargeBinary
+from app.core.db import Base
+
+
+class SiteVisitDaily(Base):
+    __tablename__ = "site_visit_daily"
+
+    day = Column(Date, primary_key=True)
+    views = Column(BigInteger, nullable=False)
+    visitors_hll = Column(LargeBinary, nullable=False)
+
+
+class SiteVisitDailyPath(Base):
+    __tablename__ = "site_visit_daily_paths"
+
+    day = Column(Date, primary_key=True)
+    # "" for visits that did not report a path
+    path = Column(String, primary_key=True)
+    views = Column(BigInteger, nullable=False)
+    visitors_hll = Column(LargeBinary, nullable=False)
+
+
+class SiteVisitDailyReferrer(Base):
+    __tablename__ = "site_visit_daily_referrers"
+
+    day = Column(Date, primary_key=True)
+    # Lowercased host of the referrer, "" for direct visits
+    referrer_host = Column(String, primary_key=True)
+    views = Column(BigInteger, nullable=False)
+
+
+class SiteVisitRollupState(Base):
+    __tablename__ = "site_visit_rollup_state"
+
+    id = Column(Boolean, primary_key=True, default=True)
+    # Visits ingested before this are in the daily tables; NULL until the first run
+    folded_until = Column(DateTime(timezone=True))
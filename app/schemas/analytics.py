@@ -0,0 +1,29 @@
+from pydantic import BaseModel
+from typing import List
+
+
+class DailyTrafficDto(BaseModel):
+    day: str
+    views: int
+    unique_visitors: int
+
+
+class PathTrafficDto(BaseModel):
+    path: str
+    views: int
+    unique_visitors: int
+
+
+class ReferrerTrafficDto(BaseModel):
+    referrer: str
+    views: int
+
+
+class TrafficResponse(BaseModel):
+    start: str
+    end: str
+    views: int
+    unique_visitors: int
+    days: List[DailyTrafficDto]
+    top_paths: List[PathTrafficDto]
+    top_referrers: List[ReferrerTrafficDto]
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from typing import List, Literal, Optional, Union
 
 
 class CreateGroupRequest(BaseModel):
@@ -37,3 +37,21 @@ class GroupResponse(BaseModel):
     year: Optional[int] = None
     created_at: Optional[str] = Field(default=None, alias="createdAt")
     members: List[MemberResponse]
+
+
+class GroupSummaryResponse(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+    id: str
+    name: str
+    grade: Optional[int] = None
+    year: Optional[int] = None
+    created_at: Optional[str] = Field(default=None, alias="createdAt")
+    my_role: str = Field(alias="myRole")
+    member_count: int = Field(alias="memberCount")
+    teacher_count: int = Field(alias="teacherCount")
+    student_count: int = Field(alias="studentCount")
+
+
+# ?view=summary on the "my groups" lists returns counts instead of member lists.
+GroupListView = Literal["full", "summary"]
+GroupListResponse = Union[List[GroupResponse], List[GroupSummaryResponse]]
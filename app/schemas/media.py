@@ -0,0 +1,28 @@
+from pydantic import BaseModel, Field, ConfigDict
+from typing import List, Optional
+
+
+class CreateUploadSessionRequest(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+    filename: Optional[str] = Field(default=None, max_length=255)
+    content_type: Optional[str] = Field(default=None, max_length=255, alias="contentType")
+    size_bytes: int = Field(gt=0, alias="sizeBytes")
+
+
+class FinalizeUploadRequest(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+    sha256: Optional[str] = Field(default=None, max_length=64)
+
+
+class UploadSessionResponse(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+    upload_id: str = Field(alias="uploadId")
+    filename: Optional[str] = None
+    content_type: str = Field(alias="contentType")
+    size_bytes: int = Field(alias="sizeBytes")
+    received_bytes: int = Field(alias="receivedBytes")
+    received_ranges: List[List[int]] = Field(alias="receivedRanges")
+    max_chunk_bytes: int = Field(alias="maxChunkBytes")
+    # Set on object storage: chunks must start at multiples of it and be exactly that long (the last one may be shorter).
+    part_size: Optional[int] = Field(default=None, alias="partSize")
+    expires_at: str = Field(alias="expiresAt")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 
 class MetricSampleDto(BaseModel):
@@ -12,7 +12,88 @@ class MetricSampleDto(BaseModel):
     disk_used_bytes: int
     process_cpu_load: Optional[float] = None
     system_cpu_load: Optional[float] = None
+    db_pool_checked_out: int = 0
+    db_pool_overflow: int = 0
+    db_checkout_wait_ms: Optional[float] = None
+    db_query_count: int = 0
+    db_query_time_ms: Optional[float] = None
+    event_loop_lag_ms: Optional[float] = None
+    threadpool_in_use: int = 0
+    threadpool_waiting: int = 0
+
+
+class MetricRollupDto(BaseModel):
+    bucket_start: str
+    metric: str
+    sample_count: int
+    min: Optional[float] = None
+    avg: Optional[float] = None
+    max: Optional[float] = None
+    p95: Optional[float] = None
 
 
 class MetricsHistoryResponse(BaseModel):
     items: List[MetricSampleDto]
+    resolution: str = "raw"
+    rollups: List[MetricRollupDto] = []
+
+
+class RouteLatencyDto(BaseModel):
+    method: str
+    route: str
+    status: int
+    count: int
+    avg_ms: float
+    p50_ms: Optional[float] = None
+    p95_ms: Optional[float] = None
+    p99_ms: Optional[float] = None
+    request_bytes: int
+    response_bytes: int
+    span_avg_ms: Dict[str, float] = {}
+
+
+class RouteLatencyResponse(BaseModel):
+    items: List[RouteLatencyDto]
+
+
+class TracemallocSnapshotDto(BaseModel):
+    name: str
+    taken_at: str
+
+
+class TracemallocStatusDto(BaseModel):
+    tracing: bool
+    frames: int
+    traced_bytes: int
+    peak_traced_bytes: int
+    overhead_bytes: int
+    snapshots: List[TracemallocSnapshotDto]
+
+
+class AllocationDiffDto(BaseModel):
+    filename: str
+    lineno: int
+    traceback: List[str] = []
+    size_bytes: int
+    size_diff_bytes: int
+    count: int
+    count_diff: int
+
+
+class AllocationDiffResponse(BaseModel):
+    items: List[AllocationDiffDto]
+
+
+class MemoryGrowthDto(BaseModel):
+    captured_at: str
+    pid: int
+    filename: str
+    lineno: int
+    size_bytes: int
+    size_diff_bytes: int
+    count: int
+    count_diff: int
+
+
+class MemoryGrowthResponse(BaseModel):
+    items: List[MemoryGrowthDto]
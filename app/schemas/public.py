@@ -1,3 +1,4 @@
+from datetime import datetime
 from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Optional
 
@@ -21,5 +22,16 @@ class VisitRequest(BaseModel):
     referrer: Optional[str] = None
 
 
+class VisitBatchItem(BaseModel):
+    path: Optional[str] = None
+    referrer: Optional[str] = None
+    # When the route change happened on the client: ISO 8601 or epoch milliseconds.
+    ts: Optional[datetime] = None
+
+
+class VisitBatchResponse(BaseModel):
+    accepted: int
+
+
 class VisitCountResponse(BaseModel):
     total: int
@@ -1,6 +1,7 @@
 import uuid
 from datetime import datetime, timezone
-from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.orm import Session, aliased
 
 from app.core.errors import BadRequestError, ForbiddenError, NotFoundError
 from app.models.group import Group
@@ -153,6 +154,39 @@ def my_groups(db: Session, actor_id: str):
     return [get_group_view(db, group_id, actor_id, True) for group_id in ids]
 
 
+def my_group_summaries(db: Session, actor_id: str):
+    """The actor's groups with member counts, in one query and without member lists."""
+    mine = aliased(GroupMember)
+    rows = (
+        db.query(
+            Group,
+            mine.member_role,
+            func.count(GroupMember.id),
+            func.count(GroupMember.id).filter(GroupMember.member_role == "TEACHER"),
+            func.count(GroupMember.id).filter(GroupMember.member_role == "STUDENT"),
+        )
+        .join(mine, (mine.group_id == Group.id) & (mine.user_id == actor_id))
+        .join(GroupMember, GroupMember.group_id == Group.id)
+        .group_by(Group.id, mine.member_role)
+        .order_by(Group.name)
+        .all()
+    )
+    return [
+        {
+            "id": str(group.id),
+            "name": group.name,
+            "grade": group.grade,
+            "year": group.year,
+            "created_at": group.created_at.isoformat() if group.created_at else None,
+            "my_role": my_role,
+            "member_count": member_count,
+            "teacher_count": teacher_count,
+            "student_count": student_count,
+        }
+        for group, my_role, member_count, teacher_count, student_count in rows
+    ]
+
+
 def get_group_view(db: Session, group_id: str, actor_id: str, actor_is_admin: bool):
     if not actor_is_admin and not _is_member(db, group_id, actor_id):
         raise ForbiddenError("Not allowed")
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+import anyio.to_thread
+
+from app.core.config import settings
+
+logger = logging.getLogger("fizicamd.loop")
+
+PROBE_INTERVAL_SECONDS = 0.25
+
+
+class _LoopStats:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.max_lag_ms: float | None = None
+        self.threadpool_in_use = 0
+        self.threadpool_waiting = 0
+        # time.monotonic() of the last probe wakeup, read by the watchdog thread.
+        self.heartbeat: float | None = None
+
+
+_stats = _LoopStats()
+
+
+def take_loop_stats() -> dict:
+    """Worst loop lag since the previous call plus the latest threadpool gauges."""
+    with _stats.lock:
+        max_lag_ms = _stats.max_lag_ms
+        _stats.max_lag_ms = None
+        return {
+            "event_loop_lag_ms": max_lag_ms,
+            "threadpool_in_use": _stats.threadpool_in_use,
+            "threadpool_waiting": _stats.threadpool_waiting,
+        }
+
+
+def _record_probe(lag_ms: float, in_use: int, waiting: int):
+    with _stats.lock:
+        if _stats.max_lag_ms is None or lag_ms > _stats.max_lag_ms:
+            _stats.max_lag_ms = lag_ms
+        _stats.threadpool_in_use = in_use
+        _stats.threadpool_waiting = waiting
+        _stats.heartbeat = time.monotonic()
+
+
+def _watchdog(loop_thread_id: int, threshold: float):
+    """Log where the loop thread is stuck while it is stuck; the probe can only measure afterwards."""
+    reported = None
+    while True:
+        time.sleep(threshold / 2)
+        heartbeat = _stats.heartbeat
+        if heartbeat is None:
+            continue
+        stalled = time.monotonic() - heartbeat
+        if stalled < threshold + PROBE_INTERVAL_SECONDS or reported == heartbeat:
+            continue
+        reported = heartbeat
+        frame = sys._current_frames().get(loop_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame else "<unavailable>\n"
+        logger.warning("event loop blocked for %.0fms, loop thread stack:\n%s", stalled * 1000, stack)
+
+
+async def loop_monitor():
+    """Measure how late the event loop wakes up and sample the AnyIO threadpool that runs sync handlers."""
+    loop = asyncio.get_running_loop()
+    threshold = settings.loop_lag_threshold_ms / 1000
+    if threshold > 0:
+        threading.Thread(
+            target=_watchdog,
+            args=(threading.get_ident(), threshold),
+            name="loop-watchdog",
+            daemon=True,
+        ).start()
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    while True:
+        expected = loop.time() + PROBE_INTERVAL_SECONDS
+        await asyncio.sleep(PROBE_INTERVAL_SECONDS)
+        lag_ms = max(loop.time() - expected, 0.0) * 1000
+        statistics = limiter.statistics()
+        _record_probe(lag_ms, statistics.borrowed_tokens, statistics.tasks_waiting)
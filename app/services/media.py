@@ -1,4 +1,5 @@
 import hashlib
+import queue
 import uuid
 from datetime import datetime, timezone
 from pathlib import Path
@@ -8,47 +9,47 @@ from app.core.config import settings
 from app.core.errors import BadRequestError, NotFoundError
 from app.models.media_asset import MediaAsset
 from app.models.user_profile import UserProfile
+from app.services.storage import BASE_DIR, get_storage
 
 USERS_BUCKET = "users"
 RESOURCES_BUCKET = "resources"
 
-BASE_DIR = Path(settings.media_storage_path)
-BASE_DIR.mkdir(parents=True, exist_ok=True)
+# (bucket, storage_key) pairs whose rows are gone; files are unlinked by the reclaim loop.
+_reclaim_queue: "queue.SimpleQueue[tuple[str, str]]" = queue.SimpleQueue()
 
 
-def _hash_file(path: Path) -> str:
-    sha = hashlib.sha256()
-    with path.open("rb") as fh:
-        for chunk in iter(lambda: fh.read(8192), b""):
-            sha.update(chunk)
-    return sha.hexdigest()
+class _HashingReader:
+    """File wrapper that hashes and counts the bytes read through it."""
 
+    def __init__(self, fh) -> None:
+        self._fh = fh
+        self.sha = hashlib.sha256()
+        self.size = 0
 
-def build_asset_url(asset_id: uuid.UUID) -> str:
-    return f"/media/assets/{asset_id}/content"
+    def read(self, size: int = -1) -> bytes:
+        data = self._fh.read(size)
+        self.sha.update(data)
+        self.size += len(data)
+        return data
 
 
-def _bucket_path(bucket: str) -> Path:
-    path = BASE_DIR / bucket
-    path.mkdir(parents=True, exist_ok=True)
-    return path
+def build_asset_url(asset_id: uuid.UUID) -> str:
+    return f"/media/assets/{asset_id}/content"
 
 
-def _store_file(bucket: str, storage_key: str, content: bytes) -> Path:
-    target = _bucket_path(bucket) / storage_key
-    with target.open("wb") as out:
-        out.write(content)
-    return target
+def _store_upload(bucket: str, storage_key: str, file, content_type: str) -> tuple[int, str]:
+    reader = _HashingReader(file.file)
+    get_storage().write(bucket, storage_key, reader, content_type)
+    return reader.size, reader.sha.hexdigest()
 
 
-def _ensure_non_empty(file) -> bytes:
-    content = file.file.read()
-    if not content:
+def _ensure_non_empty(file):
+    if not file.file.read(1):
         raise BadRequestError("Fișierul este gol.")
-    return content
+    file.file.seek(0)
 
 
-def _resolve_media_type(content_type: str) -> str:
+def resolve_media_type(content_type: str) -> str:
     if content_type.startswith("image/"):
         return "IMAGE"
     if content_type.lower() == "application/pdf":
@@ -58,11 +59,11 @@ def _resolve_media_type(content_type: str) -> str:
 
 def save_avatar_upload(db: Session, file, owner_user_id: str) -> MediaAsset:
     content_type = file.content_type or "application/octet-stream"
-    content = _ensure_non_empty(file)
+    _ensure_non_empty(file)
     asset_id = uuid.uuid4()
     filename = file.filename or "upload"
     storage_key = str(asset_id)
-    target = _store_file(USERS_BUCKET, storage_key, content)
+    size_bytes, sha256 = _store_upload(USERS_BUCKET, storage_key, file, content_type)
 
     asset = MediaAsset(
         id=asset_id,
@@ -73,8 +74,8 @@ def save_avatar_upload(db: Session, file, owner_user_id: str) -> MediaAsset:
         description=None,
         type="AVATAR",
         content_type=content_type,
-        size_bytes=target.stat().st_size,
-        sha256=_hash_file(target),
+        size_bytes=size_bytes,
+        sha256=sha256,
         access_policy="PRIVATE",
         status="READY",
         metadata_json={},
@@ -82,8 +83,6 @@ def save_avatar_upload(db: Session, file, owner_user_id: str) -> MediaAsset:
         updated_at=datetime.now(timezone.utc),
     )
     db.add(asset)
-    db.commit()
-    db.refresh(asset)
 
     profile = db.query(UserProfile).filter(UserProfile.user_id == owner_user_id).first()
     if not profile:
@@ -98,21 +97,27 @@ def save_avatar_upload(db: Session, file, owner_user_id: str) -> MediaAsset:
     previous = profile.avatar_media_id
     profile.avatar_media_id = asset.id
     profile.updated_at = datetime.now(timezone.utc)
-    db.commit()
+    db.flush()
 
-    if previous:
-        delete_asset(db, previous)
+    replaced = db.query(MediaAsset).filter(MediaAsset.id == previous).first() if previous else None
+    reclaim = (replaced.bucket, replaced.storage_key) if replaced else None
+    if replaced:
+        db.delete(replaced)
+    db.commit()
+    if reclaim:
+        enqueue_reclaim(*reclaim)
 
+    db.refresh(asset)
     return asset
 
 
 def save_resource_upload(db: Session, file, owner_user_id: str) -> MediaAsset:
     content_type = file.content_type or "application/octet-stream"
-    content = _ensure_non_empty(file)
+    _ensure_non_empty(file)
     asset_id = uuid.uuid4()
     filename = file.filename or "upload"
     storage_key = str(asset_id)
-    target = _store_file(RESOURCES_BUCKET, storage_key, content)
+    size_bytes, sha256 = _store_upload(RESOURCES_BUCKET, storage_key, file, content_type)
 
     asset = MediaAsset(
         id=asset_id,
@@ -121,10 +126,10 @@ def save_resource_upload(db: Session, file, owner_user_id: str) -> MediaAsset:
         storage_key=storage_key,
         filename=filename,
         description=None,
-        type=_resolve_media_type(content_type),
+        type=resolve_media_type(content_type),
         content_type=content_type,
-        size_bytes=target.stat().st_size,
-        sha256=_hash_file(target),
+        size_bytes=size_bytes,
+        sha256=sha256,
         access_policy="PRIVATE",
         status="READY",
         metadata_json={},
@@ -137,19 +142,40 @@ def save_resource_upload(db: Session, file, owner_user_id: str) -> MediaAsset:
     return asset
 
 
-def load_asset_path(asset: MediaAsset) -> Path:
-    return _bucket_path(asset.bucket) / asset.storage_key
+def offload_headers(path: Path) -> dict[str, str] | None:
+    """Headers that hand the file over to the reverse proxy, or None to stream it here."""
+    if settings.media_serve_mode == "x-accel-redirect":
+        internal = f"{settings.media_accel_prefix.rstrip('/')}/{path.relative_to(BASE_DIR).as_posix()}"
+        return {"X-Accel-Redirect": internal}
+    if settings.media_serve_mode == "x-sendfile":
+        return {"X-Sendfile": str(path.resolve())}
+    return None
+
+
+def enqueue_reclaim(bucket: str, storage_key: str):
+    _reclaim_queue.put((bucket, storage_key))
+
+
+def reclaim_pending(limit: int | None = None) -> int:
+    reclaimed = 0
+    while limit is None or reclaimed < limit:
+        try:
+            bucket, storage_key = _reclaim_queue.get_nowait()
+        except queue.Empty:
+            break
+        get_storage().delete(bucket, storage_key)
+        reclaimed += 1
+    return reclaimed
 
 
 def delete_asset(db: Session, asset_id: uuid.UUID):
     asset = db.query(MediaAsset).filter(MediaAsset.id == asset_id).first()
     if not asset:
         return
-    path = load_asset_path(asset)
+    bucket, storage_key = asset.bucket, asset.storage_key
     db.delete(asset)
     db.commit()
-    if path.exists():
-        path.unlink()
+    enqueue_reclaim(bucket, storage_key)
 
 
 def get_asset(db: Session, asset_id: str) -> MediaAsset:
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import String, cast, delete, exists, func, or_, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.models.media_asset import MediaAsset
+from app.models.media_upload_session import MediaUploadSession
+from app.models.resource_entry import ResourceEntry
+from app.models.user_profile import UserProfile
+from app.services.media import RESOURCES_BUCKET, USERS_BUCKET, enqueue_reclaim, reclaim_pending
+from app.services.media_uploads import STAGING_BUCKET, purge_expired_sessions
+from app.services.storage import LocalStorageBackend, StorageBackend, get_storage
+from app.services.task_health import record_failure, record_success
+
+logger = logging.getLogger("fizicamd.media")
+
+RECLAIM_INTERVAL_SECONDS = 1.0
+RECLAIM_BATCH_SIZE = 500
+GC_BATCH_PAUSE_SECONDS = 1.0
+
+_local_storage = LocalStorageBackend()
+
+
+def _is_referenced():
+    block = func.jsonb_build_array(func.jsonb_build_object("assetId", cast(MediaAsset.id, String)))
+    return or_(
+        exists().where(UserProfile.avatar_media_id == MediaAsset.id),
+        exists().where(ResourceEntry.avatar_media_id == MediaAsset.id),
+        exists().where(ResourceEntry.content.op("@>")(block)),
+    )
+
+
+def reclaim_orphan_assets(db: Session, cutoff: datetime, batch_size: int) -> int:
+    """Delete media_assets rows nothing points at and queue their files."""
+    total = 0
+    while True:
+        # Locking the candidates blocks new references to them (avatar foreign key checks
+        # and lock_block_assets need a share lock) until this transaction ends, and
+        # assets whose reference is being written right now are skipped.
+        candidates = db.execute(
+            select(MediaAsset.id)
+            .where(MediaAsset.created_at < cutoff, ~_is_referenced())
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+        # Under READ COMMITTED the DELETE takes a new snapshot, so references committed
+        # since the candidates were picked are seen. Resource blocks have no foreign key;
+        # resource writes share-lock the assets they reference instead (lock_block_assets),
+        # so they wait for this transaction and then find the asset gone.
+        rows = db.execute(
+            delete(MediaAsset)
+            .where(MediaAsset.id.in_(candidates), ~_is_referenced())
+            .returning(MediaAsset.bucket, MediaAsset.storage_key)
+        ).all()
+        db.commit()
+        for bucket, storage_key in rows:
+            enqueue_reclaim(bucket, storage_key)
+        total += len(rows)
+        if len(candidates) < batch_size:
+            return total
+        time.sleep(GC_BATCH_PAUSE_SECONDS)
+
+
+def _known_keys(db: Session, bucket: str, names: list[str]) -> set[str]:
+    if bucket == STAGING_BUCKET:
+        ids = [uuid.UUID(name) for name in names]
+        rows = db.query(MediaUploadSession.id).filter(MediaUploadSession.id.in_(ids)).all()
+        return {str(row[0]) for row in rows}
+    rows = (
+        db.query(MediaAsset.storage_key)
+        .filter(MediaAsset.bucket == bucket, MediaAsset.storage_key.in_(names))
+        .all()
+    )
+    return {row[0] for row in rows}
+
+
+def _backend_for(bucket: str) -> StorageBackend:
+    # Staging files always sit on the local disk of the node that received the chunks.
+    return _local_storage if bucket == STAGING_BUCKET else get_storage()
+
+
+def _stale_keys(backend: StorageBackend, bucket: str, cutoff: datetime):
+    threshold = cutoff.timestamp()
+    for storage_key, modified in backend.iter_keys(bucket):
+        try:
+            uuid.UUID(storage_key)
+        except ValueError:
+            continue
+        if modified < threshold:
+            yield storage_key
+
+
+def _reclaim_key_batch(db: Session, backend: StorageBackend, bucket: str, batch: list[str]) -> int:
+    known = _known_keys(db, bucket, batch)
+    db.rollback()
+    stale = [storage_key for storage_key in batch if storage_key not in known]
+    for storage_key in stale:
+        backend.delete(bucket, storage_key)
+    return len(stale)
+
+
+def reclaim_orphan_files(db: Session, bucket: str, cutoff: datetime, batch_size: int) -> int:
+    """Delete stored objects under a bucket that have no database row."""
+    backend = _backend_for(bucket)
+    total = 0
+    batch: list[str] = []
+    for storage_key in _stale_keys(backend, bucket, cutoff):
+        batch.append(storage_key)
+        if len(batch) >= batch_size:
+            total += _reclaim_key_batch(db, backend, bucket, batch)
+            batch = []
+            time.sleep(GC_BATCH_PAUSE_SECONDS)
+    if batch:
+        total += _reclaim_key_batch(db, backend, bucket, batch)
+    return total
+
+
+def run_media_gc():
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.media_gc_grace_seconds)
+    batch_size = settings.media_gc_batch_size
+    db = SessionLocal()
+    try:
+        sessions = purge_expired_sessions(db, batch_size)
+        assets = reclaim_orphan_assets(db, cutoff, batch_size)
+        files = sum(
+            reclaim_orphan_files(db, bucket, cutoff, batch_size)
+            for bucket in (USERS_BUCKET, RESOURCES_BUCKET, STAGING_BUCKET)
+        )
+    finally:
+        db.close()
+    logger.info("media gc: %d expired uploads, %d orphan assets, %d orphan files", sessions, assets, files)
+
+
+async def media_reclaim_loop():
+    while True:
+        try:
+            await asyncio.to_thread(reclaim_pending, RECLAIM_BATCH_SIZE)
+            record_success("media_reclaim")
+        except Exception:
+            logger.exception("media reclaim error")
+            record_failure("media_reclaim")
+        await asyncio.sleep(RECLAIM_INTERVAL_SECONDS)
+
+
+async def media_gc_loop():
+    while True:
+        await asyncio.sleep(settings.media_gc_interval_seconds)
+        try:
+            await asyncio.to_thread(run_media_gc)
+            record_success("media_gc")
+        except Exception:
+            logger.exception("media gc error")
+            record_failure("media_gc")
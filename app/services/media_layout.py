@@ -0,0 +1,74 @@
+import argparse
+import logging
+import os
+import time
+import uuid
+
+from app.services.media import RESOURCES_BUCKET, USERS_BUCKET
+from app.services.storage import bucket_path, legacy_path, sharded_path
+
+logger = logging.getLogger("fizicamd.media")
+
+
+def _is_legacy_entry(entry: os.DirEntry) -> bool:
+    if not entry.is_file(follow_symlinks=False):
+        return False
+    try:
+        uuid.UUID(entry.name)
+    except ValueError:
+        return False
+    return True
+
+
+def _move_to_shard(bucket: str, storage_key: str) -> bool:
+    source = legacy_path(bucket, storage_key)
+    target = sharded_path(bucket, storage_key)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.replace(source, target)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def migrate_bucket(bucket: str, batch_size: int = 500, pause_seconds: float = 0.5) -> int:
+    """Move flat files of a bucket into the ab/cd/<uuid> layout.
+
+    Safe to run while the API is serving traffic and safe to interrupt: every
+    move is a single rename and a rerun only sees files that are still flat.
+    """
+    moved = 0
+    while True:
+        moved_in_pass = 0
+        batch = 0
+        with os.scandir(bucket_path(bucket)) as entries:
+            for entry in entries:
+                if not _is_legacy_entry(entry):
+                    continue
+                if _move_to_shard(bucket, entry.name):
+                    moved_in_pass += 1
+                    batch += 1
+                if batch >= batch_size:
+                    logger.info("media layout %s: moved %d files", bucket, moved + moved_in_pass)
+                    batch = 0
+                    time.sleep(pause_seconds)
+        moved += moved_in_pass
+        if moved_in_pass == 0:
+            break
+    logger.info("media layout %s: done, moved %d files", bucket, moved)
+    return moved
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Move flat media files into the sharded layout.")
+    parser.add_argument("--bucket", action="append", choices=[USERS_BUCKET, RESOURCES_BUCKET])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.5, help="seconds to sleep between batches")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    for bucket in args.bucket or [USERS_BUCKET, RESOURCES_BUCKET]:
+        migrate_bucket(bucket, args.batch_size, args.pause)
+
+
+if __name__ == "__main__":
+    main()
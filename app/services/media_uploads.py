@@ -0,0 +1,390 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.errors import BadRequestError, NotFoundError
+from app.models.media_asset import MediaAsset
+from app.models.media_upload_session import MediaUploadSession
+from app.services.media import RESOURCES_BUCKET, resolve_media_type
+from app.services.storage import MultipartStorage, bucket_path, get_storage
+
+STAGING_BUCKET = "staging"
+COPY_BUFFER_BYTES = 1024 * 1024
+# S3 limits for multipart uploads: every part but the last is at least 5 MiB.
+S3_MIN_PART_BYTES = 5 * 1024 * 1024
+S3_MAX_PARTS = 10000
+
+
+class _HashState:
+    """Running SHA-256 over the contiguous prefix of a staging file."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.sha = hashlib.sha256()
+        self.offset = 0
+        self.touched = time.monotonic()
+
+
+# hashlib objects cannot be persisted, so the running hash lives in the worker
+# that received the chunks; finalize rehashes the remainder if it is missing.
+_hash_states: dict[uuid.UUID, _HashState] = {}
+_hash_states_lock = threading.Lock()
+
+
+def _hash_state(upload_id: uuid.UUID) -> _HashState:
+    now = time.monotonic()
+    with _hash_states_lock:
+        # Sessions finalized or aborted through another worker never drop their state here.
+        stale = now - settings.media_upload_session_ttl_seconds
+        for other_id in [key for key, state in _hash_states.items() if state.touched < stale]:
+            del _hash_states[other_id]
+        state = _hash_states.get(upload_id)
+        if state is None:
+            state = _HashState()
+            _hash_states[upload_id] = state
+        state.touched = now
+        return state
+
+
+def _drop_hash_state(upload_id: uuid.UUID):
+    with _hash_states_lock:
+        _hash_states.pop(upload_id, None)
+
+
+def staging_path(upload_id: uuid.UUID) -> Path:
+    return bucket_path(STAGING_BUCKET) / str(upload_id)
+
+
+def _merge_range(ranges: list[list[int]], start: int, end: int) -> list[list[int]]:
+    merged: list[list[int]] = []
+    for current in sorted([*ranges, [start, end]]):
+        if merged and current[0] <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], current[1])
+        else:
+            merged.append(list(current))
+    return merged
+
+
+def _contiguous_end(ranges: list[list[int]]) -> int:
+    if ranges and ranges[0][0] == 0:
+        return ranges[0][1]
+    return 0
+
+
+def received_bytes(session: MediaUploadSession) -> int:
+    return sum(end - start for start, end in session.received_ranges or [])
+
+
+def _advance_hash(upload_id: uuid.UUID, until: int) -> _HashState:
+    state = _hash_state(upload_id)
+    with state.lock:
+        if state.offset >= until:
+            return state
+        with staging_path(upload_id).open("rb") as fh:
+            fh.seek(state.offset)
+            while state.offset < until:
+                piece = fh.read(min(COPY_BUFFER_BYTES, until - state.offset))
+                if not piece:
+                    break
+                state.sha.update(piece)
+                state.offset += len(piece)
+    return state
+
+
+def part_size(session: MediaUploadSession) -> int | None:
+    """Chunk size multipart sessions require: chunks start at multiples of it and fill a whole part."""
+    return settings.media_upload_chunk_max_bytes if session.multipart_upload_id else None
+
+
+def _multipart_storage() -> MultipartStorage:
+    storage = get_storage()
+    if not isinstance(storage, MultipartStorage):
+        # STORAGE_BACKEND changed while multipart sessions were open.
+        raise BadRequestError("Încărcarea pe fragmente nu este disponibilă.")
+    return storage
+
+
+def _parse_upload_id(upload_id: str) -> uuid.UUID:
+    try:
+        return uuid.UUID(str(upload_id))
+    except ValueError:
+        raise NotFoundError("Sesiunea de încărcare nu există.")
+
+
+def create_upload_session(db: Session, owner_user_id: str, filename: str | None, content_type: str | None, size_bytes: int) -> MediaUploadSession:
+    if size_bytes <= 0:
+        raise BadRequestError("Fișierul este gol.")
+    if size_bytes > settings.media_upload_max_bytes:
+        raise BadRequestError("Fișierul depășește dimensiunea maximă permisă.")
+    now = datetime.now(timezone.utc)
+    session = MediaUploadSession(
+        id=uuid.uuid4(),
+        owner_user_id=owner_user_id,
+        bucket=RESOURCES_BUCKET,
+        filename=filename or "upload",
+        content_type=content_type or "application/octet-stream",
+        size_bytes=size_bytes,
+        received_ranges=[],
+        parts={},
+        expires_at=now + timedelta(seconds=settings.media_upload_session_ttl_seconds),
+        created_at=now,
+        updated_at=now,
+    )
+    storage = get_storage()
+    if isinstance(storage, MultipartStorage):
+        # Chunks may reach any node, so they go straight to the object store as parts.
+        chunk_bytes = settings.media_upload_chunk_max_bytes
+        if chunk_bytes < S3_MIN_PART_BYTES and size_bytes > chunk_bytes:
+            raise BadRequestError("Încărcarea pe fragmente nu este disponibilă.")
+        if -(-size_bytes // chunk_bytes) > S3_MAX_PARTS:
+            raise BadRequestError("Fișierul depășește dimensiunea maximă permisă.")
+        session.multipart_upload_id = storage.create_multipart_upload(session.bucket, str(session.id), session.content_type)
+    else:
+        with staging_path(session.id).open("wb") as out:
+            out.truncate(size_bytes)
+    db.add(session)
+    db.commit()
+    db.refresh(session)
+    return session
+
+
+def get_upload_session(db: Session, upload_id: str, owner_user_id: str, for_update: bool = False) -> MediaUploadSession:
+    query = db.query(MediaUploadSession).filter(MediaUploadSession.id == _parse_upload_id(upload_id))
+    if for_update:
+        query = query.with_for_update().populate_existing()
+    session = query.first()
+    if not session or str(session.owner_user_id) != owner_user_id:
+        raise NotFoundError("Sesiunea de încărcare nu există.")
+    if session.expires_at <= datetime.now(timezone.utc):
+        raise NotFoundError("Sesiunea de încărcare a expirat.")
+    return session
+
+
+def _upload_length(file) -> int:
+    file.file.seek(0, os.SEEK_END)
+    length = file.file.tell()
+    file.file.seek(0)
+    return length
+
+
+def _overlaps(ranges: list[list[int]], start: int, end: int):
+    for range_start, range_end in ranges:
+        if range_start < end and start < range_end:
+            yield max(range_start, start), min(range_end, end)
+
+
+def _check_unchanged(out, file, ranges: list[list[int]], offset: int, length: int):
+    """Received bytes may be hashed already, so a retried chunk has to carry the same bytes."""
+    for start, end in _overlaps(ranges, offset, offset + length):
+        file.file.seek(start - offset)
+        out.seek(start)
+        remaining = end - start
+        while remaining:
+            size = min(COPY_BUFFER_BYTES, remaining)
+            if file.file.read(size) != out.read(size):
+                raise BadRequestError("Fragmentul diferă de datele primite deja.")
+            remaining -= size
+    file.file.seek(0)
+
+
+def _write_part(db: Session, session: MediaUploadSession, upload_id: str, owner_user_id: str, offset: int, file) -> MediaUploadSession:
+    size = part_size(session)
+    if offset % size:
+        raise BadRequestError("Offset invalid.")
+    expected = min(size, session.size_bytes - offset)
+    length = _upload_length(file)
+    if length != expected:
+        raise BadRequestError("Dimensiunea fragmentului nu corespunde.")
+    part_number = offset // size + 1
+    etag = _multipart_storage().upload_part(session.bucket, str(session.id), session.multipart_upload_id, part_number, file.file, length)
+
+    session = get_upload_session(db, upload_id, owner_user_id, for_update=True)
+    # A retried part replaces the earlier upload of the same number.
+    session.parts = {**(session.parts or {}), str(part_number): etag}
+    session.received_ranges = _merge_range(session.received_ranges or [], offset, offset + length)
+    session.updated_at = datetime.now(timezone.utc)
+    db.commit()
+    return session
+
+
+def write_chunk(db: Session, upload_id: str, owner_user_id: str, offset: int, file) -> MediaUploadSession:
+    session = get_upload_session(db, upload_id, owner_user_id)
+    if offset < 0 or offset >= session.size_bytes:
+        raise BadRequestError("Offset invalid.")
+    if session.multipart_upload_id:
+        return _write_part(db, session, upload_id, owner_user_id, offset, file)
+    # The upload is fully spooled by now, so its size is known before anything is written.
+    length = _upload_length(file)
+    if length == 0:
+        raise BadRequestError("Fragmentul este gol.")
+    if length > min(settings.media_upload_chunk_max_bytes, session.size_bytes - offset):
+        raise BadRequestError("Fragmentul depășește dimensiunea permisă.")
+
+    # Chunks of the same upload are written one at a time under the row lock, so the
+    # received ranges checked here cannot change until this chunk is merged into them.
+    session = get_upload_session(db, upload_id, owner_user_id, for_update=True)
+    with staging_path(session.id).open("r+b") as out:
+        _check_unchanged(out, file, session.received_ranges or [], offset, length)
+        out.seek(offset)
+        for piece in iter(lambda: file.file.read(COPY_BUFFER_BYTES), b""):
+            out.write(piece)
+    ranges = _merge_range(session.received_ranges or [], offset, offset + length)
+    session.received_ranges = ranges
+    session.updated_at = datetime.now(timezone.utc)
+    session_id = session.id
+    db.commit()
+    _advance_hash(session_id, _contiguous_end(ranges))
+    return session
+
+
+def finalize_upload(db: Session, upload_id: str, owner_user_id: str, expected_sha256: str | None) -> MediaAsset:
+    asset_id = _parse_upload_id(upload_id)
+    # Retried finalize after a lost response: the asset already exists.
+    existing = db.query(MediaAsset).filter(MediaAsset.id == asset_id).first()
+    if existing and str(existing.owner_user_id) == owner_user_id:
+        return existing
+    session = get_upload_session(db, upload_id, owner_user_id, for_update=True)
+    if _contiguous_end(session.received_ranges or []) < session.size_bytes:
+        raise BadRequestError("Încărcarea nu este completă.")
+    storage_key = str(asset_id)
+    if session.multipart_upload_id:
+        digest = _complete_multipart(db, session, storage_key, expected_sha256)
+    else:
+        digest = _advance_hash(asset_id, session.size_bytes).sha.hexdigest()
+        if expected_sha256 and expected_sha256.lower() != digest:
+            raise BadRequestError("Suma de control nu corespunde.")
+        get_storage().put_file(session.bucket, storage_key, staging_path(asset_id), session.content_type)
+
+    now = datetime.now(timezone.utc)
+    asset = MediaAsset(
+        id=asset_id,
+        owner_user_id=session.owner_user_id,
+        bucket=session.bucket,
+        storage_key=storage_key,
+        filename=session.filename,
+        description=None,
+        type=resolve_media_type(session.content_type),
+        content_type=session.content_type,
+        size_bytes=session.size_bytes,
+        sha256=digest,
+        access_policy="PRIVATE",
+        status="READY",
+        metadata_json={},
+        created_at=now,
+        updated_at=now,
+    )
+    db.add(asset)
+    db.delete(session)
+    db.commit()
+    db.refresh(asset)
+    _drop_hash_state(asset_id)
+    return asset
+
+
+def _complete_multipart(db: Session, session: MediaUploadSession, storage_key: str, expected_sha256: str | None) -> str:
+    storage = _multipart_storage()
+    etags = {int(number): etag for number, etag in (session.parts or {}).items()}
+    storage.complete_multipart_upload(session.bucket, storage_key, session.multipart_upload_id, etags)
+    # Parts were hashed by no single node; read the assembled object back once.
+    sha = hashlib.sha256()
+    with closing(storage.open(session.bucket, storage_key)) as body:
+        for piece in iter(lambda: body.read(COPY_BUFFER_BYTES), b""):
+            sha.update(piece)
+    digest = sha.hexdigest()
+    if expected_sha256 and expected_sha256.lower() != digest:
+        # The multipart upload is consumed; the client has to start a new session.
+        storage.delete(session.bucket, storage_key)
+        db.delete(session)
+        db.commit()
+        raise BadRequestError("Suma de control nu corespunde.")
+    return digest
+
+
+def _discard_upload(session_id: uuid.UUID, bucket: str, multipart_upload_id: str | None):
+    if multipart_upload_id:
+        _multipart_storage().abort_multipart_upload(bucket, str(session_id), multipart_upload_id)
+    else:
+        _drop_hash_state(session_id)
+        staging_path(session_id).unlink(missing_ok=True)
+
+
+def abort_upload(db: Session, upload_id: str, owner_user_id: str):
+    session = get_upload_session(db, upload_id, owner_user_id, for_update=True)
+    upload = (session.id, session.bucket, session.multipart_upload_id)
+    db.delete(session)
+    db.commit()
+    _discard_upload(*upload)
+
+
+def purge_expired_sessions(db: Session, limit: int) -> int:
+    sessions = (
+        db.query(MediaUploadSession)
+        .filter(MediaUploadSession.expires_at <= datetime.now(timezone.utc))
+        .limit(limit)
+        .all()
+    )
+    uploads = [(session.id, session.bucket, session.multipart_upload_id) for session in sessions]
+    for session in sessions:
+        db.delete(session)
+    db.commit()
+    for upload in uploads:
+        _discard_upload(*upload)
+    return len(uploads)
+
+
+def create_presigned_upload(db: Session, owner_user_id: str, filename: str | None, content_type: str | None, size_bytes: int) -> tuple[MediaAsset, str]:
+    if size_bytes > settings.media_upload_max_bytes:
+        raise BadRequestError("Fișierul depășește dimensiunea maximă permisă.")
+    asset_id = uuid.uuid4()
+    storage_key = str(asset_id)
+    content_type = content_type or "application/octet-stream"
+    upload_url = get_storage().presigned_put_url(RESOURCES_BUCKET, storage_key, content_type)
+    if not upload_url:
+        raise BadRequestError("Încărcarea directă nu este disponibilă.")
+    now = datetime.now(timezone.utc)
+    asset = MediaAsset(
+        id=asset_id,
+        owner_user_id=owner_user_id,
+        bucket=RESOURCES_BUCKET,
+        storage_key=storage_key,
+        filename=filename or "upload",
+        description=None,
+        type=resolve_media_type(content_type),
+        content_type=content_type,
+        size_bytes=size_bytes,
+        sha256=None,
+        access_policy="PRIVATE",
+        status="PENDING",
+        metadata_json={},
+        created_at=now,
+        updated_at=now,
+    )
+    db.add(asset)
+    db.commit()
+    db.refresh(asset)
+    return asset, upload_url
+
+
+def complete_presigned_upload(db: Session, asset_id: str, owner_user_id: str) -> MediaAsset:
+    asset = db.query(MediaAsset).filter(MediaAsset.id == _parse_upload_id(asset_id)).first()
+    if not asset or str(asset.owner_user_id) != owner_user_id:
+        raise NotFoundError("Media negăsită")
+    if asset.status == "READY":
+        return asset
+    size = get_storage().size(asset.bucket, asset.storage_key)
+    if size is None:
+        raise BadRequestError("Fișierul nu a fost încărcat.")
+    if size != asset.size_bytes:
+        raise BadRequestError("Dimensiunea fișierului nu corespunde.")
+    asset.status = "READY"
+    asset.updated_at = datetime.now(timezone.utc)
+    db.commit()
+    db.refresh(asset)
+    return asset
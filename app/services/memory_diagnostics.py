@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import os
+import threading
+import tracemalloc
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Literal
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.core.errors import BadRequestError, NotFoundError
+from app.models.memory_growth_sample import MemoryGrowthSample
+from app.services.task_health import record_failure, record_success
+
+logger = logging.getLogger("fizicamd.memory")
+
+# Snapshots hold every traced block; keep only a few.
+MAX_SNAPSHOTS = 10
+MAX_TRACEBACK_FRAMES = 25
+
+GroupBy = Literal["lineno", "filename", "traceback"]
+
+_lock = threading.Lock()
+_snapshots: "OrderedDict[str, tuple[datetime, tracemalloc.Snapshot]]" = OrderedDict()
+
+# Allocations made by the diagnostics themselves are noise.
+_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def start_tracing(frames: int = 1):
+    if not 1 <= frames <= MAX_TRACEBACK_FRAMES:
+        raise BadRequestError("Invalid traceback depth")
+    if tracemalloc.is_tracing():
+        if tracemalloc.get_traceback_limit() == frames:
+            return
+        # Snapshots taken with another depth cannot be compared with new ones.
+        stop_tracing()
+    tracemalloc.start(frames)
+
+
+def stop_tracing():
+    tracemalloc.stop()
+    with _lock:
+        _snapshots.clear()
+
+
+def tracing_status() -> dict:
+    current, peak = tracemalloc.get_traced_memory()
+    with _lock:
+        snapshots = [(name, taken_at) for name, (taken_at, _) in _snapshots.items()]
+    return {
+        "tracing": tracemalloc.is_tracing(),
+        "frames": tracemalloc.get_traceback_limit() if tracemalloc.is_tracing() else 0,
+        "traced_bytes": current,
+        "peak_traced_bytes": peak,
+        "overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+        "snapshots": snapshots,
+    }
+
+
+def _capture() -> tracemalloc.Snapshot:
+    if not tracemalloc.is_tracing():
+        raise BadRequestError("tracemalloc is not running")
+    return tracemalloc.take_snapshot().filter_traces(_FILTERS)
+
+
+def take_snapshot(name: str) -> datetime:
+    snapshot = _capture()
+    taken_at = datetime.now(timezone.utc)
+    with _lock:
+        _snapshots.pop(name, None)
+        _snapshots[name] = (taken_at, snapshot)
+        while len(_snapshots) > MAX_SNAPSHOTS:
+            _snapshots.popitem(last=False)
+    return taken_at
+
+
+def delete_snapshot(name: str):
+    with _lock:
+        if _snapshots.pop(name, None) is None:
+            raise NotFoundError("Snapshot not found")
+
+
+def _snapshot(name: str) -> tracemalloc.Snapshot:
+    with _lock:
+        entry = _snapshots.get(name)
+    if entry is None:
+        raise NotFoundError("Snapshot not found")
+    return entry[1]
+
+
+def top_growers(base: tracemalloc.Snapshot, target: tracemalloc.Snapshot, group_by: GroupBy = "lineno", limit: int = 20) -> list[dict]:
+    """Largest allocation changes from base to target, biggest growth first."""
+    stats = target.compare_to(base, group_by)
+    items = []
+    for stat in stats[:limit]:
+        frame = stat.traceback[-1]
+        items.append(
+            {
+                "filename": frame.filename,
+                "lineno": frame.lineno if group_by != "filename" else 0,
+                "traceback": [f"{f.filename}:{f.lineno}" for f in stat.traceback] if group_by == "traceback" else [],
+                "size_bytes": stat.size,
+                "size_diff_bytes": stat.size_diff,
+                "count": stat.count,
+                "count_diff": stat.count_diff,
+            }
+        )
+    return items
+
+
+def compare_snapshots(base: str, target: str | None, group_by: GroupBy, limit: int) -> list[dict]:
+    """Diff two named snapshots; without a target the base is compared with the heap right now."""
+    base_snapshot = _snapshot(base)
+    target_snapshot = _snapshot(target) if target else _capture()
+    return top_growers(base_snapshot, target_snapshot, group_by, limit)
+
+
+def record_growth(db: Session, items: list[dict], captured_at: datetime):
+    db.add_all(
+        MemoryGrowthSample(
+            id=uuid.uuid4(),
+            captured_at=captured_at,
+            pid=os.getpid(),
+            filename=item["filename"],
+            lineno=item["lineno"],
+            size_bytes=item["size_bytes"],
+            size_diff_bytes=item["size_diff_bytes"],
+            count=item["count"],
+            count_diff=item["count_diff"],
+        )
+        for item in items
+    )
+    if settings.metrics_raw_retention_days > 0:
+        cutoff = captured_at - timedelta(days=settings.metrics_raw_retention_days)
+        db.execute(delete(MemoryGrowthSample).where(MemoryGrowthSample.captured_at < cutoff))
+    db.commit()
+
+
+def growth_between(db: Session, start: datetime, end: datetime, limit: int) -> list[MemoryGrowthSample]:
+    return (
+        db.execute(
+            select(MemoryGrowthSample)
+            .where(MemoryGrowthSample.captured_at >= start, MemoryGrowthSample.captured_at < end)
+            .order_by(MemoryGrowthSample.captured_at.desc(), MemoryGrowthSample.size_diff_bytes.desc())
+            .limit(limit)
+        )
+        .scalars()
+        .all()
+    )
+
+
+def _growth_step(previous: tracemalloc.Snapshot) -> tracemalloc.Snapshot:
+    current = _capture()
+    items = [item for item in top_growers(previous, current, "lineno", settings.tracemalloc_top_n) if item["size_diff_bytes"] > 0]
+    if items:
+        db = SessionLocal()
+        try:
+            record_growth(db, items, datetime.now(timezone.utc))
+        finally:
+            db.close()
+    return current
+
+
+async def memory_growth_loop():
+    """Scheduled mode: every interval store this worker's top growers since the previous run.
+
+    Every worker traces and records its own heap (rows carry the pid), since a leak
+    lives in one process.
+    """
+    if settings.tracemalloc_interval <= 0:
+        return
+    start_tracing(settings.tracemalloc_frames)
+    previous = await asyncio.to_thread(_capture)
+    while True:
+        await asyncio.sleep(settings.tracemalloc_interval)
+        try:
+            if not tracemalloc.is_tracing():
+                # Stopped from the admin endpoints; start over from a fresh baseline.
+                start_tracing(settings.tracemalloc_frames)
+                previous = await asyncio.to_thread(_capture)
+            else:
+                previous = await asyncio.to_thread(_growth_step, previous)
+            record_success("memory_growth")
+        except Exception:
+            logger.exception("memory growth sampling error")
+            record_failure("memory_growth")
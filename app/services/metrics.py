@@ -1,24 +1,153 @@
+import asyncio
+import logging
+import math
+import threading
 import psutil
 import uuid
+from array import array
+from bisect import bisect_left
+from collections import deque
 from datetime import datetime, timezone
-from pathlib import Path
+from sqlalchemy import insert, inspect
 from sqlalchemy.orm import Session
 from app.core.config import settings
+from app.core.db import SessionLocal, engine
+from app.core.db_instrumentation import take_pool_stats
+from app.services.loop_monitor import take_loop_stats
 from app.models.server_metric_sample import ServerMetricSample
+from app.services.task_health import record_failure, record_success
 
+logger = logging.getLogger("fizicamd.metrics")
 
-def capture_metrics(db: Session) -> ServerMetricSample:
-    process = psutil.Process()
+METRIC_COLUMNS = (
+    "heap_used_bytes",
+    "heap_max_bytes",
+    "system_memory_total_bytes",
+    "system_memory_used_bytes",
+    "disk_total_bytes",
+    "disk_used_bytes",
+    "process_cpu_load",
+    "system_cpu_load",
+    "db_pool_checked_out",
+    "db_pool_overflow",
+    "db_checkout_wait_ms",
+    "db_query_count",
+    "db_query_time_ms",
+    "event_loop_lag_ms",
+    "threadpool_in_use",
+    "threadpool_waiting",
+)
+
+FLOAT_METRICS = frozenset({"process_cpu_load", "system_cpu_load", "db_checkout_wait_ms", "db_query_time_ms", "event_loop_lag_ms"})
+
+# cpu_percent(interval=None) measures since the previous call on the same Process object.
+_process = psutil.Process()
+
+# Samples waiting to be written; the oldest are dropped if the database falls behind.
+_pending: deque[ServerMetricSample] = deque(maxlen=settings.metrics_buffer_size)
+_pending_lock = threading.Lock()
+
+
+class SampleRing:
+    """Fixed-size ring of the most recent samples, one typed array per column.
+
+    Samples must be appended in capture order. Missing float values are stored as NaN,
+    missing integer values as MISSING_INT.
+    """
+
+    MISSING_INT = -(2**63)
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = max(capacity, 1)
+        self._captured_at = array("d", [0.0]) * self.capacity
+        self._columns = {
+            column: (array("d", [0.0]) if column in FLOAT_METRICS else array("q", [0])) * self.capacity
+            for column in METRIC_COLUMNS
+        }
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def append(self, sample: ServerMetricSample):
+        with self._lock:
+            slot = self._next
+            self._captured_at[slot] = sample.captured_at.timestamp()
+            for column, values in self._columns.items():
+                value = getattr(sample, column)
+                if column in FLOAT_METRICS:
+                    values[slot] = math.nan if value is None else value
+                else:
+                    values[slot] = self.MISSING_INT if value is None else int(value)
+            self._next = (slot + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def clear(self):
+        with self._lock:
+            self._next = 0
+            self._count = 0
+
+    def _sample_at(self, position: int) -> ServerMetricSample:
+        slot = (self._next - self._count + position) % self.capacity
+        fields = {}
+        for column, values in self._columns.items():
+            value = values[slot]
+            if column in FLOAT_METRICS:
+                fields[column] = None if math.isnan(value) else value
+            else:
+                fields[column] = None if value == self.MISSING_INT else value
+        captured_at = datetime.fromtimestamp(self._captured_at[slot], timezone.utc)
+        return ServerMetricSample(captured_at=captured_at, **fields)
+
+    def _timestamp_at(self, position: int) -> float:
+        # Positions count from the oldest sample still in the ring.
+        return self._captured_at[(self._next - self._count + position) % self.capacity]
+
+    def oldest(self) -> datetime | None:
+        with self._lock:
+            if not self._count:
+                return None
+            return datetime.fromtimestamp(self._timestamp_at(0), timezone.utc)
+
+    def latest(self, limit: int) -> list[ServerMetricSample]:
+        with self._lock:
+            first = max(self._count - limit, 0)
+            return [self._sample_at(position) for position in range(first, self._count)]
+
+    def between(self, start: datetime, end: datetime) -> list[ServerMetricSample]:
+        with self._lock:
+            positions = range(self._count)
+            first = bisect_left(positions, start.timestamp(), key=self._timestamp_at)
+            last = bisect_left(positions, end.timestamp(), key=self._timestamp_at)
+            return [self._sample_at(position) for position in range(first, last)]
+
+
+# Samples this process captured recently, so history reads skip the database.
+_recent = SampleRing(settings.metrics_history_size)
+
+# The newest sample taken by this process; the ring holds the leader's samples on followers.
+_own_sample: ServerMetricSample | None = None
+
+
+def process_memory_bytes() -> int:
+    return _process.memory_info().rss
+
+
+def own_sample() -> ServerMetricSample | None:
+    return _own_sample
+
+
+def capture_metrics() -> ServerMetricSample:
+    global _own_sample
     vm = psutil.virtual_memory()
     try:
         disk = psutil.disk_usage(settings.metrics_disk_path)
     except Exception:
         disk = psutil.disk_usage("/")
 
-    heap_used = process.memory_info().rss
+    heap_used = _process.memory_info().rss
     heap_max = vm.total
 
-    sample = ServerMetricSample(
+    _own_sample = ServerMetricSample(
         id=uuid.uuid4(),
         captured_at=datetime.now(timezone.utc),
         heap_used_bytes=heap_used,
@@ -27,20 +156,143 @@ def capture_metrics(db: Session) -> ServerMetricSample:
         system_memory_used_bytes=vm.total - vm.available,
         disk_total_bytes=disk.total,
         disk_used_bytes=disk.used,
-        process_cpu_load=process.cpu_percent(interval=None) / 100.0,
+        process_cpu_load=_process.cpu_percent(interval=None) / 100.0,
         system_cpu_load=psutil.cpu_percent(interval=None) / 100.0,
+        **take_pool_stats(engine),
+        **take_loop_stats(),
     )
-    db.add(sample)
-    db.commit()
-    db.refresh(sample)
-    return sample
+    return _own_sample
+
+
+def sample_payload(sample: ServerMetricSample) -> dict:
+    return {
+        "capturedAt": sample.captured_at.isoformat(),
+        "heapUsedBytes": sample.heap_used_bytes,
+        "heapMaxBytes": sample.heap_max_bytes,
+        "systemMemoryTotalBytes": sample.system_memory_total_bytes,
+        "systemMemoryUsedBytes": sample.system_memory_used_bytes,
+        "diskTotalBytes": sample.disk_total_bytes,
+        "diskUsedBytes": sample.disk_used_bytes,
+        "processCpuLoad": sample.process_cpu_load,
+        "systemCpuLoad": sample.system_cpu_load,
+        "dbPoolCheckedOut": sample.db_pool_checked_out,
+        "dbPoolOverflow": sample.db_pool_overflow,
+        "dbCheckoutWaitMs": sample.db_checkout_wait_ms,
+        "dbQueryCount": sample.db_query_count,
+        "dbQueryTimeMs": sample.db_query_time_ms,
+        "eventLoopLagMs": sample.event_loop_lag_ms,
+        "threadpoolInUse": sample.threadpool_in_use,
+        "threadpoolWaiting": sample.threadpool_waiting,
+    }
+
+
+def sample_from_payload(payload: dict) -> ServerMetricSample:
+    return ServerMetricSample(
+        captured_at=datetime.fromisoformat(payload["capturedAt"]),
+        heap_used_bytes=payload["heapUsedBytes"],
+        heap_max_bytes=payload["heapMaxBytes"],
+        system_memory_total_bytes=payload["systemMemoryTotalBytes"],
+        system_memory_used_bytes=payload["systemMemoryUsedBytes"],
+        disk_total_bytes=payload["diskTotalBytes"],
+        disk_used_bytes=payload["diskUsedBytes"],
+        process_cpu_load=payload["processCpuLoad"],
+        system_cpu_load=payload["systemCpuLoad"],
+        db_pool_checked_out=payload["dbPoolCheckedOut"],
+        db_pool_overflow=payload["dbPoolOverflow"],
+        db_checkout_wait_ms=payload["dbCheckoutWaitMs"],
+        db_query_count=payload["dbQueryCount"],
+        db_query_time_ms=payload["dbQueryTimeMs"],
+        event_loop_lag_ms=payload["eventLoopLagMs"],
+        threadpool_in_use=payload["threadpoolInUse"],
+        threadpool_waiting=payload["threadpoolWaiting"],
+    )
+
+
+def buffer_sample(sample: ServerMetricSample):
+    with _pending_lock:
+        if len(_pending) == _pending.maxlen:
+            logger.warning("metrics buffer full, dropping oldest sample")
+        _pending.append(sample)
+
+
+def remember_sample(sample: ServerMetricSample):
+    _recent.append(sample)
+
+
+def record_sample(sample: ServerMetricSample):
+    """Keep a freshly captured sample in memory and queue it for the database."""
+    remember_sample(sample)
+    buffer_sample(sample)
+
+
+def _sample_row(sample: ServerMetricSample) -> dict:
+    return {attr.key: getattr(sample, attr.key) for attr in inspect(ServerMetricSample).column_attrs}
+
+
+def flush_samples() -> int:
+    with _pending_lock:
+        batch = list(_pending)
+        _pending.clear()
+    if not batch:
+        return 0
+    db = SessionLocal()
+    try:
+        # Plain multi-row INSERT: the buffered objects stay detached and readable.
+        db.execute(insert(ServerMetricSample), [_sample_row(sample) for sample in batch])
+        db.commit()
+    except Exception:
+        db.rollback()
+        with _pending_lock:
+            # Put the batch back in front of anything captured meanwhile.
+            room = _pending.maxlen - len(_pending)
+            if room > 0:
+                _pending.extendleft(reversed(batch[-room:]))
+        raise
+    finally:
+        db.close()
+    return len(batch)
+
+
+async def metrics_flush_loop():
+    while True:
+        await asyncio.sleep(settings.metrics_flush_interval)
+        try:
+            await asyncio.to_thread(flush_samples)
+            record_success("metrics_flush")
+        except Exception:
+            logger.exception("metrics flush error")
+            record_failure("metrics_flush")
+
+
+def recent_samples(limit: int) -> list[ServerMetricSample]:
+    return _recent.latest(limit)
 
 
 def latest_samples(db: Session, limit: int) -> list[ServerMetricSample]:
-    items = (
+    recent = _recent.latest(limit)
+    if len(recent) >= limit:
+        return recent
+    query = db.query(ServerMetricSample)
+    if recent:
+        query = query.filter(ServerMetricSample.captured_at < recent[0].captured_at)
+    older = query.order_by(ServerMetricSample.captured_at.desc()).limit(limit - len(recent)).all()
+    return list(reversed(older)) + recent
+
+
+def samples_between(db: Session, start: datetime, end: datetime, limit: int) -> list[ServerMetricSample]:
+    """The newest limit samples in [start, end), oldest first."""
+    oldest = _recent.oldest()
+    recent: list[ServerMetricSample] = []
+    if oldest is not None and end > oldest:
+        recent = _recent.between(max(start, oldest), end)[-limit:]
+        if start >= oldest or len(recent) >= limit:
+            return recent
+    db_end = end if oldest is None else min(end, oldest)
+    older = (
         db.query(ServerMetricSample)
+        .filter(ServerMetricSample.captured_at >= start, ServerMetricSample.captured_at < db_end)
         .order_by(ServerMetricSample.captured_at.desc())
-        .limit(limit)
+        .limit(limit - len(recent))
         .all()
     )
-    return list(reversed(items))
+    return older[::-1] + recent
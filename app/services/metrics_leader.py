@@ -0,0 +1,95 @@
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable
+
+import psycopg
+from sqlalchemy.engine import make_url
+
+from app.core.config import settings
+from app.services.metrics import capture_metrics, record_sample, remember_sample, sample_from_payload, sample_payload
+from app.services.openmetrics import write_snapshot
+from app.services.task_health import record_failure, record_success
+
+logger = logging.getLogger("fizicamd.metrics")
+
+NOTIFY_CHANNEL = "server_metrics"
+# pg_try_advisory_lock key held by the worker that samples and persists metrics.
+LEADER_LOCK_KEY = 0x66697A6D  # "fizm"
+RECONNECT_DELAY_SECONDS = 5
+
+_is_leader = False
+
+
+def is_metrics_leader() -> bool:
+    return _is_leader
+
+
+def listener_dsn() -> str:
+    """libpq form of DATABASE_URL for the dedicated LISTEN connection."""
+    url = make_url(settings.database_url).set(drivername="postgresql")
+    return url.render_as_string(hide_password=False)
+
+
+async def try_acquire_leadership(conn: psycopg.AsyncConnection) -> bool:
+    cursor = await conn.execute("SELECT pg_try_advisory_lock(%s)", (LEADER_LOCK_KEY,))
+    row = await cursor.fetchone()
+    return bool(row[0])
+
+
+async def publish_sample(conn: psycopg.AsyncConnection, payload: dict):
+    await conn.execute("SELECT pg_notify(%s, %s)", (NOTIFY_CHANNEL, json.dumps(payload)))
+
+
+async def handle_notification(notify: psycopg.Notify, own_backend_pid: int, broadcast: Callable[[dict], Awaitable[None]]):
+    # The leader has already recorded and broadcast its own samples.
+    if notify.pid == own_backend_pid:
+        return
+    payload = json.loads(notify.payload)
+    remember_sample(sample_from_payload(payload))
+    await broadcast(payload)
+
+
+async def _sample_and_publish(conn: psycopg.AsyncConnection, broadcast: Callable[[dict], Awaitable[None]]):
+    # psutil reads /proc; keep it off the event loop like the database writes.
+    sample = await asyncio.to_thread(capture_metrics)
+    if not _is_leader:
+        # Followers keep their own process stats for the scrape snapshot only.
+        return
+    record_sample(sample)
+    payload = sample_payload(sample)
+    await publish_sample(conn, payload)
+    await broadcast(payload)
+
+
+async def metrics_sampler_loop(broadcast: Callable[[dict], Awaitable[None]]):
+    """Persist samples from exactly one worker and fan them out to the sockets of every worker.
+
+    Each worker samples its own process every interval, keeps one connection that LISTENs
+    for samples and keeps trying the leader lock; the holder also buffers its sample for
+    the database and NOTIFYs it.
+    Postgres drops the lock with the connection, so another worker takes over within an
+    interval when the leader dies.
+    """
+    global _is_leader
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(listener_dsn(), autocommit=True) as conn:
+                await conn.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                own_backend_pid = conn.info.backend_pid
+                while True:
+                    if not _is_leader and await try_acquire_leadership(conn):
+                        _is_leader = True
+                        logger.info("this worker is now the metrics leader")
+                    await _sample_and_publish(conn, broadcast)
+                    async for notify in conn.notifies(timeout=settings.metrics_sample_interval):
+                        await handle_notification(notify, own_backend_pid, broadcast)
+                    await asyncio.to_thread(write_snapshot)
+                    record_success("metrics_sample")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("metrics sampler error")
+            record_failure("metrics_sample")
+        _is_leader = False
+        await asyncio.sleep(RECONNECT_DELAY_SECONDS)
@@ -0,0 +1,187 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.models.server_metric_rollup import ServerMetricRollup1d, ServerMetricRollup1h, ServerMetricRollup1m
+from app.models.server_metric_sample import ServerMetricSample
+from app.services.metrics import METRIC_COLUMNS
+from app.services.metrics_leader import is_metrics_leader
+from app.services.partitions import SERVER_METRIC_SAMPLES, drop_partitions_before
+from app.services.task_health import record_failure, record_success
+
+logger = logging.getLogger("fizicamd.metrics")
+
+# resolution -> (model, date_trunc unit, bucket width, buckets computed per run at most)
+ROLLUP_TIERS = {
+    "1m": (ServerMetricRollup1m, "minute", timedelta(minutes=1), 1440),
+    "1h": (ServerMetricRollup1h, "hour", timedelta(hours=1), 168),
+    "1d": (ServerMetricRollup1d, "day", timedelta(days=1), 31),
+}
+
+# Longest span each resolution serves before the next coarser one takes over.
+MAX_SPAN = {
+    "raw": timedelta(hours=2),
+    "1m": timedelta(days=2),
+    "1h": timedelta(days=90),
+}
+
+RETENTION_DELETE_BATCH = 10000
+
+
+def _truncate(value: datetime, unit: str) -> datetime:
+    value = value.astimezone(timezone.utc)
+    if unit == "minute":
+        return value.replace(second=0, microsecond=0)
+    if unit == "hour":
+        return value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _rollup_sql(table: str, unit: str) -> str:
+    values = ", ".join(f"('{column}', s.{column}::float8)" for column in METRIC_COLUMNS)
+    return f"""
+        INSERT INTO {table} (metric, bucket_start, sample_count, min_value, avg_value, max_value, p95_value)
+        SELECT
+          m.metric,
+          date_trunc('{unit}', s.captured_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC' AS bucket_start,
+          count(m.value),
+          min(m.value),
+          avg(m.value),
+          max(m.value),
+          percentile_cont(0.95) WITHIN GROUP (ORDER BY m.value)
+        FROM server_metric_samples s
+        CROSS JOIN LATERAL (VALUES {values}) AS m(metric, value)
+        WHERE s.captured_at >= :start AND s.captured_at < :end
+        GROUP BY m.metric, bucket_start
+        ON CONFLICT (metric, bucket_start) DO UPDATE SET
+          sample_count = EXCLUDED.sample_count,
+          min_value = EXCLUDED.min_value,
+          avg_value = EXCLUDED.avg_value,
+          max_value = EXCLUDED.max_value,
+          p95_value = EXCLUDED.p95_value
+    """
+
+
+def rollup_tier(db: Session, resolution: str, now: datetime) -> datetime | None:
+    """Aggregate completed buckets of raw samples into one tier.
+
+    Returns the start of the oldest bucket that may still be recomputed; raw samples
+    before it are no longer needed by this tier.
+    """
+    model, unit, step, max_buckets = ROLLUP_TIERS[resolution]
+    last = db.query(func.max(model.bucket_start)).scalar()
+    if last is None:
+        oldest = db.query(func.min(ServerMetricSample.captured_at)).scalar()
+        if oldest is None:
+            return None
+        start = _truncate(oldest, unit)
+    else:
+        start = last.astimezone(timezone.utc)
+        # Samples reach the table up to a flush interval late, so the newest bucket is
+        # recomputed until it has certainly settled.
+        settle = timedelta(seconds=settings.metrics_flush_interval + settings.metrics_rollup_interval)
+        if start + step + settle <= now:
+            start += step
+        # Skip over a gap without samples (the service was down) in one go; a window
+        # with no rows would otherwise never move the frontier forward.
+        next_sample = db.query(func.min(ServerMetricSample.captured_at)).filter(ServerMetricSample.captured_at >= start).scalar()
+        if next_sample is None:
+            return start
+        start = max(start, _truncate(next_sample, unit))
+    end = _truncate(now - timedelta(seconds=settings.metrics_flush_interval), unit)
+    end = min(end, start + step * max_buckets)
+    if start >= end:
+        return start
+    db.execute(text(_rollup_sql(model.__tablename__, unit)), {"start": start, "end": end})
+    db.commit()
+    return end - step
+
+
+def _delete_older_than(db: Session, table: str, column: str, cutoff: datetime) -> int:
+    total = 0
+    while True:
+        deleted = db.execute(
+            text(
+                f"""
+                DELETE FROM {table} WHERE ctid = ANY(ARRAY(
+                  SELECT ctid FROM {table} WHERE {column} < :cutoff LIMIT :batch
+                ))
+                """
+            ),
+            {"cutoff": cutoff, "batch": RETENTION_DELETE_BATCH},
+        ).rowcount
+        db.commit()
+        total += deleted
+        if deleted < RETENTION_DELETE_BATCH:
+            return total
+
+
+def apply_retention(db: Session, now: datetime, frontiers: dict[str, datetime | None]):
+    raw_cutoff = now - timedelta(days=settings.metrics_raw_retention_days)
+    # Never drop raw samples a tier has not aggregated yet.
+    pending = [frontier for frontier in frontiers.values() if frontier is not None]
+    if pending:
+        raw_cutoff = min(raw_cutoff, *pending)
+    drop_partitions_before(db, SERVER_METRIC_SAMPLES, raw_cutoff)
+    retention_days = {
+        "1m": settings.metrics_rollup_1m_retention_days,
+        "1h": settings.metrics_rollup_1h_retention_days,
+        "1d": settings.metrics_rollup_1d_retention_days,
+    }
+    for resolution, days in retention_days.items():
+        if days > 0:
+            model = ROLLUP_TIERS[resolution][0]
+            _delete_older_than(db, model.__tablename__, "bucket_start", now - timedelta(days=days))
+
+
+def run_rollups():
+    now = datetime.now(timezone.utc)
+    db = SessionLocal()
+    try:
+        frontiers = {resolution: rollup_tier(db, resolution, now) for resolution in ROLLUP_TIERS}
+        apply_retention(db, now, frontiers)
+    finally:
+        db.close()
+
+
+async def metrics_rollup_loop():
+    while True:
+        await asyncio.sleep(settings.metrics_rollup_interval)
+        # Only the worker that persists samples aggregates them.
+        if not is_metrics_leader():
+            continue
+        try:
+            await asyncio.to_thread(run_rollups)
+            record_success("metrics_rollup")
+        except Exception:
+            logger.exception("metrics rollup error")
+            record_failure("metrics_rollup")
+
+
+def pick_resolution(start: datetime, end: datetime, now: datetime) -> str:
+    span = end - start
+    age = now - start
+    retention = {
+        "raw": settings.metrics_raw_retention_days,
+        "1m": settings.metrics_rollup_1m_retention_days,
+        "1h": settings.metrics_rollup_1h_retention_days,
+    }
+    for resolution, max_span in MAX_SPAN.items():
+        days = retention[resolution]
+        if span <= max_span and (days <= 0 or age <= timedelta(days=days)):
+            return resolution
+    return "1d"
+
+
+def rollups_between(db: Session, resolution: str, start: datetime, end: datetime) -> list:
+    model = ROLLUP_TIERS[resolution][0]
+    return (
+        db.query(model)
+        .filter(model.bucket_start >= _truncate(start, ROLLUP_TIERS[resolution][1]), model.bucket_start < end)
+        .order_by(model.bucket_start.asc(), model.metric.asc())
+        .all()
+    )
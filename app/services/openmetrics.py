@@ -0,0 +1,210 @@
+import json
+import os
+import time
+from pathlib import Path
+
+from app.core.config import settings
+from app.core.db import engine
+from app.services.metrics import own_sample, process_memory_bytes
+from app.services.route_metrics import LATENCY_BUCKETS_MS, route_stats
+from app.services.task_health import task_health
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Same host for every worker, so these are taken from the freshest snapshot only.
+SYSTEM_GAUGES = (
+    ("system_memory_total_bytes", "Total system memory."),
+    ("system_memory_used_bytes", "Used system memory."),
+    ("disk_total_bytes", "Size of the media disk."),
+    ("disk_used_bytes", "Used space on the media disk."),
+    ("system_cpu_load", "System CPU load, 0..1."),
+)
+PROCESS_GAUGES = (
+    ("process_resident_memory_bytes", "Resident memory of the worker."),
+    ("process_cpu_load", "CPU load of the worker, 0..1."),
+    ("event_loop_lag_ms", "Worst event loop lag of the worker over the last interval."),
+    ("threadpool_in_use", "Busy threads in the worker's handler threadpool."),
+    ("threadpool_waiting", "Handler calls queued for the worker's threadpool."),
+)
+
+
+def _pool_stats() -> dict:
+    pool = engine.pool
+    stats = {}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        getter = getattr(pool, name, None)
+        if callable(getter):
+            stats[name] = getter()
+    return stats
+
+
+def collect_snapshot() -> dict:
+    """Everything this worker exports, from memory only."""
+    sample = own_sample()
+    system = {}
+    process = {"process_resident_memory_bytes": process_memory_bytes()}
+    if sample is not None:
+        system = {name: getattr(sample, name) for name, _ in SYSTEM_GAUGES}
+        process.update({name: getattr(sample, name) for name, _ in PROCESS_GAUGES[1:]})
+    return {
+        "pid": os.getpid(),
+        "updated_at": time.time(),
+        "system": system,
+        "process": process,
+        "routes": [
+            {
+                "method": method,
+                "route": route,
+                "status": status,
+                "counts": list(stats.counts),
+                "sum_ms": stats.total_ms,
+                "request_bytes": stats.request_bytes,
+                "response_bytes": stats.response_bytes,
+            }
+            for (method, route, status), stats in route_stats()
+        ],
+        "pool": _pool_stats(),
+        "tasks": task_health(),
+    }
+
+
+def _snapshot_dir() -> Path | None:
+    if not settings.metrics_multiproc_dir:
+        return None
+    path = Path(settings.metrics_multiproc_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def write_snapshot():
+    """Publish this worker's state for whichever worker answers the next scrape."""
+    directory = _snapshot_dir()
+    if directory is None:
+        return
+    target = directory / f"{os.getpid()}.json"
+    tmp = directory / f".{os.getpid()}.json.tmp"
+    tmp.write_text(json.dumps(collect_snapshot()))
+    os.replace(tmp, target)
+
+
+def remove_snapshot():
+    directory = _snapshot_dir()
+    if directory is not None:
+        (directory / f"{os.getpid()}.json").unlink(missing_ok=True)
+
+
+def _load_snapshots() -> list[dict]:
+    snapshots = [collect_snapshot()]
+    directory = _snapshot_dir()
+    if directory is None:
+        return snapshots
+    # A worker that stopped publishing (killed, restarted) drops out after a few intervals.
+    cutoff = time.time() - max(3 * settings.metrics_sample_interval, 30)
+    for path in directory.glob("*.json"):
+        if path.stem == str(os.getpid()):
+            continue
+        try:
+            snapshot = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        if snapshot.get("updated_at", 0) >= cutoff:
+            snapshots.append(snapshot)
+    return snapshots
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _number(value) -> str:
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+class _Writer:
+    def __init__(self) -> None:
+        self.lines: list[str] = []
+
+    def family(self, name: str, kind: str, help_text: str):
+        self.lines.append(f"# TYPE fizicamd_{name} {kind}")
+        self.lines.append(f"# HELP fizicamd_{name} {help_text}")
+
+    def sample(self, name: str, value, **labels):
+        if value is not None:
+            self.lines.append(f"fizicamd_{name}{_labels(**labels)} {_number(value)}")
+
+    def text(self) -> str:
+        return "\n".join([*self.lines, "# EOF"]) + "\n"
+
+
+def _write_routes(out: _Writer, snapshots: list[dict]):
+    merged: dict[tuple, dict] = {}
+    for snapshot in snapshots:
+        for route in snapshot["routes"]:
+            key = (route["method"], route["route"], str(route["status"]))
+            current = merged.get(key)
+            if current is None:
+                merged[key] = {**route, "counts": list(route["counts"])}
+                continue
+            current["counts"] = [a + b for a, b in zip(current["counts"], route["counts"])]
+            for field in ("sum_ms", "request_bytes", "response_bytes"):
+                current[field] += route[field]
+
+    bounds = [f"{bound / 1000:g}" for bound in LATENCY_BUCKETS_MS] + ["+Inf"]
+    out.family("http_request_duration_seconds", "histogram", "Request latency by route template.")
+    for (method, path, status), route in sorted(merged.items()):
+        cumulative = 0
+        for bound, count in zip(bounds, route["counts"]):
+            cumulative += count
+            out.sample("http_request_duration_seconds_bucket", cumulative, method=method, route=path, status=status, le=bound)
+        out.sample("http_request_duration_seconds_count", cumulative, method=method, route=path, status=status)
+        out.sample("http_request_duration_seconds_sum", route["sum_ms"] / 1000, method=method, route=path, status=status)
+
+    for direction in ("request", "response"):
+        out.family(f"http_{direction}_size_bytes", "counter", f"HTTP {direction} body bytes by route template.")
+        for (method, path, status), route in sorted(merged.items()):
+            out.sample(f"http_{direction}_size_bytes_total", route[f"{direction}_bytes"], method=method, route=path, status=status)
+
+
+def render_openmetrics() -> str:
+    snapshots = _load_snapshots()
+    out = _Writer()
+
+    sampled = [snapshot for snapshot in snapshots if snapshot["system"]]
+    system = max(sampled, key=lambda snapshot: snapshot["updated_at"])["system"] if sampled else {}
+    for name, help_text in SYSTEM_GAUGES:
+        out.family(name, "gauge", help_text)
+        out.sample(name, system.get(name))
+    for name, help_text in PROCESS_GAUGES:
+        out.family(name, "gauge", help_text)
+        for snapshot in snapshots:
+            out.sample(name, snapshot["process"].get(name), pid=snapshot["pid"])
+
+    _write_routes(out, snapshots)
+
+    out.family("db_pool_connections", "gauge", "SQLAlchemy pool connections by state.")
+    for snapshot in snapshots:
+        for state, value in snapshot["pool"].items():
+            out.sample("db_pool_connections", value, pid=snapshot["pid"], state=state)
+
+    out.family("background_task_running", "gauge", "1 while the background loop is alive.")
+    for snapshot in snapshots:
+        for task in snapshot["tasks"]:
+            out.sample("background_task_running", int(task["running"]), pid=snapshot["pid"], task=task["name"])
+    out.family("background_task_last_success_timestamp_seconds", "gauge", "When the loop last completed a pass.")
+    for snapshot in snapshots:
+        for task in snapshot["tasks"]:
+            out.sample("background_task_last_success_timestamp_seconds", task["last_success"], pid=snapshot["pid"], task=task["name"])
+    out.family("background_task_failures", "counter", "Failed passes of the loop.")
+    for snapshot in snapshots:
+        for task in snapshot["tasks"]:
+            out.sample("background_task_failures_total", task["failures"], pid=snapshot["pid"], task=task["name"])
+
+    return out.text()
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.services.metrics_leader import is_metrics_leader
+from app.services.task_health import record_failure, record_success
+from app.services.visit_rollups import oldest_unfolded_visit
+
+logger = logging.getLogger("fizicamd.partitions")
+
+MAINTENANCE_INTERVAL_SECONDS = 3600
+DEFAULT_DELETE_BATCH = 10000
+
+
+@dataclass(frozen=True)
+class PartitionScheme:
+    table: str
+    column: str
+    # 'month' or 'day'; must match the ensure_range_partitions naming (V21)
+    unit: str
+    # Periods created ahead of the current one.
+    ahead: int
+
+
+SITE_VISITS = PartitionScheme("site_visits", "created_at", "month", 2)
+SERVER_METRIC_SAMPLES = PartitionScheme("server_metric_samples", "captured_at", "day", 7)
+SCHEMES = (SITE_VISITS, SERVER_METRIC_SAMPLES)
+
+
+def _period_start(moment: datetime, unit: str) -> datetime:
+    moment = moment.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(day=1) if unit == "month" else moment
+
+
+def _add_periods(start: datetime, unit: str, count: int) -> datetime:
+    # start must be a period start: replace(month=...) fails from the 29th on.
+    if unit == "day":
+        return start + timedelta(days=count)
+    month = start.month - 1 + count
+    return start.replace(year=start.year + month // 12, month=month % 12 + 1)
+
+
+def ensure_partitions(db: Session, scheme: PartitionScheme, now: datetime) -> int:
+    """Create the partitions for the current period and the next scheme.ahead ones."""
+    start = _period_start(now, scheme.unit)
+    created = db.execute(
+        text("SELECT ensure_range_partitions(:table, :unit, :start, :end)"),
+        {"table": scheme.table, "unit": scheme.unit, "start": start, "end": _add_periods(start, scheme.unit, scheme.ahead + 1)},
+    ).scalar()
+    db.commit()
+    return created or 0
+
+
+def partitions(db: Session, scheme: PartitionScheme) -> list[tuple[str, datetime, datetime]]:
+    """(name, lower bound, upper bound) of the time range partitions, oldest first."""
+    pattern = re.compile(rf"^{scheme.table}_p(\d{{6}}|\d{{8}})$")
+    names = db.execute(
+        text(
+            """
+            SELECT child.relname FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            WHERE parent.relname = :table
+            """
+        ),
+        {"table": scheme.table},
+    ).scalars()
+    result = []
+    for name in names:
+        match = pattern.match(name)
+        if not match:
+            continue
+        suffix = match.group(1)
+        fmt = "%Y%m" if len(suffix) == 6 else "%Y%m%d"
+        start = datetime.strptime(suffix, fmt).replace(tzinfo=timezone.utc)
+        result.append((name, start, _add_periods(start, scheme.unit, 1)))
+    result.sort(key=lambda item: item[1])
+    return result
+
+
+def drop_partitions_before(db: Session, scheme: PartitionScheme, cutoff: datetime) -> list[str]:
+    """Drop whole partitions that end at or before cutoff; rows in the default partition are deleted."""
+    dropped = []
+    for name, _, end in partitions(db, scheme):
+        if end > cutoff:
+            break
+        # A dropped partition leaves nothing behind to vacuum, unlike a DELETE.
+        db.execute(text(f'DROP TABLE "{name}"'))
+        db.commit()
+        dropped.append(name)
+    if dropped:
+        logger.info("dropped partitions %s", ", ".join(dropped))
+    default = f"{scheme.table}_default"
+    while True:
+        deleted = db.execute(
+            text(
+                f"""
+                DELETE FROM {default} WHERE ctid = ANY(ARRAY(
+                  SELECT ctid FROM {default} WHERE {scheme.column} < :cutoff LIMIT :batch
+                ))
+                """
+            ),
+            {"cutoff": cutoff, "batch": DEFAULT_DELETE_BATCH},
+        ).rowcount
+        db.commit()
+        if deleted < DEFAULT_DELETE_BATCH:
+            return dropped
+
+
+def apply_visit_retention(db: Session, now: datetime):
+    """Drop raw visits older than VISIT_RAW_RETENTION_DAYS, but only once the rollups have folded them."""
+    if settings.visit_raw_retention_days <= 0:
+        return
+    cutoff = now - timedelta(days=settings.visit_raw_retention_days)
+    oldest = oldest_unfolded_visit(db)
+    if oldest is not None:
+        cutoff = min(cutoff, oldest)
+    drop_partitions_before(db, SITE_VISITS, cutoff)
+
+
+def run_partition_maintenance() -> bool:
+    """One pass over every scheme and visit retention; a failing step does not skip the others."""
+    now = datetime.now(timezone.utc)
+    ok = True
+    db = SessionLocal()
+    try:
+        for scheme in SCHEMES:
+            try:
+                created = ensure_partitions(db, scheme, now)
+                if created:
+                    logger.info("created %d %s partitions", created, scheme.table)
+            except Exception:
+                db.rollback()
+                logger.exception("creating %s partitions failed", scheme.table)
+                ok = False
+        try:
+            apply_visit_retention(db, now)
+        except Exception:
+            db.rollback()
+            logger.exception("visit retention failed")
+            ok = False
+    finally:
+        db.close()
+    return ok
+
+
+async def partition_maintenance_loop():
+    """Create partitions ahead of time and apply visit retention (metric samples are pruned by the rollup job)."""
+    last_run: float | None = None
+    while True:
+        # DDL from several workers at once would only contend; the leader does it. Leadership
+        # is checked every sample interval, so a new leader runs a pass right away.
+        if not is_metrics_leader():
+            last_run = None
+        elif last_run is None or time.monotonic() - last_run >= MAINTENANCE_INTERVAL_SECONDS:
+            last_run = time.monotonic()
+            try:
+                if await asyncio.to_thread(run_partition_maintenance):
+                    record_success("partition_maintenance")
+                else:
+                    record_failure("partition_maintenance")
+            except Exception:
+                logger.exception("partition maintenance error")
+                record_failure("partition_maintenance")
+        await asyncio.sleep(settings.metrics_sample_interval)
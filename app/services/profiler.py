@@ -0,0 +1,174 @@
+import cProfile
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from app.core.config import settings
+from app.core.errors import BadRequestError
+
+MAX_SAMPLE_SECONDS = 60
+MAX_SAMPLE_HZ = 1000
+# Saved request profiles live as long as app.log does (daily rotation, backupCount=6),
+# and at most this many are kept.
+PROFILE_MAX_AGE = timedelta(days=7)
+MAX_SAVED_PROFILES = 200
+
+_sampling_lock = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _collapse(frame) -> list[str]:
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _take_sample(into: Counter, skip_thread: int):
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    for thread_id, frame in sys._current_frames().items():
+        if thread_id == skip_thread:
+            continue
+        stack = [names.get(thread_id, str(thread_id)), *_collapse(frame)]
+        into[";".join(stack)] += 1
+
+
+def sample_stacks(seconds: float, hz: int) -> Counter:
+    """Sample every thread's stack hz times per second; collapsed stack -> sample count."""
+    if not 0 < seconds <= MAX_SAMPLE_SECONDS or not 0 < hz <= MAX_SAMPLE_HZ:
+        raise BadRequestError("Invalid profiling window")
+    if not _sampling_lock.acquire(blocking=False):
+        raise BadRequestError("A profiling session is already running")
+    try:
+        stacks: Counter = Counter()
+        me = threading.get_ident()
+        interval = 1.0 / hz
+        deadline = time.monotonic() + seconds
+        next_tick = time.monotonic()
+        while next_tick < deadline:
+            _take_sample(stacks, me)
+            next_tick += interval
+            time.sleep(max(next_tick - time.monotonic(), 0))
+        return stacks
+    finally:
+        _sampling_lock.release()
+
+
+def collapsed_text(stacks: Counter) -> str:
+    """Brendan Gregg's folded format, readable by flamegraph.pl and speedscope."""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def speedscope_profile(stacks: Counter, name: str, hz: int) -> dict:
+    frames: list[dict] = []
+    frame_index: dict[str, int] = {}
+    samples = []
+    weights = []
+    for stack, count in stacks.items():
+        indices = []
+        for label in stack.split(";"):
+            if label not in frame_index:
+                frame_index[label] = len(frames)
+                frames.append({"name": label})
+            indices.append(frame_index[label])
+        samples.append(indices)
+        weights.append(count)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [
+            {
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights) / hz,
+                "samples": samples,
+                "weights": [count / hz for count in weights],
+            }
+        ],
+    }
+
+
+class ContinuousSampler:
+    """Low-rate background sampler whose counts accumulate until read with reset."""
+
+    def __init__(self, hz: float) -> None:
+        self.hz = hz
+        self._stacks: Counter = Counter()
+        self._lock = threading.Lock()
+        self._started_at = time.time()
+
+    def start(self):
+        threading.Thread(target=self._run, name="continuous-profiler", daemon=True).start()
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            time.sleep(1.0 / self.hz)
+            sample: Counter = Counter()
+            _take_sample(sample, me)
+            with self._lock:
+                self._stacks.update(sample)
+
+    def snapshot(self, reset: bool) -> tuple[Counter, float]:
+        with self._lock:
+            stacks, started_at = Counter(self._stacks), self._started_at
+            if reset:
+                self._stacks.clear()
+                self._started_at = time.time()
+        return stacks, started_at
+
+
+_continuous: ContinuousSampler | None = None
+
+
+def start_continuous_profiler():
+    global _continuous
+    if settings.profiler_continuous_hz > 0 and _continuous is None:
+        _continuous = ContinuousSampler(settings.profiler_continuous_hz)
+        _continuous.start()
+
+
+def continuous_profiler() -> ContinuousSampler | None:
+    return _continuous
+
+
+def _profile_path(label: str) -> Path:
+    directory = Path(settings.profiles_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", label).strip("-")[:80]
+    return directory / f"{stamp}-{slug}.prof"
+
+
+def _prune_profiles(directory: Path, now: datetime):
+    # Names start with the UTC timestamp, so they sort oldest first.
+    paths = sorted(directory.glob("*.prof"))
+    cutoff = (now - PROFILE_MAX_AGE).timestamp()
+    for index, path in enumerate(paths):
+        try:
+            if index < len(paths) - MAX_SAVED_PROFILES or path.stat().st_mtime < cutoff:
+                path.unlink()
+        except FileNotFoundError:
+            # Another worker pruned it first.
+            continue
+
+
+def save_profile(profile: cProfile.Profile, label: str) -> str:
+    """Write pstats data for the request, dropping expired ones; returns the file name."""
+    path = _profile_path(label)
+    profile.dump_stats(path)
+    _prune_profiles(path.parent, datetime.now(timezone.utc))
+    return path.name
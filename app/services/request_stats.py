@@ -0,0 +1,188 @@
+import cProfile
+import functools
+import inspect
+import logging
+import random
+import re
+import threading
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.routing import APIRoute, request_response
+
+from app.core.config import settings
+from app.core.request_context import RequestStats, current_request_stats
+from app.core.security import decode_token
+from app.services.profiler import save_profile
+from app.services.route_metrics import route_template
+
+logger = logging.getLogger("fizicamd.sql")
+
+STATEMENT_LOG_CHARS = 500
+# Server-Timing entries in display order, with their descriptions.
+TIMING_SPANS = (
+    ("deps", "dependencies"),
+    ("auth", "authentication"),
+    ("endpoint", "handler"),
+    ("db", None),
+    ("storage", "file storage"),
+    ("serialize", "response validation"),
+)
+
+_NUMBERED_PARAM = re.compile(r"(%\(\w+?)(?:_\d+)+\)s")
+_REPEATED_PARAM = re.compile(r"(%\(\w+\)s)(?:, \1)+")
+_WHITESPACE = re.compile(r"\s+")
+
+# The profiler hook is process-wide (sys.monitoring since 3.12), so one profiled request at a time.
+_profile_lock = threading.Lock()
+
+
+def _route(stats: RequestStats) -> str:
+    return f"{stats.scope.get('method', '')} {route_template(stats.scope)}"
+
+
+def statement_shape(statement: str) -> str:
+    # Expanded IN lists render as %(id_1_1)s, %(id_1_2)s, ...; fold them so the shape
+    # does not depend on the list length.
+    folded = _REPEATED_PARAM.sub(r"\1", _NUMBERED_PARAM.sub(r"\1)s", statement))
+    return _WHITESPACE.sub(" ", folded).strip()
+
+
+def observe_query(statement: str, elapsed_ms: float):
+    stats = current_request_stats()
+    if stats is None:
+        return
+    stats.query_count += 1
+    stats.query_time_ms += elapsed_ms
+    stats.shapes[statement_shape(statement)] += 1
+    if elapsed_ms >= settings.slow_query_ms:
+        logger.warning("slow query %.1fms on %s: %s", elapsed_ms, _route(stats), statement[:STATEMENT_LOG_CHARS])
+
+
+def report_repeated_queries(stats: RequestStats):
+    for shape, count in stats.shapes.items():
+        if count >= settings.n_plus_one_threshold:
+            logger.warning("suspected N+1 on %s: %d x %s", _route(stats), count, shape[:STATEMENT_LOG_CHARS])
+
+
+def timing_breakdown(stats: RequestStats) -> dict[str, float]:
+    spans = dict(stats.spans)
+    if stats.query_count:
+        spans["db"] = stats.query_time_ms
+    return spans
+
+
+def wants_server_timing(stats: RequestStats) -> bool:
+    return stats.is_admin or random.random() < settings.server_timing_sample_rate
+
+
+def server_timing(stats: RequestStats, total_ms: float) -> str:
+    spans = timing_breakdown(stats)
+    entries = []
+    for name, description in TIMING_SPANS:
+        if name not in spans:
+            continue
+        if name == "db":
+            description = f"{stats.query_count} queries"
+        entries.append(f'{name};dur={spans[name]:.1f};desc="{description}"')
+    entries.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(entries)
+
+
+def wants_profile(request: Request) -> bool:
+    """cProfile the endpoint when an admin asks for it with the X-Profile header."""
+    if request.headers.get("x-profile", "").lower() not in ("1", "true"):
+        return False
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        claims = decode_token(token)
+    except Exception:
+        return False
+    return claims.get("typ") == "access" and "ADMIN" in (claims.get("roles") or [])
+
+
+def _timed_endpoint(call):
+    def record(started: float):
+        stats = current_request_stats()
+        if stats is not None:
+            stats.add_span("endpoint", (time.perf_counter() - started) * 1000)
+            stats.endpoint_finished = time.perf_counter()
+
+    def begin() -> float:
+        stats = current_request_stats()
+        now = time.perf_counter()
+        if stats is not None:
+            stats.endpoint_started = now
+        return now
+
+    def profiler() -> cProfile.Profile | None:
+        stats = current_request_stats()
+        if stats is None or not stats.profile_requested:
+            return None
+        if not _profile_lock.acquire(blocking=False):
+            stats.profile_skipped = True
+            return None
+        return cProfile.Profile()
+
+    def save(profile: cProfile.Profile):
+        stats = current_request_stats()
+        try:
+            stats.profile_file = save_profile(profile, _route(stats))
+        finally:
+            _profile_lock.release()
+
+    if inspect.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def timed(*args, **kwargs):
+            started = begin()
+            profile = profiler()
+            if profile is not None:
+                profile.enable()
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                if profile is not None:
+                    profile.disable()
+                    save(profile)
+                record(started)
+    else:
+        @functools.wraps(call)
+        def timed(*args, **kwargs):
+            started = begin()
+            profile = profiler()
+            try:
+                if profile is not None:
+                    # Sync endpoints run in a worker thread; profile that thread.
+                    return profile.runcall(call, *args, **kwargs)
+                return call(*args, **kwargs)
+            finally:
+                if profile is not None:
+                    save(profile)
+                record(started)
+    return timed
+
+
+def _timed_handler(handler):
+    async def timed(request):
+        started = time.perf_counter()
+        response = await handler(request)
+        stats = current_request_stats()
+        if stats is not None and stats.endpoint_started is not None:
+            stats.add_span("deps", (stats.endpoint_started - started) * 1000)
+            stats.add_span("serialize", (time.perf_counter() - stats.endpoint_finished) * 1000)
+        return response
+    return timed
+
+
+def instrument_routes(app: FastAPI):
+    """Split each route's handler time into dependency resolution, endpoint and serialization.
+
+    Runs once after all routers are included: the endpoint is swapped on the already built
+    dependant (its signature was inspected at registration) and the ASGI app is rebuilt.
+    """
+    for route in app.routes:
+        if isinstance(route, APIRoute):
+            route.dependant.call = _timed_endpoint(route.dependant.call)
+            route.app = request_response(_timed_handler(route.get_route_handler()))
@@ -6,6 +6,7 @@ from sqlalchemy import func, String, cast
 from sqlalchemy.orm import Session
 
 from app.core.errors import BadRequestError, NotFoundError
+from app.models.media_asset import MediaAsset
 from app.models.resource_category import ResourceCategory
 from app.models.resource_entry import ResourceEntry
 from app.models.user import User
@@ -195,7 +196,7 @@ def create_resource(db: Session, payload: dict, author_id: str) -> ResourceEntry
         slug=resolve_resource_slug(db, title),
         summary=summary,
         avatar_media_id=_payload_value(payload, "avatar_asset_id", "avatarAssetId"),
-        content=validate_blocks(payload.get("blocks")),
+        content=lock_block_assets(db, validate_blocks(payload.get("blocks"))),
         tags=clean_tags(payload.get("tags")),
         status=status,
         published_at=now if status == "PUBLISHED" else None,
@@ -227,7 +228,7 @@ def update_resource(db: Session, entry: ResourceEntry, payload: dict, actor_id:
     entry.title = title
     entry.summary = summary
     entry.avatar_media_id = _payload_value(payload, "avatar_asset_id", "avatarAssetId")
-    entry.content = validate_blocks(payload.get("blocks"))
+    entry.content = lock_block_assets(db, validate_blocks(payload.get("blocks")))
     entry.tags = clean_tags(payload.get("tags"))
     entry.status = status
     if status == "PUBLISHED":
@@ -334,6 +335,11 @@ def validate_blocks(blocks: list | None) -> list[dict]:
             asset_id = payload.get("asset_id") or payload.get("assetId")
             if not asset_id:
                 raise BadRequestError("Încărcarea fișierului pentru blocurile media este obligatorie.")
+            try:
+                # Canonical form: the media GC matches block references as exact JSON strings.
+                asset_id = str(uuid.UUID(str(asset_id)))
+            except ValueError:
+                raise BadRequestError("Fișierul selectat nu este valid.")
             caption = payload.get("caption")
             title = payload.get("title")
             cleaned.append(
@@ -352,6 +358,20 @@ def validate_blocks(blocks: list | None) -> list[dict]:
     return cleaned
 
 
+def lock_block_assets(db: Session, blocks: list[dict]) -> list[dict]:
+    """Share-lock the assets the blocks point at until the resource is committed.
+
+    Block references have no foreign key; the lock makes the media GC either skip these
+    assets or finish deleting them first, in which case the resource is rejected.
+    """
+    asset_ids = {uuid.UUID(block["assetId"]) for block in blocks if "assetId" in block}
+    if asset_ids:
+        found = db.query(MediaAsset.id).filter(MediaAsset.id.in_(asset_ids)).with_for_update(read=True).all()
+        if len(found) != len(asset_ids):
+            raise BadRequestError("Fișierul selectat nu mai există.")
+    return blocks
+
+
 def normalize_required(value: str | None, message: str) -> str:
     trimmed = (value or "").strip()
     if not trimmed:
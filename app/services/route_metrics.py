@@ -0,0 +1,95 @@
+import math
+import threading
+from array import array
+from dataclasses import dataclass, field, replace
+
+# Upper bounds in milliseconds, doubling every two buckets: 0.25ms .. ~46s, then +Inf.
+LATENCY_BUCKETS_MS = tuple(0.25 * 2 ** (index / 2) for index in range(36))
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def bucket_index(duration_ms: float) -> int:
+    """Index of the first bound >= duration_ms; len(LATENCY_BUCKETS_MS) is the +Inf bucket."""
+    last = len(LATENCY_BUCKETS_MS)
+    if duration_ms <= LATENCY_BUCKETS_MS[0]:
+        return 0
+    index = min(math.ceil(2 * math.log2(duration_ms / LATENCY_BUCKETS_MS[0])), last)
+    # log2 may land one bucket off right on a bound.
+    if index < last and duration_ms > LATENCY_BUCKETS_MS[index]:
+        index += 1
+    elif index > 0 and duration_ms <= LATENCY_BUCKETS_MS[index - 1]:
+        index -= 1
+    return index
+
+
+@dataclass
+class RouteStats:
+    counts: array = field(default_factory=lambda: array("Q", [0]) * (len(LATENCY_BUCKETS_MS) + 1))
+    count: int = 0
+    total_ms: float = 0.0
+    request_bytes: int = 0
+    response_bytes: int = 0
+    span_ms: dict[str, float] = field(default_factory=dict)
+
+    def observe(self, duration_ms: float, request_bytes: int, response_bytes: int, spans: dict[str, float]):
+        self.counts[bucket_index(duration_ms)] += 1
+        self.count += 1
+        self.total_ms += duration_ms
+        self.request_bytes += request_bytes
+        self.response_bytes += response_bytes
+        for name, span_ms in spans.items():
+            self.span_ms[name] = self.span_ms.get(name, 0.0) + span_ms
+
+    def copy(self) -> "RouteStats":
+        return replace(self, counts=array("Q", self.counts), span_ms=dict(self.span_ms))
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the q-th observation; None past the last bound."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else None
+        return None
+
+
+# Keyed by (method, route template, status). The event loop thread writes here while
+# sync endpoints and the snapshot writer read from threadpool threads.
+_stats: dict[tuple[str, str, int], RouteStats] = {}
+_stats_lock = threading.Lock()
+
+
+def route_template(scope: dict) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+def observe_request(
+    method: str,
+    route: str,
+    status: int,
+    duration_ms: float,
+    request_bytes: int,
+    response_bytes: int,
+    spans: dict[str, float] | None = None,
+):
+    key = (method, route, status)
+    with _stats_lock:
+        stats = _stats.get(key)
+        if stats is None:
+            stats = _stats[key] = RouteStats()
+        stats.observe(duration_ms, request_bytes, response_bytes, spans or {})
+
+
+def route_stats() -> list[tuple[tuple[str, str, int], RouteStats]]:
+    """A consistent copy, safe to read from any thread."""
+    with _stats_lock:
+        return [(key, stats.copy()) for key, stats in _stats.items()]
+
+
+def reset_route_stats():
+    with _stats_lock:
+        _stats.clear()
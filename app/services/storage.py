@@ -0,0 +1,291 @@
+import os
+import re
+import shutil
+import unicodedata
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import BinaryIO, Iterator
+from urllib.parse import quote
+
+from app.core.config import settings
+
+BASE_DIR = Path(settings.media_storage_path)
+BASE_DIR.mkdir(parents=True, exist_ok=True)
+
+COPY_BUFFER_BYTES = 1024 * 1024
+
+
+def bucket_path(bucket: str) -> Path:
+    path = BASE_DIR / bucket
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _shard_dir(bucket: str, storage_key: str) -> Path:
+    return bucket_path(bucket) / storage_key[0:2] / storage_key[2:4]
+
+
+def sharded_path(bucket: str, storage_key: str) -> Path:
+    return _shard_dir(bucket, storage_key) / storage_key
+
+
+def legacy_path(bucket: str, storage_key: str) -> Path:
+    return bucket_path(bucket) / storage_key
+
+
+def content_disposition(filename: str, disposition: str = "inline") -> str:
+    """RFC 6266 header value: an ASCII fallback plus the exact UTF-8 name in filename*."""
+    fallback = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode("ascii")
+    fallback = re.sub(r'[^A-Za-z0-9 ._()-]', "_", fallback).strip() or "download"
+    return f"{disposition}; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+
+class StorageBackend(ABC):
+    """Where media bytes live; objects are addressed by (bucket, storage_key)."""
+
+    @abstractmethod
+    def write(self, bucket: str, storage_key: str, stream: BinaryIO, content_type: str) -> None: ...
+
+    @abstractmethod
+    def put_file(self, bucket: str, storage_key: str, path: Path, content_type: str) -> None:
+        """Store a local file under the key; the file is consumed."""
+
+    @abstractmethod
+    def open(self, bucket: str, storage_key: str) -> BinaryIO: ...
+
+    @abstractmethod
+    def size(self, bucket: str, storage_key: str) -> int | None: ...
+
+    @abstractmethod
+    def delete(self, bucket: str, storage_key: str) -> None: ...
+
+    @abstractmethod
+    def iter_keys(self, bucket: str) -> Iterator[tuple[str, float]]:
+        """Yield (storage_key, modified timestamp) for every object in the bucket."""
+
+    def local_path(self, bucket: str, storage_key: str) -> Path | None:
+        return None
+
+    def presigned_put_url(self, bucket: str, storage_key: str, content_type: str) -> str | None:
+        return None
+
+    def presigned_get_url(self, bucket: str, storage_key: str, content_type: str, filename: str | None) -> str | None:
+        return None
+
+
+class MultipartStorage(ABC):
+    """Backends shared by several nodes stage resumable uploads in the store itself
+    instead of on the disk of whichever node got a chunk."""
+
+    @abstractmethod
+    def create_multipart_upload(self, bucket: str, storage_key: str, content_type: str) -> str: ...
+
+    @abstractmethod
+    def upload_part(self, bucket: str, storage_key: str, upload_id: str, part_number: int, stream: BinaryIO, length: int) -> str:
+        """Store one part; returns its ETag."""
+
+    @abstractmethod
+    def complete_multipart_upload(self, bucket: str, storage_key: str, upload_id: str, etags: dict[int, str]) -> None: ...
+
+    @abstractmethod
+    def abort_multipart_upload(self, bucket: str, storage_key: str, upload_id: str) -> None: ...
+
+
+class LocalStorageBackend(StorageBackend):
+    def write(self, bucket: str, storage_key: str, stream: BinaryIO, content_type: str) -> None:
+        target = sharded_path(bucket, storage_key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with target.open("wb") as out:
+            shutil.copyfileobj(stream, out, COPY_BUFFER_BYTES)
+
+    def put_file(self, bucket: str, storage_key: str, path: Path, content_type: str) -> None:
+        target = sharded_path(bucket, storage_key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(path, target)
+
+    def open(self, bucket: str, storage_key: str) -> BinaryIO:
+        return self.local_path(bucket, storage_key).open("rb")
+
+    def size(self, bucket: str, storage_key: str) -> int | None:
+        try:
+            return self.local_path(bucket, storage_key).stat().st_size
+        except FileNotFoundError:
+            return None
+
+    def delete(self, bucket: str, storage_key: str) -> None:
+        sharded_path(bucket, storage_key).unlink(missing_ok=True)
+        legacy_path(bucket, storage_key).unlink(missing_ok=True)
+
+    def iter_keys(self, bucket: str) -> Iterator[tuple[str, float]]:
+        for dirpath, _, filenames in os.walk(bucket_path(bucket)):
+            for name in filenames:
+                try:
+                    yield name, (Path(dirpath) / name).stat().st_mtime
+                except FileNotFoundError:
+                    continue
+
+    def local_path(self, bucket: str, storage_key: str) -> Path:
+        sharded = sharded_path(bucket, storage_key)
+        if sharded.exists():
+            return sharded
+        legacy = legacy_path(bucket, storage_key)
+        if legacy.exists():
+            return legacy
+        # The layout migration may have moved the file between the two checks.
+        return sharded
+
+
+class S3StorageBackend(StorageBackend, MultipartStorage):
+    """S3-compatible object storage (AWS, MinIO); buckets map to key prefixes."""
+
+    def __init__(
+        self,
+        bucket_name: str,
+        endpoint_url: str | None = None,
+        region: str | None = None,
+        access_key_id: str | None = None,
+        secret_access_key: str | None = None,
+        presign_ttl_seconds: int = 900,
+        presign_downloads: bool = True,
+    ) -> None:
+        import boto3
+
+        self._bucket = bucket_name
+        self._presign_ttl_seconds = presign_ttl_seconds
+        self._presign_downloads = presign_downloads
+        self._client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+        )
+
+    @staticmethod
+    def _key(bucket: str, storage_key: str) -> str:
+        return f"{bucket}/{storage_key}"
+
+    def write(self, bucket: str, storage_key: str, stream: BinaryIO, content_type: str) -> None:
+        self._client.upload_fileobj(
+            stream,
+            self._bucket,
+            self._key(bucket, storage_key),
+            ExtraArgs={"ContentType": content_type},
+        )
+
+    def put_file(self, bucket: str, storage_key: str, path: Path, content_type: str) -> None:
+        self._client.upload_file(
+            str(path),
+            self._bucket,
+            self._key(bucket, storage_key),
+            ExtraArgs={"ContentType": content_type},
+        )
+        path.unlink(missing_ok=True)
+
+    def open(self, bucket: str, storage_key: str) -> BinaryIO:
+        return self._client.get_object(Bucket=self._bucket, Key=self._key(bucket, storage_key))["Body"]
+
+    def size(self, bucket: str, storage_key: str) -> int | None:
+        from botocore.exceptions import ClientError
+
+        try:
+            head = self._client.head_object(Bucket=self._bucket, Key=self._key(bucket, storage_key))
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in {"404", "NoSuchKey", "NotFound"}:
+                return None
+            raise
+        return head["ContentLength"]
+
+    def delete(self, bucket: str, storage_key: str) -> None:
+        self._client.delete_object(Bucket=self._bucket, Key=self._key(bucket, storage_key))
+
+    def iter_keys(self, bucket: str) -> Iterator[tuple[str, float]]:
+        prefix = f"{bucket}/"
+        paginator = self._client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self._bucket, Prefix=prefix):
+            for item in page.get("Contents", []):
+                yield item["Key"][len(prefix):], item["LastModified"].timestamp()
+
+    def create_multipart_upload(self, bucket: str, storage_key: str, content_type: str) -> str:
+        created = self._client.create_multipart_upload(
+            Bucket=self._bucket, Key=self._key(bucket, storage_key), ContentType=content_type
+        )
+        return created["UploadId"]
+
+    def upload_part(self, bucket: str, storage_key: str, upload_id: str, part_number: int, stream: BinaryIO, length: int) -> str:
+        part = self._client.upload_part(
+            Bucket=self._bucket,
+            Key=self._key(bucket, storage_key),
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=stream,
+            ContentLength=length,
+        )
+        return part["ETag"]
+
+    def complete_multipart_upload(self, bucket: str, storage_key: str, upload_id: str, etags: dict[int, str]) -> None:
+        from botocore.exceptions import ClientError
+
+        try:
+            self._client.complete_multipart_upload(
+                Bucket=self._bucket,
+                Key=self._key(bucket, storage_key),
+                UploadId=upload_id,
+                MultipartUpload={"Parts": [{"PartNumber": number, "ETag": etags[number]} for number in sorted(etags)]},
+            )
+        except ClientError as exc:
+            # A retry after the first completion went through but its response was lost.
+            if exc.response.get("Error", {}).get("Code") != "NoSuchUpload" or self.size(bucket, storage_key) is None:
+                raise
+
+    def abort_multipart_upload(self, bucket: str, storage_key: str, upload_id: str) -> None:
+        from botocore.exceptions import ClientError
+
+        try:
+            self._client.abort_multipart_upload(Bucket=self._bucket, Key=self._key(bucket, storage_key), UploadId=upload_id)
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") != "NoSuchUpload":
+                raise
+
+    def presigned_put_url(self, bucket: str, storage_key: str, content_type: str) -> str | None:
+        return self._client.generate_presigned_url(
+            "put_object",
+            Params={"Bucket": self._bucket, "Key": self._key(bucket, storage_key), "ContentType": content_type},
+            ExpiresIn=self._presign_ttl_seconds,
+        )
+
+    def presigned_get_url(self, bucket: str, storage_key: str, content_type: str, filename: str | None) -> str | None:
+        if not self._presign_downloads:
+            return None
+        params = {
+            "Bucket": self._bucket,
+            "Key": self._key(bucket, storage_key),
+            "ResponseContentType": content_type,
+        }
+        if filename:
+            params["ResponseContentDisposition"] = content_disposition(filename)
+        return self._client.generate_presigned_url("get_object", Params=params, ExpiresIn=self._presign_ttl_seconds)
+
+
+def build_storage_backend() -> StorageBackend:
+    if settings.storage_backend == "s3":
+        return S3StorageBackend(
+            bucket_name=settings.s3_bucket,
+            endpoint_url=settings.s3_endpoint_url or None,
+            region=settings.s3_region or None,
+            access_key_id=settings.s3_access_key_id or None,
+            secret_access_key=settings.s3_secret_access_key or None,
+            presign_ttl_seconds=settings.s3_presign_ttl_seconds,
+            presign_downloads=settings.s3_presign_downloads,
+        )
+    return LocalStorageBackend()
+
+
+_backend: StorageBackend | None = None
+
+
+def get_storage() -> StorageBackend:
+    global _backend
+    if _backend is None:
+        _backend = build_storage_backend()
+    return _backend
@@ -0,0 +1,43 @@
+import asyncio
+import threading
+import time
+from typing import Coroutine
+
+# Background loops started at startup, with when each last completed a pass and how
+# often it failed. Written from the event loop, read from threadpool threads as well.
+_tasks: dict[str, asyncio.Task] = {}
+_last_success: dict[str, float] = {}
+_failures: dict[str, int] = {}
+_lock = threading.Lock()
+
+
+def start_background_task(name: str, coro: Coroutine) -> asyncio.Task:
+    task = asyncio.create_task(coro, name=name)
+    with _lock:
+        _tasks[name] = task
+        _failures.setdefault(name, 0)
+    return task
+
+
+def record_success(name: str):
+    with _lock:
+        _last_success[name] = time.time()
+
+
+def record_failure(name: str):
+    with _lock:
+        _failures[name] = _failures.get(name, 0) + 1
+
+
+def task_health() -> list[dict]:
+    with _lock:
+        names = sorted(set(_tasks) | set(_failures))
+        return [
+            {
+                "name": name,
+                "running": name in _tasks and not _tasks[name].done(),
+                "last_success": _last_success.get(name),
+                "failures": _failures.get(name, 0),
+            }
+            for name in names
+        ]
@@ -0,0 +1,222 @@
+import asyncio
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta, timezone
+
+from sqlalchemy import delete, func, select, text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.models.site_visit import SiteVisit
+from app.models.site_visit_rollup import SiteVisitDaily, SiteVisitDailyPath, SiteVisitDailyReferrer, SiteVisitRollupState
+from app.services.hyperloglog import HyperLogLog
+from app.services.metrics_leader import is_metrics_leader
+from app.services.task_health import record_failure, record_success
+
+logger = logging.getLogger("fizicamd.visits")
+
+# ingested_at is the start of the inserting transaction, which can commit a little later;
+# rows are folded only once no open flush can still add to the interval.
+INGEST_GRACE = timedelta(minutes=1)
+
+# Views per (day, path, visitor) and per (day, referrer host) of the selected raw visits.
+# There are no visitor cookies, so a visitor is an IP address and user agent pair.
+_VISITORS_SQL = """
+    SELECT (created_at AT TIME ZONE 'UTC')::date AS day, coalesce(path, '') AS path,
+           coalesce(ip_address, '') || '|' || coalesce(user_agent, '') AS visitor, count(*) AS views
+    FROM site_visits
+    WHERE {where}
+    GROUP BY 1, 2, 3
+"""
+
+_REFERRERS_SQL = """
+    SELECT (created_at AT TIME ZONE 'UTC')::date AS day,
+           coalesce(lower(substring(referrer from '^[A-Za-z][A-Za-z0-9+.-]*://([^/:?#]+)')), '') AS host, count(*) AS views
+    FROM site_visits
+    WHERE {where}
+    GROUP BY 1, 2
+"""
+
+_DAY_ROWS = "created_at >= :start AND created_at < :end AND ingested_at < :ingested_before"
+_NEW_ROWS = "ingested_at >= :start AND ingested_at < :end"
+
+
+@dataclass
+class _Rollup:
+    views: int = 0
+    sketch: HyperLogLog = field(default_factory=HyperLogLog)
+
+
+def _aggregate(db: Session, where: str, params: dict):
+    days: dict[date, _Rollup] = defaultdict(_Rollup)
+    paths: dict[tuple[date, str], _Rollup] = defaultdict(_Rollup)
+    for day, path, visitor, views in db.execute(text(_VISITORS_SQL.format(where=where)), params):
+        for rollup in (days[day], paths[(day, path)]):
+            rollup.views += views
+            rollup.sketch.add(visitor)
+    referrers = {(day, host): views for day, host, views in db.execute(text(_REFERRERS_SQL.format(where=where)), params)}
+    return days, paths, referrers
+
+
+def _merge(db: Session, days: dict, paths: dict, referrers: dict):
+    """Add the aggregates to the daily rows, merging sketches with the ones already stored."""
+    if days:
+        for row in db.execute(select(SiteVisitDaily).where(SiteVisitDaily.day.in_(list(days)))).scalars():
+            days[row.day].views += row.views
+            days[row.day].sketch.merge(HyperLogLog.from_bytes(row.visitors_hll))
+        stmt = pg_insert(SiteVisitDaily).values(
+            [{"day": day, "views": rollup.views, "visitors_hll": rollup.sketch.to_bytes()} for day, rollup in sorted(days.items())]
+        )
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[SiteVisitDaily.day],
+            set_={"views": stmt.excluded.views, "visitors_hll": stmt.excluded.visitors_hll},
+        ))
+    if paths:
+        existing = select(SiteVisitDailyPath).where(tuple_(SiteVisitDailyPath.day, SiteVisitDailyPath.path).in_(list(paths)))
+        for row in db.execute(existing).scalars():
+            paths[(row.day, row.path)].views += row.views
+            paths[(row.day, row.path)].sketch.merge(HyperLogLog.from_bytes(row.visitors_hll))
+        stmt = pg_insert(SiteVisitDailyPath).values(
+            [
+                {"day": day, "path": path, "views": rollup.views, "visitors_hll": rollup.sketch.to_bytes()}
+                for (day, path), rollup in sorted(paths.items())
+            ]
+        )
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[SiteVisitDailyPath.day, SiteVisitDailyPath.path],
+            set_={"views": stmt.excluded.views, "visitors_hll": stmt.excluded.visitors_hll},
+        ))
+    if referrers:
+        stmt = pg_insert(SiteVisitDailyReferrer).values(
+            [{"day": day, "referrer_host": host, "views": views} for (day, host), views in sorted(referrers.items())]
+        )
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[SiteVisitDailyReferrer.day, SiteVisitDailyReferrer.referrer_host],
+            set_={"views": SiteVisitDailyReferrer.views + stmt.excluded.views},
+        ))
+
+
+def _day_bounds(day: date) -> tuple[datetime, datetime]:
+    start = datetime.combine(day, time.min, tzinfo=timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+def rollup_day(db: Session, day: date, ingested_before: datetime):
+    """Rebuild the rollup rows of one UTC day from the raw visits ingested before ingested_before."""
+    start, end = _day_bounds(day)
+    for model in (SiteVisitDaily, SiteVisitDailyPath, SiteVisitDailyReferrer):
+        db.execute(delete(model).where(model.day == day))
+    _merge(db, *_aggregate(db, _DAY_ROWS, {"start": start, "end": end, "ingested_before": ingested_before}))
+
+
+def fold_new_visits(db: Session, now: datetime):
+    """Fold the visits ingested since the previous run into the daily tables.
+
+    Each run reads only the rows that arrived in between, whatever day they belong to, so
+    late beacons need no recomputation and days without visits cost nothing.
+    """
+    cutoff = now - INGEST_GRACE
+    # The row lock serializes runs, e.g. around a leader change.
+    state = db.execute(select(SiteVisitRollupState).with_for_update()).scalar_one()
+    if state.folded_until is None:
+        # First run: rebuild the days still in site_visits; days already pruned keep their rows.
+        days = db.execute(
+            text("SELECT DISTINCT (created_at AT TIME ZONE 'UTC')::date FROM site_visits WHERE ingested_at < :cutoff"),
+            {"cutoff": cutoff},
+        ).scalars().all()
+        for day in days:
+            rollup_day(db, day, cutoff)
+    elif cutoff > state.folded_until:
+        _merge(db, *_aggregate(db, _NEW_ROWS, {"start": state.folded_until, "end": cutoff}))
+    else:
+        db.rollback()
+        return
+    state.folded_until = cutoff
+    db.commit()
+
+
+def oldest_unfolded_visit(db: Session) -> datetime | None:
+    """created_at of the oldest raw visit not yet in the daily tables; retention must keep it."""
+    folded_until = db.execute(select(SiteVisitRollupState.folded_until)).scalar()
+    if folded_until is None:
+        return db.query(func.min(SiteVisit.created_at)).scalar()
+    return db.query(func.min(SiteVisit.created_at)).filter(SiteVisit.ingested_at >= folded_until).scalar()
+
+
+def run_visit_rollups():
+    db = SessionLocal()
+    try:
+        fold_new_visits(db, datetime.now(timezone.utc))
+    finally:
+        db.close()
+
+
+async def visit_rollup_loop():
+    while True:
+        await asyncio.sleep(settings.visit_rollup_interval)
+        # One worker is enough; reuse the metrics leader election.
+        if not is_metrics_leader():
+            continue
+        try:
+            await asyncio.to_thread(run_visit_rollups)
+            record_success("visit_rollup")
+        except Exception:
+            logger.exception("visit rollup error")
+            record_failure("visit_rollup")
+
+
+def _merged_visitors(sketches) -> int:
+    merged = HyperLogLog()
+    for sketch in sketches:
+        merged.merge(HyperLogLog.from_bytes(sketch))
+    return merged.count()
+
+
+def traffic_summary(db: Session, start: date, end: date, limit: int) -> dict:
+    """Daily views and unique visitors, top paths and top referrers for days start..end inclusive."""
+    days = db.execute(
+        select(SiteVisitDaily).where(SiteVisitDaily.day >= start, SiteVisitDaily.day <= end).order_by(SiteVisitDaily.day)
+    ).scalars().all()
+
+    in_range = (SiteVisitDailyPath.day >= start, SiteVisitDailyPath.day <= end)
+    top_paths = db.execute(
+        select(SiteVisitDailyPath.path, func.sum(SiteVisitDailyPath.views).label("views"))
+        .where(*in_range)
+        .group_by(SiteVisitDailyPath.path)
+        .order_by(text("views DESC"), SiteVisitDailyPath.path)
+        .limit(limit)
+    ).all()
+    path_sketches: dict[str, list[bytes]] = defaultdict(list)
+    if top_paths:
+        rows = db.execute(
+            select(SiteVisitDailyPath.path, SiteVisitDailyPath.visitors_hll).where(
+                *in_range, SiteVisitDailyPath.path.in_([row.path for row in top_paths])
+            )
+        )
+        for path, sketch in rows:
+            path_sketches[path].append(sketch)
+
+    top_referrers = db.execute(
+        select(SiteVisitDailyReferrer.referrer_host, func.sum(SiteVisitDailyReferrer.views).label("views"))
+        .where(SiteVisitDailyReferrer.day >= start, SiteVisitDailyReferrer.day <= end)
+        .group_by(SiteVisitDailyReferrer.referrer_host)
+        .order_by(text("views DESC"), SiteVisitDailyReferrer.referrer_host)
+        .limit(limit)
+    ).all()
+
+    return {
+        "views": sum(row.views for row in days),
+        "unique_visitors": _merged_visitors(row.visitors_hll for row in days),
+        "days": [
+            {"day": row.day, "views": row.views, "unique_visitors": HyperLogLog.from_bytes(row.visitors_hll).count()}
+            for row in days
+        ],
+        "top_paths": [
+            {"path": row.path, "views": int(row.views), "unique_visitors": _merged_visitors(path_sketches[row.path])}
+            for row in top_paths
+        ],
+        "top_referrers": [{"referrer": row.referrer_host, "views": int(row.views)} for row in top_referrers],
+    }
@@ -0,0 +1,148 @@
+import asyncio
+import contextlib
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.models.site_visit import SiteVisit
+from app.models.site_visit_counter import SiteVisitCounter
+from app.services.task_health import record_failure, record_success
+
+logger = logging.getLogger("fizicamd.visits")
+
+# Visits wait here until the flush loop writes them in batches.
+# Drop policy: once VISIT_BUFFER_SIZE visits are waiting, new visits are discarded
+# (and counted) rather than older ones, so a database outage loses the newest hits
+# instead of the ones already accepted.
+_pending: deque[dict] = deque()
+_pending_lock = threading.Lock()
+_dropped = 0
+# Set when a full batch is waiting; only touched from the event loop.
+_flush_requested = asyncio.Event()
+
+TOTAL_COUNTER = "total"
+# (time.monotonic() when read, stored total)
+_cached_total: tuple[float, int] | None = None
+
+
+# Client clocks are only trusted this far back; anything else gets the server time.
+MAX_CLIENT_CLOCK_AGE = timedelta(hours=24)
+
+
+def visit_time(client_time: datetime | None, now: datetime) -> datetime:
+    if client_time is None:
+        return now
+    if client_time.tzinfo is None:
+        client_time = client_time.replace(tzinfo=timezone.utc)
+    if client_time > now or now - client_time > MAX_CLIENT_CLOCK_AGE:
+        return now
+    return client_time
+
+
+def visit_row(
+    ip_address: str | None,
+    user_agent: str | None,
+    path: str | None,
+    referrer: str | None,
+    created_at: datetime | None = None,
+) -> dict:
+    return {
+        "id": uuid.uuid4(),
+        "ip_address": ip_address,
+        "user_agent": user_agent,
+        "path": path,
+        "referrer": referrer,
+        "created_at": created_at or datetime.now(timezone.utc),
+    }
+
+
+def enqueue_visits(rows: list[dict]) -> int:
+    """Queue visits for the next flush; returns how many were accepted. Call from the event loop."""
+    global _dropped
+    with _pending_lock:
+        room = max(settings.visit_buffer_size - len(_pending), 0)
+        accepted = rows[:room]
+        _pending.extend(accepted)
+        dropped = len(rows) - len(accepted)
+        _dropped += dropped
+        waiting = len(_pending)
+    if dropped:
+        logger.warning("visit buffer full, dropped %d visits", dropped)
+    if waiting >= settings.visit_flush_batch:
+        _flush_requested.set()
+    return len(accepted)
+
+
+def pending_visits() -> int:
+    return len(_pending)
+
+
+def dropped_visits() -> int:
+    return _dropped
+
+
+def flush_visits(limit: int | None = None) -> int:
+    """Write up to limit queued visits (all of them without a limit) with one multi-row INSERT."""
+    with _pending_lock:
+        count = len(_pending) if limit is None else min(limit, len(_pending))
+        batch = [_pending.popleft() for _ in range(count)]
+    if not batch:
+        return 0
+    db = SessionLocal()
+    try:
+        db.execute(insert(SiteVisit), batch)
+        # Same transaction as the rows, so the total never drifts from the table.
+        db.execute(
+            pg_insert(SiteVisitCounter)
+            .values(name=TOTAL_COUNTER, value=len(batch))
+            .on_conflict_do_update(
+                index_elements=[SiteVisitCounter.name],
+                set_={"value": SiteVisitCounter.value + len(batch)},
+            )
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        with _pending_lock:
+            # Put the batch back in front; the buffer may briefly exceed its bound.
+            _pending.extendleft(reversed(batch))
+        raise
+    finally:
+        db.close()
+    return len(batch)
+
+
+def visit_total(db: Session) -> int:
+    """Visits ever recorded: the counter row, cached for VISIT_COUNT_CACHE_SECONDS, plus this worker's queue."""
+    global _cached_total
+    now = time.monotonic()
+    cached = _cached_total
+    if cached is None or now - cached[0] >= settings.visit_count_cache_seconds:
+        stored = db.execute(select(SiteVisitCounter.value).where(SiteVisitCounter.name == TOTAL_COUNTER)).scalar()
+        cached = _cached_total = (now, stored or 0)
+    return cached[1] + pending_visits()
+
+
+async def visit_flush_loop():
+    """Flush every VISIT_FLUSH_INTERVAL_MS, or as soon as VISIT_FLUSH_BATCH visits are waiting."""
+    batch = settings.visit_flush_batch
+    while True:
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(_flush_requested.wait(), settings.visit_flush_interval_ms / 1000)
+        _flush_requested.clear()
+        try:
+            while await asyncio.to_thread(flush_visits, batch) == batch:
+                pass
+            record_success("visit_flush")
+        except Exception:
+            logger.exception("visit flush error")
+            record_failure("visit_flush")
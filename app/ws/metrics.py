@@ -1,30 +1,118 @@
 import asyncio
-from typing import Set
+import contextlib
+import json
+from typing import Dict, List, Set
 from fastapi import WebSocket
 
+from app.ws.metrics_protocol import FrameEncoder, MetricsSubscription
+
+# Frames waiting per client; a client this far behind is dropped instead of slowing the rest.
+SEND_QUEUE_SIZE = 16
+SEND_TIMEOUT_SECONDS = 5.0
+# Close code for "try again later".
+CLOSE_TOO_SLOW = 1013
+
+
+def _encode(payload: dict) -> str:
+    # Same encoding as WebSocket.send_json.
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+
+class _Subscriber:
+    def __init__(self, ws: WebSocket, compact: bool) -> None:
+        self.ws = ws
+        self.queue: asyncio.Queue[str | bytes] = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.sender: asyncio.Task | None = None
+        # Compact clients get nothing until they subscribe.
+        self.compact = compact
+        self.encoder: FrameEncoder | None = None
+
 
 class MetricsSocketManager:
     def __init__(self) -> None:
-        self._connections: Set[WebSocket] = set()
-        self._lock = asyncio.Lock()
+        # Only touched from the event loop, between awaits, so no lock is needed.
+        self._subscribers: Dict[WebSocket, _Subscriber] = {}
+        self._closing: Set[asyncio.Task] = set()
+
+    @property
+    def connection_count(self) -> int:
+        return len(self._subscribers)
 
-    async def connect(self, ws: WebSocket) -> None:
-        await ws.accept()
-        async with self._lock:
-            self._connections.add(ws)
+    async def connect(self, ws: WebSocket, backlog: List[dict] | None = None, subprotocol: str | None = None) -> None:
+        await ws.accept(subprotocol=subprotocol)
+        subscriber = _Subscriber(ws, compact=subprotocol is not None)
+        try:
+            for payload in backlog or []:
+                await asyncio.wait_for(ws.send_text(_encode(payload)), SEND_TIMEOUT_SECONDS)
+        except Exception:
+            await self._close(ws)
+            return
+        subscriber.sender = asyncio.create_task(self._send_loop(subscriber))
+        self._subscribers[ws] = subscriber
 
     async def disconnect(self, ws: WebSocket) -> None:
-        async with self._lock:
-            self._connections.discard(ws)
+        subscriber = self._subscribers.pop(ws, None)
+        if subscriber and subscriber.sender and subscriber.sender is not asyncio.current_task():
+            subscriber.sender.cancel()
+
+    async def subscribe(self, ws: WebSocket, subscription: MetricsSubscription, backfill: List[dict]) -> None:
+        subscriber = self._subscribers.get(ws)
+        if subscriber is None:
+            return
+        subscriber.encoder = FrameEncoder(subscription)
+        await self._enqueue(subscriber, _encode(subscriber.encoder.schema()))
+        frame = subscriber.encoder.encode(backfill)
+        if frame:
+            await self._enqueue(subscriber, frame)
+
+    async def send_error(self, ws: WebSocket, message: str) -> None:
+        subscriber = self._subscribers.get(ws)
+        if subscriber is not None:
+            await self._enqueue(subscriber, _encode({"type": "error", "message": message}))
 
     async def broadcast(self, payload: dict) -> None:
-        async with self._lock:
-            targets = list(self._connections)
-        for ws in targets:
-            try:
-                await ws.send_json(payload)
-            except Exception:
-                await self.disconnect(ws)
+        """Queue a frame for every client without waiting on any of them."""
+        text = _encode(payload)
+        for subscriber in list(self._subscribers.values()):
+            if not subscriber.compact:
+                await self._enqueue(subscriber, text)
+            elif subscriber.encoder is not None:
+                frame = subscriber.encoder.encode([payload])
+                if frame:
+                    await self._enqueue(subscriber, frame)
+
+    async def _enqueue(self, subscriber: _Subscriber, frame: str | bytes) -> None:
+        try:
+            subscriber.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            await self._drop(subscriber)
+
+    async def _send_loop(self, subscriber: _Subscriber) -> None:
+        try:
+            while True:
+                frame = await subscriber.queue.get()
+                if isinstance(frame, bytes):
+                    send = subscriber.ws.send_bytes(frame)
+                else:
+                    send = subscriber.ws.send_text(frame)
+                await asyncio.wait_for(send, SEND_TIMEOUT_SECONDS)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Timed out or the socket is gone.
+            await self._drop(subscriber)
+
+    async def _drop(self, subscriber: _Subscriber) -> None:
+        await self.disconnect(subscriber.ws)
+        # Closing a stuck socket can hang as well; do it off the broadcast path.
+        task = asyncio.create_task(self._close(subscriber.ws))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close(ws: WebSocket) -> None:
+        with contextlib.suppress(Exception):
+            await asyncio.wait_for(ws.close(code=CLOSE_TOO_SLOW), SEND_TIMEOUT_SECONDS)
 
 
 metrics_socket_manager = MetricsSocketManager()
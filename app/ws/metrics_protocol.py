@@ -0,0 +1,144 @@
+"""Compact binary frames for /ws/metrics subscribers.
+
+A client that opens the socket with the ``fizicamd.metrics.v2`` subprotocol gets nothing
+until it sends a subscribe message::
+
+    {"type": "subscribe", "metrics": ["heapUsedBytes", "processCpuLoad"], "interval": 15, "backfill": 120}
+
+The server answers with a JSON ``schema`` text frame listing the metric order and scales,
+then binary frames. A binary frame is a sequence of records; each record is a tag byte
+(1 = keyframe, 2 = delta), the capture time in milliseconds and one value per metric.
+Times and values are zigzag varints: absolute in a keyframe, differences from the
+previous record in a delta. Loads and millisecond timings are sent as integers scaled
+by ``scale``; a missing value is sent as 0.
+"""
+
+from datetime import datetime
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+SUBPROTOCOL = "fizicamd.metrics.v2"
+
+KEYFRAME = 1
+DELTA = 2
+
+# camelCase payload key -> integer scale
+METRIC_SCALES = {
+    "heapUsedBytes": 1,
+    "heapMaxBytes": 1,
+    "systemMemoryTotalBytes": 1,
+    "systemMemoryUsedBytes": 1,
+    "diskTotalBytes": 1,
+    "diskUsedBytes": 1,
+    "processCpuLoad": 10000,
+    "systemCpuLoad": 10000,
+    "dbPoolCheckedOut": 1,
+    "dbPoolOverflow": 1,
+    "dbCheckoutWaitMs": 1000,
+    "dbQueryCount": 1,
+    "dbQueryTimeMs": 1000,
+    "eventLoopLagMs": 1000,
+    "threadpoolInUse": 1,
+    "threadpoolWaiting": 1,
+}
+
+MAX_BACKFILL = 720
+
+
+class MetricsSubscription(BaseModel):
+    type: Literal["subscribe"]
+    metrics: Optional[List[Literal[tuple(METRIC_SCALES)]]] = None
+    interval: int = Field(default=0, ge=0, le=3600)
+    backfill: int = Field(default=0, ge=0, le=MAX_BACKFILL)
+
+
+def _varint(value: int, out: bytearray):
+    value = (value << 1) ^ (value >> 63)
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def _timestamp_ms(payload: dict) -> int:
+    return int(datetime.fromisoformat(payload["capturedAt"]).timestamp() * 1000)
+
+
+class FrameEncoder:
+    """Per-connection encoder; deltas are relative to the last record it produced."""
+
+    def __init__(self, subscription: MetricsSubscription) -> None:
+        self.metrics = list(subscription.metrics or METRIC_SCALES)
+        self.interval_ms = subscription.interval * 1000
+        self._previous: list[int] | None = None
+        self._last_sent_ms: int | None = None
+
+    def schema(self) -> dict:
+        return {
+            "type": "schema",
+            "metrics": self.metrics,
+            "scale": [METRIC_SCALES[name] for name in self.metrics],
+            "interval": self.interval_ms // 1000,
+        }
+
+    def _values(self, payload: dict) -> list[int]:
+        return [round((payload.get(name) or 0) * METRIC_SCALES[name]) for name in self.metrics]
+
+    def due(self, payload: dict) -> bool:
+        if self._last_sent_ms is None:
+            return True
+        return _timestamp_ms(payload) - self._last_sent_ms >= self.interval_ms
+
+    def encode(self, payloads: list[dict]) -> bytes | None:
+        """One frame with a record per payload that is due; None if none is."""
+        out = bytearray()
+        for payload in payloads:
+            if not self.due(payload):
+                continue
+            timestamp = _timestamp_ms(payload)
+            values = self._values(payload)
+            if self._previous is None:
+                out.append(KEYFRAME)
+                _varint(timestamp, out)
+                for value in values:
+                    _varint(value, out)
+            else:
+                out.append(DELTA)
+                _varint(timestamp - self._last_sent_ms, out)
+                for value, previous in zip(values, self._previous):
+                    _varint(value - previous, out)
+            self._previous = values
+            self._last_sent_ms = timestamp
+        return bytes(out) if out else None
+
+
+def decode_frame(frame: bytes, metrics: int, state: list[int] | None = None) -> tuple[list[list[int]], list[int] | None]:
+    """Reference decoder: rows of [timestamp_ms, *values] plus the state for the next frame."""
+    rows = []
+    position = 0
+
+    def read() -> int:
+        nonlocal position
+        shift = result = 0
+        while True:
+            byte = frame[position]
+            position += 1
+            result |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                return (result >> 1) ^ -(result & 1)
+
+    while position < len(frame):
+        tag = frame[position]
+        position += 1
+        row = [read() for _ in range(metrics + 1)]
+        if tag == DELTA and state is not None:
+            row = [value + previous for value, previous in zip(row, state)]
+        rows.append(row)
+        state = row
+    return rows, state
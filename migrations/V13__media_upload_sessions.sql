@@ -0,0 +1,15 @@
+CREATE TABLE IF NOT EXISTS media_upload_sessions (
+  id UUID PRIMARY KEY,
+  owner_user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  bucket TEXT NOT NULL,
+  filename TEXT NULL,
+  content_type TEXT NOT NULL,
+  size_bytes BIGINT NOT NULL,
+  received_ranges JSONB NOT NULL DEFAULT '[]'::jsonb,
+  expires_at TIMESTAMPTZ NOT NULL,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_media_upload_sessions_owner ON media_upload_sessions(owner_user_id);
+CREATE INDEX IF NOT EXISTS idx_media_upload_sessions_expires_at ON media_upload_sessions(expires_at);
@@ -0,0 +1 @@
+CREATE INDEX IF NOT EXISTS idx_resource_entries_content ON resource_entries USING GIN (content jsonb_path_ops);
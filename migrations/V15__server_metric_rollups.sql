@@ -0,0 +1,36 @@
+CREATE TABLE IF NOT EXISTS server_metric_rollups_1m (
+  metric TEXT NOT NULL,
+  bucket_start TIMESTAMPTZ NOT NULL,
+  sample_count INT NOT NULL,
+  min_value DOUBLE PRECISION NULL,
+  avg_value DOUBLE PRECISION NULL,
+  max_value DOUBLE PRECISION NULL,
+  p95_value DOUBLE PRECISION NULL,
+  PRIMARY KEY (metric, bucket_start)
+);
+
+CREATE TABLE IF NOT EXISTS server_metric_rollups_1h (
+  metric TEXT NOT NULL,
+  bucket_start TIMESTAMPTZ NOT NULL,
+  sample_count INT NOT NULL,
+  min_value DOUBLE PRECISION NULL,
+  avg_value DOUBLE PRECISION NULL,
+  max_value DOUBLE PRECISION NULL,
+  p95_value DOUBLE PRECISION NULL,
+  PRIMARY KEY (metric, bucket_start)
+);
+
+CREATE TABLE IF NOT EXISTS server_metric_rollups_1d (
+  metric TEXT NOT NULL,
+  bucket_start TIMESTAMPTZ NOT NULL,
+  sample_count INT NOT NULL,
+  min_value DOUBLE PRECISION NULL,
+  avg_value DOUBLE PRECISION NULL,
+  max_value DOUBLE PRECISION NULL,
+  p95_value DOUBLE PRECISION NULL,
+  PRIMARY KEY (metric, bucket_start)
+);
+
+CREATE INDEX IF NOT EXISTS idx_server_metric_rollups_1m_bucket ON server_metric_rollups_1m (bucket_start);
+CREATE INDEX IF NOT EXISTS idx_server_metric_rollups_1h_bucket ON server_metric_rollups_1h (bucket_start);
+CREATE INDEX IF NOT EXISTS idx_server_metric_rollups_1d_bucket ON server_metric_rollups_1d (bucket_start);
@@ -0,0 +1,6 @@
+ALTER TABLE server_metric_samples
+  ADD COLUMN IF NOT EXISTS db_pool_checked_out BIGINT NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS db_pool_overflow BIGINT NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS db_checkout_wait_ms DOUBLE PRECISION,
+  ADD COLUMN IF NOT EXISTS db_query_count BIGINT NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS db_query_time_ms DOUBLE PRECISION;
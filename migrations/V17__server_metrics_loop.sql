@@ -0,0 +1,4 @@
+ALTER TABLE server_metric_samples
+  ADD COLUMN IF NOT EXISTS event_loop_lag_ms DOUBLE PRECISION,
+  ADD COLUMN IF NOT EXISTS threadpool_in_use BIGINT NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS threadpool_waiting BIGINT NOT NULL DEFAULT 0;
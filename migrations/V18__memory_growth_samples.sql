@@ -0,0 +1,13 @@
+CREATE TABLE IF NOT EXISTS memory_growth_samples (
+  id UUID PRIMARY KEY,
+  captured_at TIMESTAMPTZ NOT NULL,
+  pid INT NOT NULL,
+  filename TEXT NOT NULL,
+  lineno INT NOT NULL,
+  size_bytes BIGINT NOT NULL,
+  size_diff_bytes BIGINT NOT NULL,
+  count INT NOT NULL,
+  count_diff INT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_memory_growth_samples_captured_at ON memory_growth_samples (captured_at);
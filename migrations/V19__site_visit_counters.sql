@@ -0,0 +1,9 @@
+CREATE TABLE IF NOT EXISTS site_visit_counters (
+  name TEXT PRIMARY KEY,
+  value BIGINT NOT NULL DEFAULT 0
+);
+
+-- Last full count; from here on the visit writer keeps the total up to date.
+INSERT INTO site_visit_counters (name, value)
+SELECT 'total', count(*) FROM site_visits
+ON CONFLICT (name) DO NOTHING;
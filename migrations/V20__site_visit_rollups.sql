@@ -0,0 +1,20 @@
+CREATE TABLE IF NOT EXISTS site_visit_daily (
+  day DATE PRIMARY KEY,
+  views BIGINT NOT NULL,
+  visitors_hll BYTEA NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS site_visit_daily_paths (
+  day DATE NOT NULL,
+  path TEXT NOT NULL,
+  views BIGINT NOT NULL,
+  visitors_hll BYTEA NOT NULL,
+  PRIMARY KEY (day, path)
+);
+
+CREATE TABLE IF NOT EXISTS site_visit_daily_referrers (
+  day DATE NOT NULL,
+  referrer_host TEXT NOT NULL,
+  views BIGINT NOT NULL,
+  PRIMARY KEY (day, referrer_host)
+);
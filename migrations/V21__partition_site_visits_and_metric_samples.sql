@@ -0,0 +1,88 @@
+-- Creates the range partitions of parent covering [from_ts, to_ts), one per unit
+-- ('month' or 'day', UTC), named parent_pYYYYMM or parent_pYYYYMMDD. Existing ones are kept.
+CREATE OR REPLACE FUNCTION ensure_range_partitions(parent TEXT, unit TEXT, from_ts TIMESTAMPTZ, to_ts TIMESTAMPTZ)
+RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+  step INTERVAL := ('1 ' || unit)::INTERVAL;
+  suffix TEXT := CASE unit WHEN 'month' THEN 'YYYYMM' ELSE 'YYYYMMDD' END;
+  period TIMESTAMP := date_trunc(unit, from_ts AT TIME ZONE 'UTC');
+  partition_name TEXT;
+  created INT := 0;
+BEGIN
+  WHILE period < to_ts AT TIME ZONE 'UTC' LOOP
+    partition_name := parent || '_p' || to_char(period, suffix);
+    IF to_regclass(partition_name) IS NULL THEN
+      EXECUTE format(
+        'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, parent, period AT TIME ZONE 'UTC', (period + step) AT TIME ZONE 'UTC'
+      );
+      created := created + 1;
+    END IF;
+    period := period + step;
+  END LOOP;
+  RETURN created;
+END
+$$;
+
+-- site_visits: monthly partitions. Skipped once site_visits is partitioned (relkind 'p'),
+-- so the file can be re-run.
+DO $$
+BEGIN
+  IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('site_visits')) = 'r' THEN
+    ALTER TABLE site_visits RENAME TO site_visits_unpartitioned;
+    ALTER TABLE site_visits_unpartitioned RENAME CONSTRAINT site_visits_pkey TO site_visits_unpartitioned_pkey;
+    DROP INDEX IF EXISTS idx_site_visits_created_at;
+
+    CREATE TABLE site_visits (
+      LIKE site_visits_unpartitioned INCLUDING DEFAULTS,
+      PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at);
+
+    CREATE INDEX idx_site_visits_created_at ON site_visits (created_at);
+
+    -- Rows outside every monthly partition (a skewed clock) land here instead of failing.
+    CREATE TABLE site_visits_default PARTITION OF site_visits DEFAULT;
+
+    PERFORM ensure_range_partitions(
+      'site_visits', 'month',
+      coalesce((SELECT min(created_at) FROM site_visits_unpartitioned), now()),
+      now() + INTERVAL '3 months'
+    );
+
+    INSERT INTO site_visits SELECT * FROM site_visits_unpartitioned;
+    DROP TABLE site_visits_unpartitioned;
+  END IF;
+END
+$$;
+
+-- server_metric_samples: daily partitions, raw samples are only kept for days
+DO $$
+BEGIN
+  IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('server_metric_samples')) = 'r' THEN
+    ALTER TABLE server_metric_samples RENAME TO server_metric_samples_unpartitioned;
+    ALTER TABLE server_metric_samples_unpartitioned RENAME CONSTRAINT server_metric_samples_pkey TO server_metric_samples_unpartitioned_pkey;
+    DROP INDEX IF EXISTS idx_server_metric_samples_captured_at;
+
+    CREATE TABLE server_metric_samples (
+      LIKE server_metric_samples_unpartitioned INCLUDING DEFAULTS,
+      PRIMARY KEY (id, captured_at)
+    ) PARTITION BY RANGE (captured_at);
+
+    CREATE INDEX idx_server_metric_samples_captured_at ON server_metric_samples (captured_at DESC);
+
+    CREATE TABLE server_metric_samples_default PARTITION OF server_metric_samples DEFAULT;
+
+    -- Samples older than a month are past any sensible retention; they go to the default
+    -- partition, which retention empties with plain DELETEs.
+    PERFORM ensure_range_partitions(
+      'server_metric_samples', 'day',
+      greatest(coalesce((SELECT min(captured_at) FROM server_metric_samples_unpartitioned), now()), now() - INTERVAL '31 days'),
+      now() + INTERVAL '8 days'
+    );
+
+    INSERT INTO server_metric_samples SELECT * FROM server_metric_samples_unpartitioned;
+    DROP TABLE server_metric_samples_unpartitioned;
+  END IF;
+END
+$$;
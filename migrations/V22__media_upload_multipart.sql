@@ -0,0 +1,4 @@
+-- Sessions on object storage map onto an S3 multipart upload; parts holds part number -> ETag.
+ALTER TABLE media_upload_sessions
+  ADD COLUMN IF NOT EXISTS multipart_upload_id TEXT NULL,
+  ADD COLUMN IF NOT EXISTS parts JSONB NOT NULL DEFAULT '{}'::jsonb;
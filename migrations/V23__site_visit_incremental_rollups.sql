@@ -0,0 +1,14 @@
+-- When each visit reached the database, so the rollup job can fold only what arrived
+-- since its last run; created_at may be a client timestamp up to a day old.
+ALTER TABLE site_visits ADD COLUMN IF NOT EXISTS ingested_at TIMESTAMPTZ NOT NULL DEFAULT now();
+CREATE INDEX IF NOT EXISTS idx_site_visits_ingested_at ON site_visits (ingested_at);
+
+-- Single row: visits ingested before folded_until are in the daily tables. NULL until
+-- the first run, which rebuilds the days still in site_visits.
+CREATE TABLE IF NOT EXISTS site_visit_rollup_state (
+  id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+  folded_until TIMESTAMPTZ
+);
+
+INSERT INTO site_visit_rollup_state (id, folded_until) VALUES (TRUE, NULL)
+ON CONFLICT (id) DO NOTHING;
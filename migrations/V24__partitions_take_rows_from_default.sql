@@ -0,0 +1,50 @@
+-- Same as V21, but a new partition also takes over the rows its range already has in
+-- parent_default (e.g. after downtime longer than the horizon created ahead, or a skewed
+-- clock). Postgres refuses to create a partition while the default holds rows of its range,
+-- so the default is detached, emptied of that range into the new partition and reattached.
+CREATE OR REPLACE FUNCTION ensure_range_partitions(parent TEXT, unit TEXT, from_ts TIMESTAMPTZ, to_ts TIMESTAMPTZ)
+RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+  step INTERVAL := ('1 ' || unit)::INTERVAL;
+  suffix TEXT := CASE unit WHEN 'month' THEN 'YYYYMM' ELSE 'YYYYMMDD' END;
+  period TIMESTAMP := date_trunc(unit, from_ts AT TIME ZONE 'UTC');
+  default_name TEXT := parent || '_default';
+  key_column TEXT := substring(pg_get_partkeydef(parent::regclass) FROM '^RANGE \((\w+)\)$');
+  partition_name TEXT;
+  lower_bound TIMESTAMPTZ;
+  upper_bound TIMESTAMPTZ;
+  has_rows BOOLEAN;
+  created INT := 0;
+BEGIN
+  WHILE period < to_ts AT TIME ZONE 'UTC' LOOP
+    partition_name := parent || '_p' || to_char(period, suffix);
+    lower_bound := period AT TIME ZONE 'UTC';
+    upper_bound := (period + step) AT TIME ZONE 'UTC';
+    IF to_regclass(partition_name) IS NULL THEN
+      has_rows := FALSE;
+      IF to_regclass(default_name) IS NOT NULL THEN
+        EXECUTE format('SELECT EXISTS (SELECT 1 FROM %I WHERE %I >= $1 AND %I < $2)', default_name, key_column, key_column)
+          INTO has_rows USING lower_bound, upper_bound;
+      END IF;
+      IF has_rows THEN
+        EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', parent, default_name);
+      END IF;
+      EXECUTE format(
+        'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, parent, lower_bound, upper_bound
+      );
+      IF has_rows THEN
+        EXECUTE format(
+          'WITH moved AS (DELETE FROM %I WHERE %I >= $1 AND %I < $2 RETURNING *) INSERT INTO %I SELECT * FROM moved',
+          default_name, key_column, key_column, partition_name
+        ) USING lower_bound, upper_bound;
+        EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I DEFAULT', parent, default_name);
+      END IF;
+      created := created + 1;
+    END IF;
+    period := period + step;
+  END LOOP;
+  RETURN created;
+END
+$$;
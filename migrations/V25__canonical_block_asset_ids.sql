@@ -0,0 +1,20 @@
+-- Media blocks now store assetId as a lowercase hyphenated UUID, which the media GC
+-- matches as an exact JSON string. Rewrite references saved as sent by older clients.
+UPDATE resource_entries
+SET content = (
+  SELECT jsonb_agg(
+    CASE
+      WHEN block->>'assetId' ~ '^\{?[0-9A-Fa-f]{8}-?([0-9A-Fa-f]{4}-?){3}[0-9A-Fa-f]{12}\}?$'
+        THEN jsonb_set(block, '{assetId}', to_jsonb((block->>'assetId')::uuid::text))
+      ELSE block
+    END
+    ORDER BY position
+  )
+  FROM jsonb_array_elements(content) WITH ORDINALITY AS blocks(block, position)
+)
+WHERE jsonb_typeof(content) = 'array'
+  AND EXISTS (
+    SELECT 1 FROM jsonb_array_elements(content) AS blocks(block)
+    WHERE block->>'assetId' ~ '^\{?[0-9A-Fa-f]{8}-?([0-9A-Fa-f]{4}-?){3}[0-9A-Fa-f]{12}\}?$'
+      AND block->>'assetId' <> (block->>'assetId')::uuid::text
+  );
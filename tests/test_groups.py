@@ -1,6 +1,9 @@
 import uuid
 from datetime import datetime, timezone
 
+from sqlalchemy import event
+
+from app.core.db import engine
 from app.core.security import create_access_token
 from app.models.group import Group
 from app.models.role import Role
@@ -52,3 +55,42 @@ def test_admin_group_flow(client, db_session):
     assert get_group.status_code == 200
     data = get_group.json()
     assert data["name"] == group_name
+
+
+def test_my_groups_summary_counts_members_in_one_query(client, db_session):
+    admin, admin_token = create_user_with_role(db_session, "ADMIN")
+    teacher, teacher_token = create_user_with_role(db_session, "TEACHER")
+    students = [create_user_with_role(db_session, "STUDENT")[0] for _ in range(3)]
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+
+    group_name = f"Group {uuid.uuid4().hex}"
+    client.post("/api/admin/groups", json={"name": group_name}, headers=admin_headers)
+    group = db_session.query(Group).filter(Group.name == group_name).first()
+    for user, role in [(teacher, "TEACHER"), *[(student, "STUDENT") for student in students]]:
+        client.post(
+            f"/api/admin/groups/{group.id}/members",
+            json={"userId": str(user.id), "memberRole": role},
+            headers=admin_headers,
+        )
+
+    queries = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get(
+            "/api/teacher/groups", params={"view": "summary"}, headers={"Authorization": f"Bearer {teacher_token}"}
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+    summary = next(item for item in response.json() if item["id"] == str(group.id))
+    assert summary["myRole"] == "TEACHER"
+    assert (summary["memberCount"], summary["teacherCount"], summary["studentCount"]) == (4, 1, 3)
+    assert "members" not in summary
+    assert sum("FROM groups" in statement for statement in queries) == 1
+
+    full = client.get("/api/teacher/groups", headers={"Authorization": f"Bearer {teacher_token}"}).json()
+    assert len(next(item for item in full if item["id"] == str(group.id))["members"]) == 4
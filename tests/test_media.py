@@ -0,0 +1,292 @@
+import hashlib
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.models.media_asset import MediaAsset
+from app.models.resource_entry import ResourceEntry
+from app.models.role import Role
+from app.models.user import User
+from app.models.user_role import UserRole
+from app.services.media import RESOURCES_BUCKET, reclaim_pending
+from app.services.storage import legacy_path, sharded_path
+from app.services.media_uploads import _hash_state, _hash_states, staging_path
+from app.services.media_gc import reclaim_orphan_assets, reclaim_orphan_files
+
+
+def create_user_with_role(db, role_code: str):
+    role = db.query(Role).filter(Role.code == role_code).first()
+    now = datetime.now(timezone.utc)
+    user = User(
+        id=uuid.uuid4(),
+        email=f"{role_code.lower()}_{uuid.uuid4().hex}@example.com",
+        password_hash="x",
+        status="ACTIVE",
+        is_email_verified=False,
+        created_at=now,
+        updated_at=now,
+    )
+    db.add(user)
+    db.commit()
+    if role:
+        db.add(UserRole(id=uuid.uuid4(), user_id=user.id, role_id=role.id, assigned_at=now))
+        db.commit()
+    token = create_access_token(str(user.id), user.email, [role_code])
+    return user, token
+
+
+def test_resource_upload_uses_sharded_layout(client, db_session):
+    _, token = create_user_with_role(db_session, "TEACHER")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    upload = client.post(
+        "/api/media/uploads/resource",
+        files={"file": ("notes.pdf", b"%PDF-1.4 test", "application/pdf")},
+        headers=headers,
+    )
+    assert upload.status_code == 200
+    asset_id = upload.json()["assetId"]
+
+    asset = db_session.query(MediaAsset).filter(MediaAsset.id == asset_id).first()
+    path = sharded_path(asset.bucket, asset.storage_key)
+    assert path.exists()
+    assert path.parent.name == asset.storage_key[2:4]
+
+    content = client.get(f"/api/media/assets/{asset_id}/content")
+    assert content.status_code == 200
+    assert content.content == b"%PDF-1.4 test"
+
+
+def test_legacy_flat_file_is_still_served(client, db_session):
+    _, token = create_user_with_role(db_session, "TEACHER")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    upload = client.post(
+        "/api/media/uploads/resource",
+        files={"file": ("old.txt", b"legacy", "text/plain")},
+        headers=headers,
+    )
+    asset_id = upload.json()["assetId"]
+    asset = db_session.query(MediaAsset).filter(MediaAsset.id == asset_id).first()
+    sharded_path(asset.bucket, asset.storage_key).replace(legacy_path(asset.bucket, asset.storage_key))
+
+    content = client.get(f"/api/media/assets/{asset_id}/content")
+    assert content.status_code == 200
+    assert content.content == b"legacy"
+
+
+def test_content_is_offloaded_to_proxy(client, db_session, monkeypatch):
+    _, token = create_user_with_role(db_session, "TEACHER")
+    headers = {"Authorization": f"Bearer {token}"}
+    asset_id = client.post(
+        "/api/media/uploads/resource",
+        files={"file": ("notes.pdf", b"%PDF-1.4", "application/pdf")},
+        headers=headers,
+    ).json()["assetId"]
+    asset = db_session.query(MediaAsset).filter(MediaAsset.id == asset_id).first()
+    key = asset.storage_key
+
+    monkeypatch.setattr(settings, "media_serve_mode", "x-accel-redirect")
+    content = client.get(f"/api/media/assets/{asset_id}/content")
+    assert content.status_code == 200
+    assert content.headers["X-Accel-Redirect"] == f"/internal-media/resources/{key[0:2]}/{key[2:4]}/{key}"
+    assert content.headers["Content-Type"] == "application/pdf"
+    assert content.content == b""
+
+
+def test_chunked_upload_out_of_order(client, db_session):
+    _, token = create_user_with_role(db_session, "TEACHER")
+    headers = {"Authorization": f"Bearer {token}"}
+    data = b"0123456789abcdef"
+
+    created = client.post(
+        "/api/media/uploads/resource/sessions",
+        json={"filename": "kvant.pdf", "contentType": "application/pdf", "sizeBytes": len(data)},
+        headers=headers,
+    )
+    assert created.status_code == 200
+    upload_id = created.json()["uploadId"]
+
+    second = client.put(
+        f"/api/media/uploads/sessions/{upload_id}/chunks",
+        params={"offset": 8},
+        files={"file": ("chunk", data[8:], "application/octet-stream")},
+        headers=headers,
+    )
+    assert second.status_code == 200
+    assert second.json()["receivedRanges"] == [[8, 16]]
+
+    early = client.post(f"/api/media/uploads/sessions/{upload_id}/finalize", json={}, headers=headers)
+    assert early.status_code == 400
+
+    first = client.put(
+        f"/api/media/uploads/sessions/{upload_id}/chunks",
+        params={"offset": 0},
+        files={"file": ("chunk", data[:8], "application/octet-stream")},
+        headers=headers,
+    )
+    assert first.json()["receivedBytes"] == len(data)
+
+    finalized = client.post(
+        f"/api/media/uploads/sessions/{upload_id}/finalize",
+        json={"sha256": hashlib.sha256(data).hexdigest()},
+        headers=headers,
+    )
+    assert finalized.status_code == 200
+    asset_id = finalized.json()["assetId"]
+
+    asset = db_session.query(MediaAsset).filter(MediaAsset.id == asset_id).first()
+    assert asset.size_bytes == len(data)
+    assert asset.type == "DOCUMENT"
+
+    content = client.get(f"/api/media/assets/{asset_id}/content")
+    assert content.content == data
+
+
+def test_received_chunk_bytes_cannot_change(client, db_session, monkeypatch):
+    monkeypatch.setattr(settings, "media_upload_chunk_max_bytes", 8)
+    _, token = create_user_with_role(db_session, "TEACHER")
+    headers = {"Authorization": f"Bearer {token}"}
+    data = b"0123456789abcdef"
+    upload_id = client.post(
+        "/api/media/uploads/resource/sessions",
+        json={"filename": "kvant.pdf", "contentType": "application/pdf", "sizeBytes": len(data)},
+        headers=headers,
+    ).json()["uploadId"]
+
+    def put(offset, chunk):
+        return client.put(
+            f"/api/media/uploads/sessions/{upload_id}/chunks",
+            params={"offset": offset},
+            files={"file": ("chunk", chunk, "application/octet-stream")},
+            headers=headers,
+        )
+
+    assert put(0, data[:8]).status_code == 200
+    # Oversize chunks are refused before any byte reaches the staging file.
+    assert put(8, data[8:] + b"X").status_code == 400
+    assert staging_path(uuid.UUID(upload_id)).read_bytes()[8:] == bytes(8)
+    # A retry with the same bytes is fine; different bytes over the hashed prefix are not.
+    assert put(0, data[:8]).status_code == 200
+    assert put(4, b"XXXXabcd").status_code == 400
+    assert put(4, data[4:12]).status_code == 200
+    assert put(12, data[12:]).status_code == 200
+
+    finalized = client.post(
+        f"/api/media/uploads/sessions/{upload_id}/finalize",
+        json={"sha256": hashlib.sha256(data).hexdigest()},
+        headers=headers,
+    )
+    assert finalized.status_code == 200
+
+
+def test_stale_hash_states_are_evicted():
+    stale_id, fresh_id = uuid.uuid4(), uuid.uuid4()
+    _hash_state(stale_id).touched -= settings.media_upload_session_ttl_seconds + 1
+    _hash_state(fresh_id)
+    assert stale_id not in _hash_states
+    assert fresh_id in _hash_states
+    _hash_states.pop(fresh_id)
+
+
+def test_orphan_gc_reclaims_unreferenced_assets(client, db_session):
+    user, token = create_user_with_role(db_session, "TEACHER")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    orphan = client.post(
+        "/api/media/uploads/resource",
+        files={"file": ("draft.png", b"orphan", "image/png")},
+        headers=headers,
+    ).json()["assetId"]
+    avatar = client.post(
+        "/api/media/uploads/avatar",
+        files={"file": ("me.png", b"avatar", "image/png")},
+        headers=headers,
+    ).json()["assetId"]
+
+    old = datetime.now(timezone.utc) - timedelta(days=2)
+    db_session.query(MediaAsset).filter(MediaAsset.id.in_([orphan, avatar])).update(
+        {MediaAsset.created_at: old}, synchronize_session=False
+    )
+    db_session.commit()
+    orphan_asset = db_session.query(MediaAsset).filter(MediaAsset.id == orphan).first()
+    orphan_path = sharded_path(orphan_asset.bucket, orphan_asset.storage_key)
+
+    reclaim_orphan_assets(db_session, datetime.now(timezone.utc) - timedelta(days=1), 100)
+    reclaim_pending()
+
+    db_session.expire_all()
+    assert db_session.query(MediaAsset).filter(MediaAsset.id == orphan).first() is None
+    assert db_session.query(MediaAsset).filter(MediaAsset.id == avatar).first() is not None
+    assert not orphan_path.exists()
+
+
+def test_block_references_are_canonical_and_keep_assets(client, db_session):
+    _, token = create_user_with_role(db_session, "TEACHER")
+    headers = {"Authorization": f"Bearer {token}"}
+    category_code = client.post(
+        "/api/teacher/resource-categories", json={"label": "GC Category", "group": "GC Group"}, headers=headers
+    ).json()["code"]
+    asset_id = client.post(
+        "/api/media/uploads/resource",
+        files={"file": ("fig.png", b"figure", "image/png")},
+        headers=headers,
+    ).json()["assetId"]
+
+    def create(block_asset_id):
+        payload = {
+            "categoryCode": category_code,
+            "title": "Figuri",
+            "summary": "Rezumat",
+            "blocks": [{"type": "IMAGE", "assetId": block_asset_id}],
+            "status": "DRAFT",
+        }
+        return client.post("/api/teacher/resources", json=payload, headers=headers)
+
+    created = create(uuid.UUID(asset_id).hex.upper())
+    assert created.status_code == 200
+    entry = db_session.query(ResourceEntry).filter(ResourceEntry.id == created.json()["id"]).one()
+    assert entry.content[0]["assetId"] == asset_id
+    assert create(str(uuid.uuid4())).status_code == 400
+    assert create("not-a-uuid").status_code == 400
+
+    db_session.query(MediaAsset).filter(MediaAsset.id == asset_id).update(
+        {MediaAsset.created_at: datetime.now(timezone.utc) - timedelta(days=2)}, synchronize_session=False
+    )
+    db_session.commit()
+    reclaim_orphan_assets(db_session, datetime.now(timezone.utc) - timedelta(days=1), 100)
+    assert db_session.query(MediaAsset).filter(MediaAsset.id == asset_id).first() is not None
+
+
+def test_orphan_gc_reclaims_files_without_rows(db_session):
+    stray = sharded_path(RESOURCES_BUCKET, str(uuid.uuid4()))
+    stray.parent.mkdir(parents=True, exist_ok=True)
+    stray.write_bytes(b"stray")
+    past = (datetime.now(timezone.utc) - timedelta(days=2)).timestamp()
+    os.utime(stray, (past, past))
+
+    reclaim_orphan_files(db_session, RESOURCES_BUCKET, datetime.now(timezone.utc) - timedelta(days=1), 100)
+
+    assert not stray.exists()
+
+
+def test_replacing_avatar_removes_previous_asset(client, db_session):
+    _, token = create_user_with_role(db_session, "STUDENT")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    first = client.post(
+        "/api/media/uploads/avatar",
+        files={"file": ("a.png", b"first", "image/png")},
+        headers=headers,
+    ).json()["assetId"]
+    second = client.post(
+        "/api/media/uploads/avatar",
+        files={"file": ("b.png", b"second", "image/png")},
+        headers=headers,
+    )
+    assert second.status_code == 200
+
+    assert db_session.query(MediaAsset).filter(MediaAsset.id == first).first() is None
+    assert client.get(f"/api/media/assets/{second.json()['assetId']}/content").content == b"second"
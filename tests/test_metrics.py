@@ -0,0 +1,592 @@
+import asyncio
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import psycopg
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.db_instrumentation import take_pool_stats
+from app.core.security import create_access_token
+from app.main import app
+from app.models.memory_growth_sample import MemoryGrowthSample
+from app.models.role import Role
+from app.models.user import User
+from app.models.user_role import UserRole
+from app.services import profiler
+from app.services.loop_monitor import loop_monitor, take_loop_stats
+from app.services.memory_diagnostics import _growth_step, stop_tracing, top_growers
+from app.services.metrics import SampleRing, buffer_sample, capture_metrics, flush_samples, recent_samples, record_sample, sample_payload
+from app.services.metrics_leader import (
+    NOTIFY_CHANNEL,
+    _sample_and_publish,
+    handle_notification,
+    listener_dsn,
+    publish_sample,
+    try_acquire_leadership,
+)
+from app.services.metrics_rollups import rollup_tier
+from app.services.openmetrics import collect_snapshot
+from app.services.request_stats import _profile_lock, statement_shape
+from app.services.route_metrics import LATENCY_BUCKETS_MS, route_stats
+from app.ws.metrics import CLOSE_TOO_SLOW, SEND_QUEUE_SIZE, MetricsSocketManager
+from app.ws.metrics_protocol import SUBPROTOCOL, FrameEncoder, MetricsSubscription, decode_frame
+
+
+def create_user_with_role(db, role_code: str):
+    role = db.query(Role).filter(Role.code == role_code).first()
+    now = datetime.now(timezone.utc)
+    user = User(
+        id=uuid.uuid4(),
+        email=f"{role_code.lower()}_{uuid.uuid4().hex}@example.com",
+        password_hash="x",
+        status="ACTIVE",
+        is_email_verified=False,
+        created_at=now,
+        updated_at=now,
+    )
+    db.add(user)
+    db.commit()
+    if role:
+        db.add(UserRole(id=uuid.uuid4(), user_id=user.id, role_id=role.id, assigned_at=now))
+        db.commit()
+    token = create_access_token(str(user.id), user.email, [role_code])
+    return user, token
+
+
+def test_buffered_samples_are_flushed_in_batches(client, db_session):
+    _, token = create_user_with_role(db_session, "ADMIN")
+    samples = [capture_metrics() for _ in range(3)]
+    for sample in samples:
+        buffer_sample(sample)
+
+    assert flush_samples() >= 3
+    assert flush_samples() == 0
+
+    history = client.get("/api/admin/metrics/history", params={"limit": 3}, headers={"Authorization": f"Bearer {token}"})
+    assert history.status_code == 200
+    captured = [item["captured_at"] for item in history.json()["items"]]
+    assert samples[-1].captured_at.isoformat() in captured
+
+
+def test_history_range_is_served_from_rollups(client, db_session):
+    _, token = create_user_with_role(db_session, "ADMIN")
+    headers = {"Authorization": f"Bearer {token}"}
+    base = datetime(2020, 1, 1, 10, 0, tzinfo=timezone.utc)
+    db_session.execute(text("DELETE FROM server_metric_samples WHERE captured_at >= :base AND captured_at < :base + interval '1 hour'"), {"base": base})
+    db_session.commit()
+    for offset, cpu in ((0, 0.1), (20, 0.3), (70, 0.5)):
+        sample = capture_metrics()
+        sample.captured_at = base + timedelta(seconds=offset)
+        sample.process_cpu_load = cpu
+        buffer_sample(sample)
+    flush_samples()
+
+    now = base + timedelta(hours=1)
+    rollup_tier(db_session, "1m", now)
+
+    response = client.get(
+        "/api/admin/metrics/history",
+        params={"from": base.isoformat(), "to": (base + timedelta(minutes=5)).isoformat(), "resolution": "1m"},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["resolution"] == "1m"
+    assert [item["captured_at"] for item in body["items"]] == [
+        base.isoformat(),
+        (base + timedelta(minutes=1)).isoformat(),
+    ]
+    cpu = [row for row in body["rollups"] if row["metric"] == "process_cpu_load"]
+    assert cpu[0]["sample_count"] == 2
+    assert abs(cpu[0]["avg"] - 0.2) < 1e-9
+    assert abs(cpu[0]["max"] - 0.3) < 1e-9
+
+    def raw(minutes: int, limit: int):
+        params = {"from": base.isoformat(), "to": (base + timedelta(minutes=minutes)).isoformat(), "resolution": "raw", "limit": limit}
+        return client.get("/api/admin/metrics/history", params=params, headers=headers).json()
+
+    limited = raw(5, 2)
+    assert limited["resolution"] == "raw"
+    assert [item["captured_at"] for item in limited["items"]] == [
+        (base + timedelta(seconds=20)).isoformat(),
+        (base + timedelta(seconds=70)).isoformat(),
+    ]
+    assert raw(24 * 60, 500)["resolution"] != "raw"
+
+
+def test_rollup_tier_skips_gaps_longer_than_one_run(db_session):
+    db_session.execute(text("DELETE FROM server_metric_rollups_1h"))
+    db_session.commit()
+    before_gap = datetime(2019, 1, 1, 10, 0, tzinfo=timezone.utc)
+    after_gap = datetime(2019, 3, 1, 10, 0, tzinfo=timezone.utc)
+    for captured_at in (before_gap, after_gap):
+        sample = capture_metrics()
+        sample.captured_at = captured_at
+        buffer_sample(sample)
+    flush_samples()
+    now = datetime(2019, 6, 1, tzinfo=timezone.utc)
+    try:
+        rollup_tier(db_session, "1h", now)
+        # The next run only sees the empty week after the first sample.
+        frontier = rollup_tier(db_session, "1h", now)
+        assert frontier >= after_gap
+        buckets = db_session.execute(
+            text("SELECT DISTINCT bucket_start FROM server_metric_rollups_1h ORDER BY 1")
+        ).scalars().all()
+        assert buckets[:2] == [before_gap, after_gap]
+    finally:
+        db_session.execute(text("DELETE FROM server_metric_samples WHERE captured_at < '2019-12-31'"))
+        db_session.execute(text("DELETE FROM server_metric_rollups_1h"))
+        db_session.commit()
+
+
+def test_recent_history_is_served_from_ring_buffer(client, db_session):
+    _, token = create_user_with_role(db_session, "ADMIN")
+    ring = SampleRing(3)
+    base = datetime.now(timezone.utc)
+    for offset in range(4):
+        sample = capture_metrics()
+        sample.captured_at = base + timedelta(seconds=offset)
+        sample.system_cpu_load = None
+        ring.append(sample)
+
+    latest = ring.latest(10)
+    assert [s.captured_at for s in latest] == [base + timedelta(seconds=n) for n in (1, 2, 3)]
+
+    partial = capture_metrics()
+    partial.captured_at = base + timedelta(seconds=4)
+    partial.db_pool_overflow = None
+    ring.append(partial)
+    assert ring.latest(1)[0].db_pool_overflow is None
+    assert ring.latest(2)[0].db_pool_overflow == latest[-1].db_pool_overflow
+    assert latest[0].system_cpu_load is None
+    assert len(ring.between(base + timedelta(seconds=2), base + timedelta(seconds=3))) == 1
+
+    sample = capture_metrics()
+    record_sample(sample)
+    history = client.get("/api/admin/metrics/history", params={"limit": 1}, headers={"Authorization": f"Bearer {token}"})
+    assert history.json()["items"][0]["captured_at"] == sample.captured_at.isoformat()
+    flush_samples()
+
+
+def test_route_latency_is_grouped_by_template(client, db_session):
+    _, token = create_user_with_role(db_session, "ADMIN")
+    headers = {"Authorization": f"Bearer {token}"}
+    client.get(f"/api/media/assets/{uuid.uuid4()}/content")
+    client.get(f"/api/media/assets/{uuid.uuid4()}/content")
+
+    response = client.get("/api/admin/metrics/routes", headers=headers)
+    assert response.status_code == 200
+    items = {(item["method"], item["route"], item["status"]): item for item in response.json()["items"]}
+    content = items[("GET", "/api/media/assets/{asset_id}/content", 404)]
+    assert content["count"] >= 2
+    assert content["p50_ms"] <= content["p99_ms"]
+    assert content["response_bytes"] > 0
+
+
+def test_unhandled_errors_are_counted_as_500():
+    def boom():
+        raise RuntimeError("boom")
+
+    app.add_api_route("/api/test/boom", boom)
+    try:
+        response = TestClient(app, raise_server_exceptions=False).get("/api/test/boom")
+    finally:
+        app.router.routes.pop()
+    assert response.status_code == 500
+    stats = dict(route_stats())
+    assert stats[("GET", "/api/test/boom", 500)].count >= 1
+
+
+def test_openmetrics_exposition_merges_worker_snapshots(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_multiproc_dir", str(tmp_path))
+    client.get("/api/public/does-not-exist")
+    other = collect_snapshot()
+    other["pid"] = 999999
+    other["routes"] = [
+        {
+            "method": "GET",
+            "route": "/api/example",
+            "status": 200,
+            "counts": [1] + [0] * len(LATENCY_BUCKETS_MS),
+            "sum_ms": 0.2,
+            "request_bytes": 0,
+            "response_bytes": 10,
+        }
+    ]
+    (tmp_path / "999999.json").write_text(json.dumps(other))
+
+    monkeypatch.setattr(settings, "metrics_scrape_token", "")
+    assert client.get("/metrics").status_code == 404
+    monkeypatch.setattr(settings, "metrics_scrape_token", "scrape")
+    assert client.get("/metrics").status_code == 403
+
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/openmetrics-text")
+    body = response.text
+    assert body.endswith("# EOF\n")
+    assert 'fizicamd_http_request_duration_seconds_count{method="GET",route="/api/example",status="200"} 1' in body
+    assert 'fizicamd_process_resident_memory_bytes{pid="999999"}' in body
+    assert "fizicamd_db_pool_connections" in body
+
+
+class _FakeSocket:
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.frames: list[str] = []
+        self.closed_with = None
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, text: str):
+        await asyncio.sleep(self.delay)
+        self.frames.append(text)
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+
+def test_broadcast_does_not_wait_for_slow_clients():
+    async def scenario():
+        manager = MetricsSocketManager()
+        fast, stuck = _FakeSocket(), _FakeSocket(delay=3600)
+        await manager.connect(fast)
+        await manager.connect(stuck)
+
+        started = time.perf_counter()
+        for index in range(SEND_QUEUE_SIZE + 2):
+            await manager.broadcast({"n": index})
+            await asyncio.sleep(0)
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(0.05)
+        return manager, fast, stuck, elapsed
+
+    manager, fast, stuck, elapsed = asyncio.run(scenario())
+    assert elapsed < 1
+    assert len(fast.frames) == SEND_QUEUE_SIZE + 2
+    assert json.loads(fast.frames[0]) == {"n": 0}
+    assert stuck.closed_with == CLOSE_TOO_SLOW
+    assert manager.connection_count == 1
+
+
+def test_subscription_streams_delta_frames(client, db_session):
+    _, token = create_user_with_role(db_session, "ADMIN")
+    base = datetime.now(timezone.utc)
+    for offset in range(3):
+        sample = capture_metrics()
+        sample.captured_at = base + timedelta(seconds=offset * 5)
+        sample.process_cpu_load = 0.25
+        record_sample(sample)
+    flush_samples()
+
+    with client.websocket_connect(f"/ws/metrics?token={token}", subprotocols=[SUBPROTOCOL]) as ws:
+        ws.send_json({"type": "subscribe", "metrics": ["heapUsedBytes", "processCpuLoad"], "interval": 10, "backfill": 3})
+        schema = ws.receive_json()
+        assert schema["metrics"] == ["heapUsedBytes", "processCpuLoad"]
+        rows, _ = decode_frame(ws.receive_bytes(), len(schema["metrics"]))
+
+        ws.send_json({"type": "subscribe", "metrics": ["bogus"]})
+        assert ws.receive_json()["type"] == "error"
+
+    # Samples 0s and 10s pass the 10s interval, the one at 5s is skipped.
+    assert [row[0] for row in rows] == [int((base + timedelta(seconds=s)).timestamp() * 1000) for s in (0, 10)]
+    assert [row[2] for row in rows] == [2500, 2500]
+
+
+def test_frame_encoder_round_trips_negative_deltas():
+    encoder = FrameEncoder(MetricsSubscription(type="subscribe", metrics=["heapUsedBytes"]))
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    payloads = [
+        {"capturedAt": (base + timedelta(seconds=n)).isoformat(), "heapUsedBytes": value}
+        for n, value in enumerate((5_000_000_000, 10, 4_000_000_000))
+    ]
+    first = encoder.encode(payloads[:1])
+    rows, state = decode_frame(first, 1)
+    rest, _ = decode_frame(encoder.encode(payloads[1:]), 1, state)
+    assert [row[1] for row in rows + rest] == [5_000_000_000, 10, 4_000_000_000]
+
+
+def test_only_one_worker_holds_metrics_leadership():
+    async def scenario():
+        first = await psycopg.AsyncConnection.connect(listener_dsn(), autocommit=True)
+        second = await psycopg.AsyncConnection.connect(listener_dsn(), autocommit=True)
+        try:
+            assert await try_acquire_leadership(first)
+            assert not await try_acquire_leadership(second)
+            await first.close()
+            # The lock goes away with the leader's backend, which exits shortly after.
+            for _ in range(50):
+                if await try_acquire_leadership(second):
+                    break
+                await asyncio.sleep(0.05)
+            else:
+                raise AssertionError("leadership was not released")
+        finally:
+            await first.close()
+            await second.close()
+
+    asyncio.run(scenario())
+
+
+def test_followers_fan_out_notified_samples():
+    async def scenario():
+        listener = await psycopg.AsyncConnection.connect(listener_dsn(), autocommit=True)
+        leader = await psycopg.AsyncConnection.connect(listener_dsn(), autocommit=True)
+        received = []
+
+        async def broadcast(payload):
+            received.append(payload)
+
+        try:
+            await listener.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            payload = sample_payload(capture_metrics())
+            await publish_sample(leader, payload)
+            async for notify in listener.notifies(timeout=2, stop_after=1):
+                await handle_notification(notify, listener.info.backend_pid, broadcast)
+        finally:
+            await listener.close()
+            await leader.close()
+        return payload, received
+
+    payload, received = asyncio.run(scenario())
+    assert received == [payload]
+    assert recent_samples(1)[0].captured_at.isoformat() == payload["capturedAt"]
+
+
+def test_followers_sample_their_own_process():
+    async def scenario():
+        broadcasts = []
+
+        async def broadcast(payload):
+            broadcasts.append(payload)
+
+        leader_payload = {**sample_payload(capture_metrics()), "processCpuLoad": 0.97, "heapUsedBytes": 1}
+        await handle_notification(
+            psycopg.Notify(NOTIFY_CHANNEL, json.dumps(leader_payload), -1), 0, broadcast
+        )
+        # Not the leader: the sample is taken but neither persisted nor published.
+        await _sample_and_publish(None, broadcast)
+        return broadcasts
+
+    broadcasts = asyncio.run(scenario())
+    assert len(broadcasts) == 1
+    assert recent_samples(1)[0].process_cpu_load == 0.97
+    process = collect_snapshot()["process"]
+    assert process["process_cpu_load"] != 0.97
+    assert "event_loop_lag_ms" in process and "threadpool_in_use" in process
+
+
+def test_samples_include_pool_and_query_stats(db_session):
+    take_pool_stats(engine)
+    for _ in range(3):
+        db_session.execute(text("SELECT 1"))
+    db_session.rollback()
+
+    sample = capture_metrics()
+    assert sample.db_query_count >= 3
+    assert sample.db_query_time_ms > 0
+    assert sample.db_checkout_wait_ms is not None
+    assert sample_payload(sample)["dbQueryCount"] == sample.db_query_count
+    assert capture_metrics().db_query_count == 0
+
+
+def test_loop_monitor_reports_lag_and_blocking_stack(caplog, monkeypatch):
+    monkeypatch.setattr(settings, "loop_lag_threshold_ms", 100)
+
+    def block_the_loop():
+        time.sleep(0.6)
+
+    async def scenario():
+        monitor = asyncio.create_task(loop_monitor())
+        await asyncio.sleep(0.3)
+        block_the_loop()
+        await asyncio.sleep(0.3)
+        monitor.cancel()
+
+    take_loop_stats()
+    with caplog.at_level("WARNING", logger="fizicamd.loop"):
+        asyncio.run(scenario())
+    stats = take_loop_stats()
+    assert stats["event_loop_lag_ms"] >= 300
+    assert any("block_the_loop" in record.getMessage() for record in caplog.records)
+
+
+def test_repeated_queries_in_one_request_are_flagged(client, db_session, caplog):
+    _, token = create_user_with_role(db_session, "ADMIN")
+    for _ in range(settings.n_plus_one_threshold):
+        create_user_with_role(db_session, "STUDENT")
+
+    with caplog.at_level("WARNING", logger="fizicamd.sql"):
+        response = client.get(
+            "/api/admin/users",
+            params={"pageSize": settings.n_plus_one_threshold},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+    assert response.status_code == 200
+    assert 'db;dur=' in response.headers["Server-Timing"]
+    assert any(
+        record.getMessage().startswith("suspected N+1 on GET /api/admin/users") for record in caplog.records
+    )
+
+
+def test_statement_shape_ignores_in_list_length():
+    short = "SELECT * FROM users WHERE id IN (%(id_1_1)s, %(id_1_2)s)"
+    long = "SELECT * FROM users\n WHERE id IN (%(id_1_1)s, %(id_1_2)s, %(id_1_3)s)"
+    assert statement_shape(short) == statement_shape(long) == "SELECT * FROM users WHERE id IN (%(id)s)"
+
+
+def test_server_timing_breakdown_is_admin_only(client, db_session):
+    _, token = create_user_with_role(db_session, "ADMIN")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.get("/api/admin/metrics/history", params={"limit": 1}, headers=headers)
+    timings = {entry.split(";")[0].strip() for entry in response.headers["Server-Timing"].split(",")}
+    assert {"deps", "auth", "endpoint", "db", "serialize", "total"} <= timings
+
+    anonymous = client.get(f"/api/media/assets/{uuid.uuid4()}/content")
+    assert "Server-Timing" not in anonymous.headers
+
+    routes = client.get("/api/admin/metrics/routes", headers=headers).json()["items"]
+    history = next(item for item in routes if item["route"] == "/api/admin/metrics/history")
+    assert history["span_avg_ms"]["auth"] > 0
+
+
+def test_sampling_profiler_returns_flame_graph(client, db_session):
+    _, token = create_user_with_role(db_session, "ADMIN")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    collapsed = client.post("/api/admin/profiler/sample", params={"seconds": 0.2, "hz": 50}, headers=headers)
+    assert collapsed.status_code == 200
+    stack, count = collapsed.text.splitlines()[0].rsplit(" ", 1)
+    assert ";" in stack and int(count) > 0
+
+    speedscope = client.post(
+        "/api/admin/profiler/sample", params={"seconds": 0.2, "hz": 50, "format": "speedscope"}, headers=headers
+    ).json()
+    assert speedscope["profiles"][0]["type"] == "sampled"
+    assert speedscope["shared"]["frames"]
+
+
+def test_admin_can_profile_a_single_request(client, db_session, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "profiles_dir", str(tmp_path))
+    _, token = create_user_with_role(db_session, "ADMIN")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.get("/api/admin/metrics/routes", headers={**headers, "X-Profile": "1"})
+    name = response.headers["X-Profile-File"]
+    assert (tmp_path / name).exists()
+    assert client.get(f"/api/admin/profiler/profiles/{name}", headers=headers).status_code == 200
+
+    assert "X-Profile-File" not in client.get("/api/public/resources", headers={"X-Profile": "1"}).headers
+
+
+def test_saved_profiles_are_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "profiles_dir", str(tmp_path))
+    monkeypatch.setattr(profiler, "MAX_SAVED_PROFILES", 2)
+    expired = tmp_path / "20000101T000000000000Z-old.prof"
+    expired.write_bytes(b"")
+    past = (datetime.now(timezone.utc) - profiler.PROFILE_MAX_AGE - timedelta(hours=1)).timestamp()
+    os.utime(expired, (past, past))
+
+    names = [profiler.save_profile(cProfile.Profile(), f"route {n}") for n in range(3)]
+    assert sorted(path.name for path in tmp_path.iterdir()) == names[1:]
+
+
+def test_concurrent_profiled_requests_profile_one_at_a_time(client, db_session, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "profiles_dir", str(tmp_path))
+    _, token = create_user_with_role(db_session, "ADMIN")
+    headers = {"Authorization": f"Bearer {token}", "X-Profile": "1"}
+
+    with _profile_lock:
+        busy = client.get("/api/admin/metrics/routes", headers=headers)
+    assert busy.status_code == 200
+    assert busy.headers["X-Profile-Skipped"] == "busy"
+    assert "X-Profile-File" not in busy.headers
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        responses = list(pool.map(lambda _: client.get("/api/admin/metrics/routes", headers=headers), range(8)))
+    assert all(response.status_code == 200 for response in responses)
+    assert all(("X-Profile-File" in response.headers) != ("X-Profile-Skipped" in response.headers) for response in responses)
+    assert any("X-Profile-File" in response.headers for response in responses)
+    assert "X-Profile-File" in client.get("/api/admin/metrics/routes", headers=headers).headers
+
+
+_leak = []
+
+
+def _allocate(count: int):
+    _leak.extend(bytearray(1024) for _ in range(count))
+
+
+def test_tracemalloc_snapshots_diff_top_growers(client, db_session):
+    _, token = create_user_with_role(db_session, "ADMIN")
+    headers = {"Authorization": f"Bearer {token}"}
+    try:
+        assert client.post("/api/admin/memory/snapshots/before", headers=headers).status_code == 400
+        assert client.post("/api/admin/memory/tracemalloc/start", headers=headers).json()["tracing"] is True
+        assert client.post("/api/admin/memory/snapshots/before", headers=headers).status_code == 200
+        _allocate(2000)
+        client.post("/api/admin/memory/snapshots/after", headers=headers)
+
+        items = client.get("/api/admin/memory/diff", params={"base": "before", "target": "after"}, headers=headers).json()["items"]
+        assert items[0]["filename"].endswith("test_metrics.py")
+        assert items[0]["size_diff_bytes"] >= 2000 * 1024
+
+        status = client.get("/api/admin/memory/tracemalloc", headers=headers).json()
+        assert [snapshot["name"] for snapshot in status["snapshots"]] == ["before", "after"]
+        assert client.get("/api/admin/memory/diff", params={"base": "missing"}, headers=headers).status_code == 404
+    finally:
+        stop_tracing()
+        _leak.clear()
+
+
+def test_traceback_growers_point_at_the_allocating_line():
+    tracemalloc.start(3)
+    try:
+        base = tracemalloc.take_snapshot()
+        _allocate(500)
+        items = top_growers(base, tracemalloc.take_snapshot(), "traceback", 5)
+    finally:
+        stop_tracing()
+        _leak.clear()
+    allocating_line = _allocate.__code__.co_firstlineno + 1
+    top = next(item for item in items if item["filename"].endswith("test_metrics.py"))
+    assert top["lineno"] == allocating_line
+    assert top["traceback"][-1].endswith(f"test_metrics.py:{allocating_line}")
+
+
+def test_scheduled_growth_is_recorded(db_session):
+    tracemalloc.start()
+    try:
+        previous = tracemalloc.take_snapshot()
+        _allocate(500)
+        _growth_step(previous)
+    finally:
+        stop_tracing()
+        _leak.clear()
+    rows = db_session.query(MemoryGrowthSample).filter(MemoryGrowthSample.filename.like("%test_metrics.py")).all()
+    assert rows and max(row.size_diff_bytes for row in rows) >= 500 * 1024
+    db_session.query(MemoryGrowthSample).delete()
+    db_session.commit()
+
+
+def test_growth_accepts_naive_bounds(client, db_session):
+    _, token = create_user_with_role(db_session, "ADMIN")
+    headers = {"Authorization": f"Bearer {token}"}
+    naive = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    response = client.get("/api/admin/memory/growth", params={"from": (naive - timedelta(hours=1)).isoformat()}, headers=headers)
+    assert response.status_code == 200
+    response = client.get("/api/admin/memory/growth", params={"to": naive.isoformat()}, headers=headers)
+    assert response.status_code == 200
@@ -0,0 +1,190 @@
+import hashlib
+import uuid
+from datetime import datetime, timezone
+
+import boto3
+import pytest
+import requests
+from moto import mock_aws
+
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.models.media_asset import MediaAsset
+from app.models.role import Role
+from app.models.user import User
+from app.models.user_role import UserRole
+from app.services import storage
+from app.services.media_uploads import S3_MIN_PART_BYTES, staging_path
+from app.services.storage import MultipartStorage, S3StorageBackend
+
+
+def create_user_with_role(db, role_code: str):
+    role = db.query(Role).filter(Role.code == role_code).first()
+    now = datetime.now(timezone.utc)
+    user = User(
+        id=uuid.uuid4(),
+        email=f"{role_code.lower()}_{uuid.uuid4().hex}@example.com",
+        password_hash="x",
+        status="ACTIVE",
+        is_email_verified=False,
+        created_at=now,
+        updated_at=now,
+    )
+    db.add(user)
+    db.commit()
+    if role:
+        db.add(UserRole(id=uuid.uuid4(), user_id=user.id, role_id=role.id, assigned_at=now))
+        db.commit()
+    token = create_access_token(str(user.id), user.email, [role_code])
+    return user, token
+
+
+@pytest.fixture()
+def s3_storage(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="fizicamd-test")
+        backend = S3StorageBackend("fizicamd-test", region="us-east-1")
+        monkeypatch.setattr(storage, "_backend", backend)
+        yield backend
+
+
+def test_s3_backend_roundtrip(s3_storage):
+    key = str(uuid.uuid4())
+    with open(__file__, "rb") as fh:
+        s3_storage.write("resources", key, fh, "text/x-python")
+
+    assert s3_storage.size("resources", key) > 0
+    assert s3_storage.open("resources", key).read(6) == b"import"
+    assert key in {k for k, _ in s3_storage.iter_keys("resources")}
+
+    s3_storage.delete("resources", key)
+    assert s3_storage.size("resources", key) is None
+
+
+def test_only_multipart_backends_implement_multipart_methods(s3_storage):
+    assert isinstance(s3_storage, MultipartStorage)
+    assert not isinstance(storage.LocalStorageBackend(), MultipartStorage)
+
+
+def test_upload_is_served_through_presigned_redirect(client, db_session, s3_storage):
+    _, token = create_user_with_role(db_session, "TEACHER")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    upload = client.post(
+        "/api/media/uploads/resource",
+        files={"file": ("Lecția 1; mecanică.pdf", b"%PDF-1.4 s3", "application/pdf")},
+        headers=headers,
+    )
+    assert upload.status_code == 200
+    asset_id = upload.json()["assetId"]
+
+    content = client.get(f"/api/media/assets/{asset_id}/content", follow_redirects=False)
+    assert content.status_code == 307
+    downloaded = requests.get(content.headers["Location"])
+    assert downloaded.content == b"%PDF-1.4 s3"
+    assert storage.content_disposition('x"; y.pdf') == "inline; filename=\"x__ y.pdf\"; filename*=UTF-8''x%22%3B%20y.pdf"
+    assert downloaded.headers["Content-Disposition"] == (
+        "inline; filename=\"Lectia 1_ mecanica.pdf\"; filename*=UTF-8''Lec%C8%9Bia%201%3B%20mecanic%C4%83.pdf"
+    )
+
+
+def test_presigned_direct_upload(client, db_session, s3_storage):
+    _, token = create_user_with_role(db_session, "TEACHER")
+    headers = {"Authorization": f"Bearer {token}"}
+    data = b"kvant archive page"
+
+    created = client.post(
+        "/api/media/uploads/resource/presigned",
+        json={"filename": "kvant.pdf", "contentType": "application/pdf", "sizeBytes": len(data)},
+        headers=headers,
+    )
+    assert created.status_code == 200
+    body = created.json()
+
+    early = client.post(f"/api/media/uploads/presigned/{body['assetId']}/complete", headers=headers)
+    assert early.status_code == 400
+    assert client.get(f"/api/media/assets/{body['assetId']}/content").status_code == 404
+
+    put = requests.put(body["uploadUrl"], data=data, headers=body["headers"])
+    assert put.status_code == 200
+
+    done = client.post(f"/api/media/uploads/presigned/{body['assetId']}/complete", headers=headers)
+    assert done.status_code == 200
+    asset = db_session.query(MediaAsset).filter(MediaAsset.id == body["assetId"]).first()
+    assert asset.status == "READY"
+
+
+def test_presigned_upload_needs_object_storage(client, db_session):
+    _, token = create_user_with_role(db_session, "TEACHER")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    created = client.post(
+        "/api/media/uploads/resource/presigned",
+        json={"filename": "kvant.pdf", "contentType": "application/pdf", "sizeBytes": 10},
+        headers=headers,
+    )
+    assert created.status_code == 400
+
+
+def test_chunked_session_maps_onto_multipart_upload(client, db_session, s3_storage, monkeypatch):
+    part = S3_MIN_PART_BYTES
+    monkeypatch.setattr(settings, "media_upload_chunk_max_bytes", part)
+    _, token = create_user_with_role(db_session, "TEACHER")
+    headers = {"Authorization": f"Bearer {token}"}
+    data = b"a" * part + b"tail"
+
+    created = client.post(
+        "/api/media/uploads/resource/sessions",
+        json={"filename": "big.pdf", "contentType": "application/pdf", "sizeBytes": len(data)},
+        headers=headers,
+    ).json()
+    assert created["partSize"] == part
+    upload_id = created["uploadId"]
+
+    def put(offset, chunk):
+        return client.put(
+            f"/api/media/uploads/sessions/{upload_id}/chunks",
+            params={"offset": offset},
+            files={"file": ("chunk", chunk, "application/octet-stream")},
+            headers=headers,
+        )
+
+    assert put(3, data[3:]).status_code == 400
+    assert put(part, data[part:]).json()["receivedRanges"] == [[part, len(data)]]
+    # Nothing is staged on this node's disk.
+    assert not staging_path(uuid.UUID(upload_id)).exists()
+    assert put(0, data[:part]).json()["receivedBytes"] == len(data)
+
+    finalized = client.post(
+        f"/api/media/uploads/sessions/{upload_id}/finalize",
+        json={"sha256": hashlib.sha256(data).hexdigest()},
+        headers=headers,
+    )
+    assert finalized.status_code == 200
+    asset = db_session.query(MediaAsset).filter(MediaAsset.id == finalized.json()["assetId"]).first()
+    assert asset.sha256 == hashlib.sha256(data).hexdigest()
+    assert s3_storage.open("resources", asset.storage_key).read() == data
+
+
+def test_streamed_s3_body_is_closed(client, db_session, s3_storage, monkeypatch):
+    monkeypatch.setattr(s3_storage, "_presign_downloads", False)
+    _, token = create_user_with_role(db_session, "TEACHER")
+    upload = client.post(
+        "/api/media/uploads/resource",
+        files={"file": ("notes.pdf", b"%PDF-1.4 streamed", "application/pdf")},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    opened = []
+    original_open = s3_storage.open
+
+    def tracking_open(bucket, storage_key):
+        body = original_open(bucket, storage_key)
+        opened.append(body)
+        return body
+
+    monkeypatch.setattr(s3_storage, "open", tracking_open)
+    content = client.get(f"/api/media/assets/{upload.json()['assetId']}/content")
+    assert content.content == b"%PDF-1.4 streamed"
+    assert opened and all(body._raw_stream.closed for body in opened)
@@ -0,0 +1,300 @@
+import json
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.migrations import MIGRATIONS_DIR, split_statements
+from app.core.security import create_access_token
+from app.models.role import Role
+from app.models.site_visit import SiteVisit
+from app.models.site_visit_counter import SiteVisitCounter
+from app.models.user import User
+from app.models.user_role import UserRole
+from app.services.hyperloglog import HyperLogLog
+from app.services import partitions as partitions_service
+from app.services.partitions import SITE_VISITS, drop_partitions_before, ensure_partitions, partitions
+from app.services.visit_rollups import INGEST_GRACE, fold_new_visits, rollup_day
+from app.services.visits import dropped_visits, enqueue_visits, flush_visits, pending_visits, visit_row
+
+
+def create_user_with_role(db, role_code: str):
+    role = db.query(Role).filter(Role.code == role_code).first()
+    now = datetime.now(timezone.utc)
+    user = User(
+        id=uuid.uuid4(),
+        email=f"{role_code.lower()}_{uuid.uuid4().hex}@example.com",
+        password_hash="x",
+        status="ACTIVE",
+        is_email_verified=False,
+        created_at=now,
+        updated_at=now,
+    )
+    db.add(user)
+    db.commit()
+    if role:
+        db.add(UserRole(id=uuid.uuid4(), user_id=user.id, role_id=role.id, assigned_at=now))
+        db.commit()
+    token = create_access_token(str(user.id), user.email, [role_code])
+    return user, token
+
+
+def _visits_for(db, path: str) -> int:
+    return db.query(SiteVisit).filter(SiteVisit.path == path).count()
+
+
+def test_visits_are_buffered_and_flushed_in_batches(client, db_session, monkeypatch):
+    monkeypatch.setattr(settings, "visit_count_cache_seconds", 0)
+    flush_visits()
+    path = f"/test/{uuid.uuid4().hex}"
+    before = client.get("/api/public/visits/count").json()["total"]
+
+    for _ in range(3):
+        assert client.post("/api/public/visits", json={"path": path}).status_code == 200
+    assert _visits_for(db_session, path) == 0
+    assert pending_visits() == 3
+    assert client.get("/api/public/visits/count").json()["total"] == before + 3
+
+    assert flush_visits(limit=2) == 2
+    assert flush_visits() == 1
+    assert _visits_for(db_session, path) == 3
+    db_session.query(SiteVisit).filter(SiteVisit.path == path).delete()
+    db_session.commit()
+
+
+def test_full_visit_buffer_drops_new_visits(db_session, monkeypatch):
+    flush_visits()
+    monkeypatch.setattr(settings, "visit_buffer_size", 2)
+    dropped = dropped_visits()
+    rows = [visit_row(None, None, f"/test/{uuid.uuid4().hex}", None) for _ in range(3)]
+
+    assert enqueue_visits(rows) == 2
+    assert dropped_visits() == dropped + 1
+    assert flush_visits() == 2
+    kept = [row["path"] for row in rows[:2]]
+    assert db_session.query(SiteVisit).filter(SiteVisit.path.in_(kept)).count() == 2
+    assert _visits_for(db_session, rows[2]["path"]) == 0
+    db_session.query(SiteVisit).filter(SiteVisit.path.in_(kept)).delete()
+    db_session.commit()
+
+
+def test_visit_batch_from_beacon(client, db_session):
+    flush_visits()
+    path = f"/test/{uuid.uuid4().hex}"
+    seen_at = datetime.now(timezone.utc) - timedelta(minutes=5)
+    body = json.dumps(
+        [
+            {"path": path, "ts": int(seen_at.timestamp() * 1000)},
+            {"path": path, "referrer": "https://example.com", "ts": "2001-01-01T00:00:00Z"},
+            {"path": path},
+        ]
+    )
+
+    response = client.post("/api/public/visits/batch", content=body, headers={"Content-Type": "text/plain"})
+    assert response.json() == {"accepted": 3}
+    flush_visits()
+    times = sorted(v.created_at for v in db_session.query(SiteVisit).filter(SiteVisit.path == path))
+    assert abs(times[0] - seen_at) < timedelta(seconds=1)
+    # A client clock that far off is replaced by the server time.
+    assert times[1].year == datetime.now(timezone.utc).year
+    db_session.query(SiteVisit).filter(SiteVisit.path == path).delete()
+    db_session.commit()
+
+
+def test_visit_batch_limits(client, monkeypatch):
+    monkeypatch.setattr(settings, "visit_batch_max_items", 2)
+    assert client.post("/api/public/visits/batch", json=[{}, {}, {}]).status_code == 400
+    assert client.post("/api/public/visits/batch", json={"path": "/"}).status_code == 400
+    assert client.post("/api/public/visits/batch", content="x" * (settings.visit_batch_max_bytes + 1)).status_code == 413
+
+    def chunked():
+        for _ in range(settings.visit_batch_max_bytes // 1024 + 2):
+            yield b"x" * 1024
+
+    # A streamed body carries no Content-Length; it is cut off once the cap is passed.
+    assert client.post("/api/public/visits/batch", content=chunked()).status_code == 413
+    assert pending_visits() == 0
+
+
+def test_visit_total_is_kept_in_a_counter(client, db_session, monkeypatch):
+    flush_visits()
+
+    def stored_total():
+        db_session.expire_all()
+        return db_session.get(SiteVisitCounter, "total").value
+
+    before = stored_total()
+    enqueue_visits([visit_row(None, None, "/test/counter", None) for _ in range(4)])
+    assert flush_visits() == 4
+    assert stored_total() == before + 4
+
+    monkeypatch.setattr(settings, "visit_count_cache_seconds", 3600)
+    cached = client.get("/api/public/visits/count").json()["total"]
+    enqueue_visits([visit_row(None, None, "/test/counter", None)])
+    flush_visits()
+    # The stored total is cached; queued visits are still added on top of it.
+    assert client.get("/api/public/visits/count").json()["total"] == cached
+    monkeypatch.setattr(settings, "visit_count_cache_seconds", 0)
+    assert client.get("/api/public/visits/count").json()["total"] == stored_total()
+    db_session.query(SiteVisit).filter(SiteVisit.path == "/test/counter").delete()
+    db_session.commit()
+
+
+def test_hyperloglog_estimates_and_merges():
+    first, second = HyperLogLog(), HyperLogLog()
+    for i in range(20000):
+        first.add(f"visitor-{i}")
+        second.add(f"visitor-{i + 10000}")
+    assert abs(first.count() - 20000) < 20000 * 0.05
+    # Re-adding known visitors changes nothing.
+    before = first.count()
+    first.add("visitor-1")
+    assert first.count() == before
+
+    first.merge(HyperLogLog.from_bytes(second.to_bytes()))
+    assert abs(first.count() - 30000) < 30000 * 0.05
+
+
+def test_daily_visit_rollups_feed_analytics(client, db_session):
+    _, token = create_user_with_role(db_session, "ADMIN")
+    day = date(2001, 2, 3)
+    noon = datetime(2001, 2, 3, 12, tzinfo=timezone.utc)
+    visits = [
+        ("1.1.1.1", "/lectii", "https://www.Google.com/search?q=x"),
+        ("1.1.1.1", "/lectii", None),
+        ("2.2.2.2", "/lectii", "https://www.google.com/"),
+        ("3.3.3.3", "/probleme", None),
+    ]
+    db_session.add_all(
+        SiteVisit(id=uuid.uuid4(), ip_address=ip, user_agent="test", path=path, referrer=referrer, created_at=noon)
+        for ip, path, referrer in visits
+    )
+    db_session.commit()
+    try:
+        rollup_day(db_session, day, datetime.now(timezone.utc))
+        db_session.commit()
+        response = client.get(
+            "/api/admin/analytics",
+            params={"from": "2001-02-01", "to": "2001-02-05"},
+            headers={"Authorization": f"Bearer {token}"},
+        ).json()
+        assert response["views"] == 4
+        assert response["unique_visitors"] == 3
+        assert response["days"] == [{"day": "2001-02-03", "views": 4, "unique_visitors": 3}]
+        assert response["top_paths"][0] == {"path": "/lectii", "views": 3, "unique_visitors": 2}
+        assert response["top_referrers"] == [{"referrer": "", "views": 2}, {"referrer": "www.google.com", "views": 2}]
+    finally:
+        start, end = datetime(2001, 2, 3, tzinfo=timezone.utc), datetime(2001, 2, 4, tzinfo=timezone.utc)
+        db_session.query(SiteVisit).filter(SiteVisit.created_at >= start, SiteVisit.created_at < end).delete()
+        rollup_day(db_session, day, datetime.now(timezone.utc))
+        db_session.commit()
+
+
+def test_visit_rollups_fold_only_new_visits(client, db_session):
+    _, token = create_user_with_role(db_session, "ADMIN")
+    day = date(2001, 3, 5)
+    noon = datetime(2001, 3, 5, 12, tzinfo=timezone.utc)
+
+    def add_visits(*ips):
+        db_session.add_all(
+            SiteVisit(id=uuid.uuid4(), ip_address=ip, user_agent="test", path="/lectii", referrer=None, created_at=noon)
+            for ip in ips
+        )
+        db_session.commit()
+
+    def fold():
+        # Treat everything committed so far as past the grace period.
+        fold_new_visits(db_session, datetime.now(timezone.utc) + INGEST_GRACE)
+
+    def summary():
+        return client.get(
+            "/api/admin/analytics",
+            params={"from": "2001-03-05", "to": "2001-03-05"},
+            headers={"Authorization": f"Bearer {token}"},
+        ).json()
+
+    fold()
+    try:
+        add_visits("1.1.1.1", "2.2.2.2")
+        fold()
+        assert summary()["days"] == [{"day": "2001-03-05", "views": 2, "unique_visitors": 2}]
+        # A late beacon for the same day: only it is read, and merged into the stored sketches.
+        add_visits("2.2.2.2", "3.3.3.3")
+        fold()
+        fold()
+        response = summary()
+        assert response["days"] == [{"day": "2001-03-05", "views": 4, "unique_visitors": 3}]
+        assert response["top_paths"] == [{"path": "/lectii", "views": 4, "unique_visitors": 3}]
+        assert response["top_referrers"] == [{"referrer": "", "views": 4}]
+    finally:
+        start, end = datetime(2001, 3, 5, tzinfo=timezone.utc), datetime(2001, 3, 6, tzinfo=timezone.utc)
+        db_session.query(SiteVisit).filter(SiteVisit.created_at >= start, SiteVisit.created_at < end).delete()
+        db_session.commit()
+        rollup_day(db_session, day, datetime.now(timezone.utc))
+        db_session.commit()
+
+
+def test_partitions_are_ensured_at_month_end(db_session):
+    for now in (datetime(2001, 1, 31, 23, tzinfo=timezone.utc), datetime(2001, 5, 30, tzinfo=timezone.utc)):
+        ensure_partitions(db_session, SITE_VISITS, now)
+    names = [name for name, _, _ in partitions(db_session, SITE_VISITS)]
+    expected = [f"site_visits_p2001{month:02d}" for month in (1, 2, 3, 5, 6, 7)]
+    assert set(expected) <= set(names)
+    for name in expected:
+        db_session.execute(text(f'DROP TABLE "{name}"'))
+    db_session.commit()
+
+
+def test_new_partitions_take_over_rows_from_the_default_partition(db_session):
+    visit = SiteVisit(id=uuid.uuid4(), path="/test/default-partition", created_at=datetime(1999, 6, 10, tzinfo=timezone.utc))
+    db_session.add(visit)
+    db_session.commit()
+    table = "SELECT tableoid::regclass::text FROM site_visits WHERE id = :id"
+    assert db_session.execute(text(table), {"id": visit.id}).scalar() == "site_visits_default"
+
+    assert ensure_partitions(db_session, SITE_VISITS, datetime(1999, 6, 20, tzinfo=timezone.utc)) == 3
+    assert db_session.execute(text(table), {"id": visit.id}).scalar() == "site_visits_p199906"
+    for month in (6, 7, 8):
+        db_session.execute(text(f'DROP TABLE "site_visits_p1999{month:02d}"'))
+    db_session.commit()
+
+
+def test_partition_maintenance_steps_fail_independently(monkeypatch):
+    calls = []
+
+    def ensure(db, scheme, now):
+        calls.append(scheme.table)
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(partitions_service, "ensure_partitions", ensure)
+    monkeypatch.setattr(partitions_service, "apply_visit_retention", lambda db, now: calls.append("retention"))
+    assert partitions_service.run_partition_maintenance() is False
+    assert calls == ["site_visits", "server_metric_samples", "retention"]
+
+
+def test_partition_migrations_can_be_rerun(db_session):
+    for name in ("V21__partition_site_visits_and_metric_samples.sql", "V24__partitions_take_rows_from_default.sql"):
+        for statement in split_statements((MIGRATIONS_DIR / name).read_text(encoding="utf-8")):
+            db_session.execute(text(statement))
+    db_session.commit()
+    assert db_session.execute(text("SELECT relkind FROM pg_class WHERE oid = 'site_visits'::regclass")).scalar() == "p"
+
+
+def test_visit_partitions_are_created_ahead_and_dropped(db_session):
+    now = datetime.now(timezone.utc)
+    ensure_partitions(db_session, SITE_VISITS, now)
+    names = [name for name, _, _ in partitions(db_session, SITE_VISITS)]
+    assert f"site_visits_p{now:%Y%m}" in names
+
+    db_session.execute(text("SELECT ensure_range_partitions('site_visits', 'month', '2001-02-01', '2001-03-01')"))
+    db_session.add_all(
+        SiteVisit(id=uuid.uuid4(), path="/test/partition", created_at=created_at)
+        for created_at in (datetime(2001, 2, 10, tzinfo=timezone.utc), datetime(2000, 5, 1, tzinfo=timezone.utc))
+    )
+    db_session.commit()
+
+    dropped = drop_partitions_before(db_session, SITE_VISITS, datetime(2001, 3, 1, tzinfo=timezone.utc))
+    assert dropped == ["site_visits_p200102"]
+    assert _visits_for(db_session, "/test/partition") == 0
+    assert f"site_visits_p{now:%Y%m}" in [name for name, _, _ in partitions(db_session, SITE_VISITS)]